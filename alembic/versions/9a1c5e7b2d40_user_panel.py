@@ -0,0 +1,22 @@
+"""Record Marzban panel of each binding"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9a1c5e7b2d40"
+down_revision = "4f3c3b59ce1b"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing bindings stay on the default panel (NULL)
+    op.add_column("users", sa.Column("panel", sa.String(length=64), nullable=True))
+    op.create_index("ix_users_panel", "users", ["panel"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_panel", table_name="users")
+    op.drop_column("users", "panel")
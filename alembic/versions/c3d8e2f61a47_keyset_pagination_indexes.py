@@ -0,0 +1,20 @@
+"""Indexes for keyset pagination of users and admin logs"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "c3d8e2f61a47"
+down_revision = "9a1c5e7b2d40"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_users_created_at_id", "users", ["created_at", "id"], unique=False)
+    op.create_index("ix_admin_logs_created_at_id", "admin_logs", ["created_at", "id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_admin_logs_created_at_id", table_name="admin_logs")
+    op.drop_index("ix_users_created_at_id", table_name="users")
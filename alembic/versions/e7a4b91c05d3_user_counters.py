@@ -0,0 +1,43 @@
+"""Maintained user counters for stats screens"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e7a4b91c05d3"
+down_revision = "c3d8e2f61a47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_counters",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("total_bindings", sa.Integer(), nullable=False),
+        sa.Column("admins", sa.Integer(), nullable=False),
+        sa.Column("primary_bindings", sa.Integer(), nullable=False),
+        sa.Column("marzban_usernames", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.func.now(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    # Seed the single row from existing bindings
+    op.execute(
+        sa.text(
+            """
+            INSERT INTO user_counters (id, total_bindings, admins, primary_bindings, marzban_usernames)
+            SELECT
+                1,
+                count(*),
+                count(*) FILTER (WHERE is_admin),
+                count(*) FILTER (WHERE primary_user),
+                count(DISTINCT marzban_username)
+            FROM users
+            """
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_counters")
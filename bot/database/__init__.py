@@ -1,13 +1,21 @@
 """Database package"""
 
-from .models import Base, User, AdminLog, NotificationSettings, SentNotifications
+from .models import Base, User, UserCounters, AdminLog, NotificationSettings, SentNotifications
+from .identity_cache import UserIdentityCache, identity_cache
+from .engine import create_engine, instrument_pool
+from .pagination import Page, parse_page_callback
 from .crud import (
     get_user_by_telegram_id,
     get_user_by_marzban_username,
     list_user_bindings,
+    list_recent_marzban_usernames,
     create_user,
     delete_user,
+    count_users,
+    get_user_counters,
+    reconcile_user_counters,
     list_users,
+    list_bindings_for_usernames,
     update_user_admin_status,
     log_admin_action,
     get_admin_logs,
@@ -21,15 +29,27 @@ from .crud import (
 __all__ = [
     "Base",
     "User",
+    "UserCounters",
     "AdminLog",
     "NotificationSettings",
     "SentNotifications",
+    "UserIdentityCache",
+    "identity_cache",
+    "create_engine",
+    "instrument_pool",
+    "Page",
+    "parse_page_callback",
     "get_user_by_telegram_id",
     "get_user_by_marzban_username",
     "list_user_bindings",
+    "list_recent_marzban_usernames",
     "create_user",
     "delete_user",
+    "count_users",
+    "get_user_counters",
+    "reconcile_user_counters",
     "list_users",
+    "list_bindings_for_usernames",
     "update_user_admin_status",
     "log_admin_action",
     "get_admin_logs",
@@ -1,17 +1,150 @@
 """CRUD operations for database models"""
 
-from typing import Optional
+import logging
+from typing import Iterable, Optional, Union
 
-from sqlalchemy import asc, desc, select, func
+from sqlalchemy import Executable, Result, Select, asc, desc, distinct, literal, or_, select, func, tuple_, update
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .models import AdminLog, User
+from bot.utils.cache import TTLCache
+from bot.utils.deadline import within_budget
 
+from .identity_cache import identity_cache
+from .models import USER_COUNTERS_ID, AdminLog, User, UserCounters
+from .pagination import Cursor, Page, decode_cursor, encode_cursor
 
-async def get_user_by_telegram_id(session: AsyncSession, telegram_id: int) -> Optional[User]:
-    """Get user by Telegram ID"""
-    result = await session.execute(select(User).where(User.telegram_id == telegram_id))
-    return result.scalar_one_or_none()
+
+logger = logging.getLogger(__name__)
+
+USER_COUNTER_NAMES = ("total_bindings", "admins", "primary_bindings", "marzban_usernames")
+
+# Totals of tables without maintained counters; writes through crud drop them
+_count_cache: TTLCache[int] = TTLCache(maxsize=16, ttl=60.0)
+
+
+async def _execute(session: AsyncSession, statement: Executable) -> Result:
+    """Execute statement within the remaining time budget of the current update"""
+    return await within_budget(session.execute(statement))
+
+
+def _user_totals_query() -> Select:
+    """Recount of USER_COUNTER_NAMES from the users table"""
+    return select(
+        func.count(User.id),
+        func.count(User.id).filter(User.is_admin.is_(True)),
+        func.count(User.id).filter(User.primary_user.is_(True)),
+        func.count(distinct(User.marzban_username)),
+    )
+
+
+async def _create_counters_row(session: AsyncSession) -> None:
+    """Create the counters row from a recount (no-op if it already exists)"""
+    totals = _user_totals_query().add_columns(literal(USER_COUNTERS_ID))
+    await _execute(
+        session,
+        insert(UserCounters)
+        .from_select([*USER_COUNTER_NAMES, "id"], totals)
+        .on_conflict_do_nothing(index_elements=[UserCounters.id])
+    )
+
+
+async def _adjust_counters(session: AsyncSession, **deltas: int) -> None:
+    """Apply deltas to the user counters row in the current transaction (call after the change is flushed)"""
+    values = {name: getattr(UserCounters, name) + delta for name, delta in deltas.items() if delta}
+    if not values:
+        return
+    result = await _execute(session, update(UserCounters).where(UserCounters.id == USER_COUNTERS_ID).values(**values))
+    if result.rowcount == 0:
+        # The recount sees this transaction's own changes, so the deltas are included
+        logger.warning("User counters row is missing, creating it from a recount")
+        await _create_counters_row(session)
+
+
+async def _has_bindings(session: AsyncSession, marzban_username: str) -> bool:
+    """Any Telegram binding exists for the Marzban username"""
+    result = await _execute(
+        session,
+        select(User.id).where(User.marzban_username == marzban_username).limit(1)
+    )
+    return result.first() is not None
+
+
+async def _cached_count(session: AsyncSession, key: str, query: Select) -> int:
+    """Row count of query, cached for a minute"""
+    total = _count_cache.get(key)
+    if total is None:
+        result = await _execute(session, select(func.count()).select_from(query.subquery()))
+        total = result.scalar_one()
+        _count_cache.set(key, total)
+    return total
+
+
+async def _keyset_page(
+    session: AsyncSession,
+    query: Select,
+    model: Union[type[User], type[AdminLog]],
+    limit: int,
+    cursor: Optional[str],
+) -> Page:
+    """
+    Fetch page of query newest first, seeking by (created_at, id)
+
+    The cost does not depend on how deep the page is: the index on
+    (created_at, id) is entered at the cursor instead of skipping rows.
+    A malformed cursor starts from the first page.
+    """
+    position = None
+    if cursor:
+        try:
+            position = decode_cursor(cursor)
+        except ValueError:
+            position = None
+
+    key = tuple_(model.created_at, model.id)
+    if position is None:
+        backward = False
+    else:
+        backward = position.backward
+        bound = tuple_(position.created_at, position.id)
+        query = query.where(key > bound if backward else key < bound)
+
+    order = asc if backward else desc
+    query = query.order_by(order(model.created_at), order(model.id)).limit(limit + 1)
+    result = await _execute(session, query)
+    items = list(result.scalars().all())
+
+    more = len(items) > limit
+    items = items[:limit]
+    if backward:
+        items.reverse()
+    # Coming from a neighbouring page means there is one in that direction
+    has_next = True if backward else more
+    has_prev = more if backward else position is not None
+
+    page = Page(items=items)
+    if items and has_next:
+        page.next_cursor = encode_cursor(Cursor(items[-1].created_at, items[-1].id))
+    if items and has_prev:
+        page.prev_cursor = encode_cursor(Cursor(items[0].created_at, items[0].id, backward=True))
+    return page
+
+
+async def get_user_by_telegram_id(
+    session: AsyncSession, telegram_id: int, *, use_cache: bool = False
+) -> Optional[User]:
+    """Get user by Telegram ID (use_cache: serve from and fill the identity cache)"""
+    if use_cache:
+        generation = identity_cache.generation
+        hit, user = await identity_cache.lookup(session, telegram_id)
+        if hit:
+            return user
+
+    result = await _execute(session, select(User).where(User.telegram_id == telegram_id))
+    user = result.scalar_one_or_none()
+    if use_cache:
+        identity_cache.store(telegram_id, user, generation)
+    return user
 
 
 async def get_user_by_marzban_username(
@@ -23,13 +156,14 @@ async def get_user_by_marzban_username(
         query = query.where(User.primary_user.is_(True))
 
     query = query.order_by(desc(User.created_at))
-    result = await session.execute(query)
+    result = await _execute(session, query)
     return result.scalars().first()
 
 
 async def list_user_bindings(session: AsyncSession, marzban_username: str) -> list[User]:
     """List all Telegram bindings for a Marzban username"""
-    result = await session.execute(
+    result = await _execute(
+        session,
         select(User)
         .where(User.marzban_username == marzban_username)
         .order_by(desc(User.primary_user), desc(User.created_at))
@@ -37,14 +171,40 @@ async def list_user_bindings(session: AsyncSession, marzban_username: str) -> li
     return list(result.scalars().all())
 
 
+async def list_recent_marzban_usernames(
+    session: AsyncSession, panel: Optional[str], limit: int, *, include_unassigned: bool = False
+) -> list[str]:
+    """Marzban usernames of the most recently updated bindings on a panel
+
+    Args:
+        panel: Panel name
+        limit: Max usernames
+        include_unassigned: Also include bindings without panel (default panel)
+    """
+    condition = User.panel == panel
+    if include_unassigned:
+        condition = or_(condition, User.panel.is_(None))
+
+    result = await _execute(
+        session,
+        select(User.marzban_username)
+        .where(condition)
+        .group_by(User.marzban_username)
+        .order_by(desc(func.max(User.updated_at)))
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
 async def create_user(
     session: AsyncSession,
     telegram_id: int,
     marzban_username: str,
     is_admin: bool = False,
     primary_user: Optional[bool] = None,
+    panel: Optional[str] = None,
 ) -> User:
-    """Create new user"""
+    """Create new user (panel=None binds to the default Marzban panel)"""
     existing_by_telegram = await get_user_by_telegram_id(session, telegram_id)
     if existing_by_telegram:
         raise ValueError(f"Telegram ID {telegram_id} is already linked to {existing_by_telegram.marzban_username}")
@@ -55,18 +215,31 @@ async def create_user(
 
     if primary_user is None:
         primary_user = existing_primary is None
+    # Bindings may all be secondary, so no primary does not mean a new username
+    new_username = existing_primary is None and not await _has_bindings(session, marzban_username)
 
+    changed = [telegram_id]
     if primary_user and existing_primary:
         existing_primary.primary_user = False
+        changed.append(existing_primary.telegram_id)
 
     user = User(
         telegram_id=telegram_id,
         marzban_username=marzban_username,
         is_admin=is_admin,
         primary_user=primary_user,
+        panel=panel,
     )
     session.add(user)
+    await _adjust_counters(
+        session,
+        total_bindings=1,
+        admins=int(is_admin),
+        primary_bindings=int(primary_user and existing_primary is None),
+        marzban_usernames=int(new_username),
+    )
     await session.commit()
+    identity_cache.invalidate(*changed)
     await session.refresh(user)
     return user
 
@@ -77,55 +250,126 @@ async def delete_user(session: AsyncSession, telegram_id: int) -> bool:
     if user:
         marzban_username = user.marzban_username
         was_primary = user.primary_user
+        was_admin = user.is_admin
+        changed = [telegram_id]
+        deltas = {"total_bindings": -1, "admins": -int(was_admin), "primary_bindings": -int(was_primary)}
 
         await session.delete(user)
         await session.flush()
 
         if was_primary:
-            replacement_result = await session.execute(
+            replacement_result = await _execute(
+                session,
                 select(User)
                 .where(User.marzban_username == marzban_username)
                 .order_by(desc(User.primary_user), asc(User.created_at))
                 .limit(1)
             )
             replacement = replacement_result.scalars().first()
-            if replacement and not replacement.primary_user:
+            if replacement is None:
+                # Last binding of this Marzban username
+                deltas["marzban_usernames"] = -1
+            elif not replacement.primary_user:
                 replacement.primary_user = True
+                deltas["primary_bindings"] += 1
+                changed.append(replacement.telegram_id)
+        elif not await _has_bindings(session, marzban_username):
+            deltas["marzban_usernames"] = -1
 
+        await _adjust_counters(session, **deltas)
         await session.commit()
+        identity_cache.invalidate(*changed)
         return True
     return False
 
 
+async def get_user_counters(session: AsyncSession) -> UserCounters:
+    """Totals of the users table from the counters row (read-only; recounted if the row is missing)"""
+    result = await _execute(session, select(UserCounters).where(UserCounters.id == USER_COUNTERS_ID))
+    counters = result.scalar_one_or_none()
+    if counters is None:
+        # Created by the next write or reconciliation
+        logger.warning("User counters row is missing, counting users")
+        result = await _execute(session, _user_totals_query())
+        counters = UserCounters(id=USER_COUNTERS_ID, **dict(zip(USER_COUNTER_NAMES, result.one())))
+    return counters
+
+
+async def reconcile_user_counters(session: AsyncSession) -> tuple[UserCounters, dict[str, int]]:
+    """
+    Recount the users table into the counters row
+
+    The row is locked first, so writers committing meanwhile apply their
+    deltas after the recount instead of being lost.
+
+    Returns:
+        (counters, drift) - drift maps counter name to stored minus actual value
+    """
+    # Concurrent first runs (or a concurrent write) may create the row too
+    await _create_counters_row(session)
+    result = await _execute(
+        session,
+        select(UserCounters)
+        .where(UserCounters.id == USER_COUNTERS_ID)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    counters = result.scalar_one()
+
+    result = await _execute(session, _user_totals_query())
+    actual = dict(zip(USER_COUNTER_NAMES, result.one()))
+
+    drift: dict[str, int] = {}
+    for name, value in actual.items():
+        if getattr(counters, name) != value:
+            drift[name] = getattr(counters, name) - value
+            setattr(counters, name, value)
+    await session.commit()
+    return counters, drift
+
+
+async def count_users(session: AsyncSession, admin_only: bool = False) -> int:
+    """Number of bindings (from the counters row)"""
+    counters = await get_user_counters(session)
+    return counters.admins if admin_only else counters.total_bindings
+
+
 async def list_users(
     session: AsyncSession,
-    offset: int = 0,
     limit: int = 50,
     admin_only: bool = False,
-) -> tuple[list[User], int]:
-    """List users with pagination"""
+    cursor: Optional[str] = None,
+) -> Page[User]:
+    """List users newest first (cursor: next_cursor/prev_cursor of a previous page)"""
     query = select(User)
     if admin_only:
         query = query.where(User.is_admin == True)
 
-    # Get total count
-    count_result = await session.execute(select(func.count()).select_from(query.subquery()))
-    total = count_result.scalar_one()
+    page = await _keyset_page(session, query, User, limit, cursor)
+    page.total = await count_users(session, admin_only)
+    return page
 
-    # Get users
-    query = query.order_by(desc(User.created_at)).offset(offset).limit(limit)
-    result = await session.execute(query)
-    users = list(result.scalars().all())
 
-    return users, total
+async def list_bindings_for_usernames(session: AsyncSession, marzban_usernames: Iterable[str]) -> list[User]:
+    """All Telegram bindings of the given Marzban usernames"""
+    marzban_usernames = list(set(marzban_usernames))
+    if not marzban_usernames:
+        return []
+    result = await _execute(session, select(User).where(User.marzban_username.in_(marzban_usernames)))
+    return list(result.scalars().all())
 
 
 async def update_user_admin_status(session: AsyncSession, telegram_id: int, is_admin: bool) -> Optional[User]:
     """Update user admin status"""
     user = await get_user_by_telegram_id(session, telegram_id)
     if user:
+        was_admin = user.is_admin
         user.is_admin = is_admin
+        if was_admin != is_admin:
+            # Autoflushed before the counters UPDATE, so a recount would see the change
+            await _adjust_counters(session, admins=1 if is_admin else -1)
         await session.commit()
+        identity_cache.invalidate(telegram_id)
         await session.refresh(user)
         return user
     return None
@@ -147,6 +391,7 @@ async def log_admin_action(
     )
     session.add(log)
     await session.commit()
+    _count_cache.invalidate("admin_logs")
     await session.refresh(log)
     return log
 
@@ -154,21 +399,12 @@ async def log_admin_action(
 async def get_admin_logs(
     session: AsyncSession,
     limit: int = 50,
-    offset: int = 0,
-) -> tuple[list[AdminLog], int]:
-    """Get admin logs with pagination"""
-    query = select(AdminLog)
-
-    # Get total count
-    count_result = await session.execute(select(func.count()).select_from(query.subquery()))
-    total = count_result.scalar_one()
-
-    # Get logs
-    query = query.order_by(desc(AdminLog.created_at)).offset(offset).limit(limit)
-    result = await session.execute(query)
-    logs = list(result.scalars().all())
-
-    return logs, total
+    cursor: Optional[str] = None,
+) -> Page[AdminLog]:
+    """Get admin logs newest first (cursor: next_cursor/prev_cursor of a previous page)"""
+    page = await _keyset_page(session, select(AdminLog), AdminLog, limit, cursor)
+    page.total = await _cached_count(session, "admin_logs", select(AdminLog.id))
+    return page
 
 
 async def search_users(session: AsyncSession, query: str) -> list[User]:
@@ -185,14 +421,14 @@ async def search_users(session: AsyncSession, query: str) -> list[User]:
     # Try to parse as telegram_id
     try:
         telegram_id = int(query)
-        result = await session.execute(select(User).where(User.telegram_id == telegram_id))
+        result = await _execute(session, select(User).where(User.telegram_id == telegram_id))
         user = result.scalar_one_or_none()
         return [user] if user else []
     except ValueError:
         pass
 
     # Search by username (case-insensitive partial match)
-    result = await session.execute(select(User).where(User.marzban_username.ilike(f"%{query}%")))
+    result = await _execute(session, select(User).where(User.marzban_username.ilike(f"%{query}%")))
     users = list(result.scalars().all())
     return users
 
@@ -201,7 +437,8 @@ async def get_notification_settings(session: AsyncSession, telegram_id: int):
     """Get user notification settings (create default if not exists)"""
     from .models import NotificationSettings
 
-    result = await session.execute(
+    result = await _execute(
+        session,
         select(NotificationSettings).where(NotificationSettings.telegram_id == telegram_id)
     )
     settings = result.scalar_one_or_none()
@@ -249,7 +486,8 @@ async def check_notification_sent(
     """Check if notification was already sent"""
     from .models import SentNotifications
 
-    result = await session.execute(
+    result = await _execute(
+        session,
         select(SentNotifications).where(
             SentNotifications.telegram_id == telegram_id,
             SentNotifications.notification_type == notification_type,
@@ -0,0 +1,62 @@
+"""Database engine with configurable, instrumented connection pool"""
+
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from bot.services.metrics import PoolMetrics
+
+
+def create_engine(
+    database_url: str,
+    *,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_timeout: float = 30.0,
+    pool_pre_ping: bool = True,
+    pool_recycle: int = 1800,
+    statement_cache_size: int = 100,
+    metrics: Optional[PoolMetrics] = None,
+) -> AsyncEngine:
+    """
+    Create async engine
+
+    Args:
+        database_url: SQLAlchemy URL
+        pool_size: Connections kept open in the pool
+        max_overflow: Extra connections opened under load (closed when returned)
+        pool_timeout: Seconds to wait for a free connection before failing
+        pool_pre_ping: Test connections on checkout (drops ones killed by a server restart)
+        pool_recycle: Reopen connections older than this many seconds (-1 = never)
+        statement_cache_size: asyncpg prepared statement cache per connection (0 for PgBouncer)
+        metrics: Pool counters to feed from pool events
+    """
+    connect_args: dict[str, Any] = {}
+    if make_url(database_url).get_driver_name() == "asyncpg":
+        connect_args["statement_cache_size"] = statement_cache_size
+
+    engine = create_async_engine(
+        database_url,
+        echo=False,
+        future=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=pool_timeout,
+        pool_pre_ping=pool_pre_ping,
+        pool_recycle=pool_recycle,
+        connect_args=connect_args,
+    )
+    if metrics is not None:
+        instrument_pool(engine, metrics)
+    return engine
+
+
+def instrument_pool(engine: AsyncEngine, metrics: PoolMetrics) -> None:
+    """Feed pool events of engine into metrics"""
+    target = engine.sync_engine
+    event.listen(target, "connect", lambda dbapi_connection, record: metrics.on_connect())
+    event.listen(target, "checkout", lambda dbapi_connection, record, proxy: metrics.on_checkout())
+    event.listen(target, "checkin", lambda dbapi_connection, record: metrics.on_checkin())
+    event.listen(target, "invalidate", lambda dbapi_connection, record, exception: metrics.on_invalidate())
@@ -0,0 +1,89 @@
+"""In-process cache of User rows looked up by Telegram ID"""
+
+from typing import Any, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import make_transient_to_detached
+
+from bot.utils.cache import TTLCache
+
+from .models import User
+
+
+# Stored for Telegram IDs that have no User row
+_NOT_REGISTERED = object()
+
+
+class UserIdentityCache:
+    """
+    Bounded TTL cache of User rows keyed by telegram_id
+
+    Column values are stored, not ORM instances: a hit rebuilds the row and
+    attaches it to the caller's session without a query, so handlers can
+    change and commit it as usual. Telegram IDs without a row are cached
+    too, for a shorter time. crud functions that change users invalidate
+    their entries; the TTL bounds staleness for changes made elsewhere.
+
+    Usage:
+        generation = identity_cache.generation
+        hit, user = await identity_cache.lookup(session, telegram_id)
+        if not hit:
+            user = ...  # query
+            identity_cache.store(telegram_id, user, generation)
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 300.0, negative_ttl: float = 30.0):
+        self.negative_ttl = negative_ttl
+        self._cache: TTLCache[Any] = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Bumped by every invalidation, so lookups racing with a write do not store old rows
+        self.generation = 0
+        self.negative_hits = 0
+
+    def configure(self, maxsize: int, ttl: float, negative_ttl: float) -> None:
+        """Apply settings (drops cached entries)"""
+        self.negative_ttl = negative_ttl
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.generation += 1
+        self.negative_hits = 0
+
+    async def lookup(self, session: AsyncSession, telegram_id: int) -> tuple[bool, Optional[User]]:
+        """
+        Get cached user attached to session
+
+        Returns:
+            (True, user or None if not registered) on hit, (False, None) on miss
+        """
+        value = self._cache.get(telegram_id, None)
+        if value is None:
+            return False, None
+        if value is _NOT_REGISTERED:
+            self.negative_hits += 1
+            return True, None
+
+        user = User(**value)
+        make_transient_to_detached(user)
+        return True, await session.merge(user, load=False)
+
+    def store(self, telegram_id: int, user: Optional[User], generation: int) -> None:
+        """Cache lookup result unless users were invalidated since ``generation`` was read"""
+        if generation != self.generation:
+            return
+        if user is None:
+            self._cache.set(telegram_id, _NOT_REGISTERED, ttl=self.negative_ttl)
+            return
+        values = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs}
+        self._cache.set(telegram_id, values)
+
+    def invalidate(self, *telegram_ids: int) -> None:
+        """Drop entries of changed users"""
+        self.generation += 1
+        for telegram_id in telegram_ids:
+            self._cache.invalidate(telegram_id)
+
+    def stats(self) -> dict[str, Any]:
+        """Cache counters for diagnostics"""
+        return {**self._cache.stats(), "negative_hits": self.negative_hits}
+
+
+identity_cache = UserIdentityCache()
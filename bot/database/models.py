@@ -19,6 +19,8 @@ class User(Base):
     __tablename__ = "users"
     __table_args__ = (
         Index("ix_users_telegram_id_marzban_username", "telegram_id", "marzban_username"),
+        # Keyset pagination of the admin user list
+        Index("ix_users_created_at_id", "created_at", "id"),
     )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -26,6 +28,7 @@ class User(Base):
     marzban_username: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     primary_user: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
+    panel: Mapped[Optional[str]] = mapped_column(String(64), nullable=True, index=True)  # NULL = default panel
     created_at: Mapped[datetime] = mapped_column(DateTime, server_default=func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(
         DateTime,
@@ -38,14 +41,45 @@ class User(Base):
         return (
             f"User(id={self.id}, telegram_id={self.telegram_id}, "
             f"marzban_username={self.marzban_username}, "
-            f"is_admin={self.is_admin}, primary_user={self.primary_user})"
+            f"is_admin={self.is_admin}, primary_user={self.primary_user}, panel={self.panel})"
         )
 
 
+class UserCounters(Base):
+    """Totals of the users table, kept up to date by crud write paths (single row)"""
+
+    __tablename__ = "user_counters"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)  # Always USER_COUNTERS_ID
+    total_bindings: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    admins: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    primary_bindings: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    marzban_usernames: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime,
+        server_default=func.now(),
+        onupdate=func.now(),
+        nullable=False,
+    )
+
+    def __repr__(self) -> str:
+        return (
+            f"UserCounters(total_bindings={self.total_bindings}, admins={self.admins}, "
+            f"primary_bindings={self.primary_bindings}, marzban_usernames={self.marzban_usernames})"
+        )
+
+
+USER_COUNTERS_ID = 1
+
+
 class AdminLog(Base):
     """Admin action log model"""
 
     __tablename__ = "admin_logs"
+    __table_args__ = (
+        # Keyset pagination of the audit log
+        Index("ix_admin_logs_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     admin_telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False, index=True)
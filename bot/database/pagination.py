@@ -0,0 +1,73 @@
+"""Keyset pagination on (created_at, id) with opaque cursors"""
+
+import base64
+import binascii
+import struct
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Generic, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# backward flag, created_at in microseconds since epoch, id: 17 bytes -> 23 characters
+_CURSOR = struct.Struct(">?qq")
+
+
+@dataclass(frozen=True)
+class Cursor:
+    """Position between two rows of a (created_at DESC, id DESC) listing"""
+
+    created_at: datetime
+    id: int
+    backward: bool = False  # Page of rows before (newer than) this row
+
+
+@dataclass
+class Page(Generic[T]):
+    """One page of rows with cursors of the neighbouring pages"""
+
+    items: list[T] = field(default_factory=list)
+    total: int = 0
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    """Compact URL-safe token short enough for callback_data"""
+    micros = (cursor.created_at.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+    raw = _CURSOR.pack(cursor.backward, micros, cursor.id)
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(token: str) -> Cursor:
+    """
+    Parse token made by encode_cursor
+
+    Raises:
+        ValueError: Malformed token
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        backward, micros, row_id = _CURSOR.unpack(raw)
+    except (binascii.Error, struct.error) as e:
+        raise ValueError(f"Invalid cursor: {token!r}") from e
+    return Cursor(created_at=_EPOCH + micros * _MICROSECOND, id=row_id, backward=backward)
+
+
+def parse_page_callback(data: str) -> tuple[int, Optional[str]]:
+    """
+    Page number and cursor from callback_data like ``prefix:<page>:<cursor>``
+
+    Buttons without a cursor (first page, messages sent before keyset
+    pagination) open the first page.
+    """
+    parts = data.split(":")
+    if len(parts) < 3 or not parts[2]:
+        return 0, None
+    try:
+        return max(int(parts[1]), 0), parts[2]
+    except ValueError:
+        return 0, None
@@ -18,6 +18,8 @@ from bot.database import (
     update_user_admin_status,
     log_admin_action,
     get_admin_logs,
+    get_user_counters,
+    parse_page_callback,
 )
 from bot.services import MarzbanAPI, MarzbanAPIError
 from bot.keyboards import get_admin_main_menu, get_user_list_keyboard, get_logs_keyboard
@@ -330,16 +332,12 @@ async def cmd_revoke_admin(message: Message, session: AsyncSession, **kwargs):
 @admin_only
 async def show_user_list(callback: CallbackQuery, session: AsyncSession, **kwargs):
     """Show user list with pagination"""
-    # Parse page number
-    page = 0
-    if ":" in callback.data:
-        page = int(callback.data.split(":")[1])
-
+    page, cursor = parse_page_callback(callback.data)
     page_size = 10
-    offset = page * page_size
 
-    users, total = await list_users(session, offset=offset, limit=page_size)
-    total_pages = math.ceil(total / page_size)
+    users_page = await list_users(session, limit=page_size, cursor=cursor)
+    users, total = users_page.items, users_page.total
+    total_pages = max(math.ceil(total / page_size), page + 1)
 
     if not users:
         await callback.message.edit_text(
@@ -352,7 +350,7 @@ async def show_user_list(callback: CallbackQuery, session: AsyncSession, **kwarg
 
     text = f"👥 <b>Список пользователей</b> (Страница {page + 1}/{total_pages})\n" f"Всего: {total}\n\n"
 
-    for i, user in enumerate(users, start=offset + 1):
+    for i, user in enumerate(users, start=page * page_size + 1):
         admin_badge = "👑 " if user.is_admin else ""
         role_label = "⭐️ Основной" if user.primary_user else "➕ Дополнительный"
         text += (
@@ -364,7 +362,7 @@ async def show_user_list(callback: CallbackQuery, session: AsyncSession, **kwarg
 
     await callback.message.edit_text(
         text,
-        reply_markup=get_user_list_keyboard(page, total_pages),
+        reply_markup=get_user_list_keyboard(page, users_page.prev_cursor, users_page.next_cursor),
         parse_mode="HTML",
     )
     await callback.answer()
@@ -375,15 +373,16 @@ async def show_user_list(callback: CallbackQuery, session: AsyncSession, **kwarg
 async def show_stats(callback: CallbackQuery, session: AsyncSession, marzban: MarzbanAPI, **kwargs):
     """Show statistics"""
     try:
-        users, total = await list_users(session, limit=1000)
-
-        admin_count = sum(1 for u in users if u.is_admin)
-        primary_count = sum(1 for u in users if u.primary_user)
+        counters = await get_user_counters(session)
+        total = counters.total_bindings
+        admin_count = counters.admins
+        primary_count = counters.primary_bindings
         secondary_count = total - primary_count
 
         text = (
             "📊 <b>Статистика системы</b>\n\n"
             f"👥 Всего привязок: <b>{total}</b>\n"
+            f"🔐 Аккаунтов Marzban: <b>{counters.marzban_usernames}</b>\n"
             f"⭐️ Основных аккаунтов: <b>{primary_count}</b>\n"
             f"➕ Дополнительных аккаунтов: <b>{secondary_count}</b>\n"
             f"👑 Администраторов: <b>{admin_count}</b>\n"
@@ -407,16 +406,12 @@ async def show_stats(callback: CallbackQuery, session: AsyncSession, marzban: Ma
 @admin_only
 async def show_logs(callback: CallbackQuery, session: AsyncSession, **kwargs):
     """Show admin action logs"""
-    # Parse page number
-    page = 0
-    if ":" in callback.data:
-        page = int(callback.data.split(":")[1])
-
+    page, cursor = parse_page_callback(callback.data)
     page_size = 10
-    offset = page * page_size
 
-    logs, total = await get_admin_logs(session, offset=offset, limit=page_size)
-    total_pages = math.ceil(total / page_size)
+    logs_page = await get_admin_logs(session, limit=page_size, cursor=cursor)
+    logs, total = logs_page.items, logs_page.total
+    total_pages = max(math.ceil(total / page_size), page + 1)
 
     if not logs:
         await callback.message.edit_text(
@@ -443,7 +438,7 @@ async def show_logs(callback: CallbackQuery, session: AsyncSession, **kwargs):
 
     await callback.message.edit_text(
         text,
-        reply_markup=get_logs_keyboard(page, total_pages),
+        reply_markup=get_logs_keyboard(page, logs_page.prev_cursor, logs_page.next_cursor),
         parse_mode="HTML",
     )
     await callback.answer()
@@ -397,7 +397,19 @@ async def toggle_status_confirm(
     old_status = data["old_status"]
 
     try:
-        # Update status in Marzban
+        # Make sure status did not change on the panel since confirmation was shown
+        current = await marzban.get_user(target_username, use_cache=False)
+        if current.status != old_status:
+            await callback.message.edit_text(
+                f"⚠️ <b>Статус уже изменён</b>\n\n"
+                f"Пользователь: <b>{target_username}</b>\n"
+                f"Текущий статус: <b>{current.status}</b>\n\n"
+                f"Откройте пользователя заново и повторите действие.",
+                parse_mode="HTML",
+            )
+            return
+
+        # Update status in Marzban (only status is sent; panel state was just checked)
         await marzban.modify_user(target_username, status=new_status)
 
         # Log admin action
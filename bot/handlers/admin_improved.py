@@ -1,41 +1,119 @@
 """Улучшенные админские хендлеры с синхронизацией Marzban"""
 
+import asyncio
+import html
 import logging
 import math
+import re
+import time
 from collections import defaultdict
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from typing import Any
 
 from aiogram import F, Router
-from aiogram.types import CallbackQuery, Message
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import BufferedInputFile, CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.database import (
+    Page,
     User,
+    identity_cache,
     get_user_by_telegram_id,
     get_user_by_marzban_username,
     list_user_bindings,
     create_user,
+    count_users,
+    get_admin_logs,
+    get_user_counters,
     list_users,
+    list_bindings_for_usernames,
+    parse_page_callback,
     search_users,
     log_admin_action,
 )
-from bot.services import MarzbanAPI, MarzbanAPIError
+from bot.config import settings
+from bot.services import (
+    BulkResult,
+    MarzbanAPI,
+    MarzbanAPIError,
+    MarzbanUnavailableError,
+    MarzbanUserMirror,
+    Panel,
+    PanelRegistry,
+    PoolMetrics,
+    RequestMetrics,
+    SessionMetrics,
+    UserChanges,
+    UserColumns,
+)
 from bot.services.formatters import format_bytes
+from bot.utils import json_codec
+from bot.utils.deadline import no_deadline
+from bot.utils.formatters import format_data_age, format_progress_bar
 from bot.keyboards.inline import (
     get_admin_main_menu,
     get_request_user_keyboard,
     get_cancel_inline,
     get_confirmation_inline,
     get_user_list_navigation,
+    get_cursor_navigation,
     get_back_to_admin_menu,
+    get_inbounds_menu,
+    get_bulk_target_menu,
+    get_bulk_action_menu,
+    get_diagnostics_menu,
+    get_stats_menu,
+    get_nodes_menu,
 )
-from bot.states import AddUserStates, SearchUserStates
+from bot.states import AddUserStates, SearchUserStates, BulkModifyStates
 
 logger = logging.getLogger(__name__)
 router = Router(name="admin_improved")
 
 
+def _mirror_ready(user_mirror: MarzbanUserMirror | None) -> bool:
+    """Check if local snapshot of Marzban users can be used"""
+    return user_mirror is not None and user_mirror.is_ready
+
+
+def _all_panels(
+    marzban: MarzbanAPI, user_mirror: MarzbanUserMirror | None, panels: PanelRegistry | None
+) -> list[Panel]:
+    """All Marzban panels (just the current one if registry is not available)"""
+    if panels is not None:
+        return list(panels)
+    return [Panel(settings.marzban_panel_name, marzban, user_mirror)]
+
+
+def _panel_clients(marzban: MarzbanAPI, panels: PanelRegistry | None) -> list[tuple[str, MarzbanAPI]]:
+    """Marzban clients of all panels (just the current one if registry is not available)"""
+    if panels is not None:
+        return [(panel.name, panel.api) for panel in panels]
+    return [(settings.marzban_panel_name, marzban)]
+
+
+async def _query_panels(clients: list[tuple[str, Any]], call) -> tuple[list[tuple[str, Any]], list[str]]:
+    """
+    Run call(client) for all panels concurrently (client is MarzbanAPI or Panel)
+
+    Returns:
+        Tuple of ([(panel name, result)] of reachable panels, names of failed panels)
+    """
+    results = await asyncio.gather(*(call(api) for _, api in clients), return_exceptions=True)
+    values, failed = [], []
+    for (name, _), result in zip(clients, results):
+        if isinstance(result, Exception):
+            logger.warning(f"Panel {name} skipped: {result}")
+            failed.append(name)
+        else:
+            values.append((name, result))
+    if not values and failed:
+        raise MarzbanUnavailableError(f"No Marzban panel answered: {', '.join(failed)}")
+    return values, failed
+
+
 # ============= ADMIN: ADD USER =============
 @router.callback_query(F.data == "admin_add_user")
 async def start_add_user(callback: CallbackQuery, state: FSMContext, is_admin: bool):
@@ -99,7 +177,8 @@ async def marzban_username_entered(
     state: FSMContext,
     session: AsyncSession,
     marzban: MarzbanAPI,
-    is_admin: bool
+    is_admin: bool,
+    panels: PanelRegistry | None = None,
 ):
     """Handle marzban username entry"""
     if not is_admin:
@@ -135,16 +214,36 @@ async def marzban_username_entered(
         await state.clear()
         return
 
-    # Check if exists in Marzban, if not - create
+    # Check if exists in Marzban (on any panel), if not - create
+    multi_panel = panels is not None and len(panels) > 1
+    panel_name = None
     marzban_user = None
     try:
-        marzban_user = await marzban.get_user(marzban_username)
-        logger.info(f"User {marzban_username} found in Marzban (status: {marzban_user.status})")
+        if multi_panel:
+            located = await panels.locate(marzban_username)
+            if located is None:
+                raise MarzbanAPIError(f"User {marzban_username} not found in Marzban")
+            panel, marzban_user = located
+            marzban, panel_name = panel.api, panel.name
+        else:
+            marzban_user = await marzban.get_user(marzban_username)
+        logger.info(f"User {marzban_username} found in Marzban (status: {marzban_user.status}, panel: {panel_name})")
+    except MarzbanUnavailableError as e:
+        # Can't tell whether the user exists - creating it could make a duplicate
+        logger.error(f"Marzban unavailable while checking {marzban_username}: {e}")
+        await message.answer("⚠️ Панель Marzban временно недоступна, попробуйте позже")
+        await state.clear()
+        return
     except MarzbanAPIError as e:
         # User not found, try to create
         logger.info(f"User {marzban_username} not found in Marzban, attempting to create")
 
         try:
+            if multi_panel:
+                panel = await panels.choose_for_new_user()
+                marzban, panel_name = panel.api, panel.name
+                logger.info(f"Placing new user {marzban_username} on panel {panel_name} ({panels.placement})")
+
             await message.answer(
                 f"⏳ Пользователь <code>{marzban_username}</code> не найден в Marzban\n"
                 "Создаю автоматически с параметрами:\n"
@@ -213,10 +312,13 @@ async def marzban_username_entered(
     else:
         existing_summary = "\n\n⭐️ Это будет основная привязка для пользователя."
 
+    panel_line = f"Панель: <b>{panel_name}</b>\n" if multi_panel else ""
+
     # Store and ask for confirmation
     await state.update_data(
         marzban_username=marzban_username,
         has_existing_bindings=bool(existing_bindings),
+        panel=panel_name,
     )
     await state.set_state(AddUserStates.waiting_for_confirmation)
 
@@ -224,6 +326,7 @@ async def marzban_username_entered(
         f"✅ <b>Подтвердите добавление:</b>\n\n"
         f"Telegram ID: <code>{telegram_id}</code>\n"
         f"Marzban username: <code>{marzban_username}</code>\n"
+        f"{panel_line}"
         f"Статус в Marzban: <b>{marzban_user.status.upper()}</b>"
         f"{existing_summary}",
         reply_markup=get_confirmation_inline("confirm_add_user"),
@@ -243,7 +346,7 @@ async def confirm_add_user(callback: CallbackQuery, state: FSMContext, session:
     marzban_username = data["marzban_username"]
 
     try:
-        new_user = await create_user(session, telegram_id, marzban_username)
+        new_user = await create_user(session, telegram_id, marzban_username, panel=data.get("panel"))
     except ValueError as error:
         await callback.answer(f"❌ {error}", show_alert=True)
         return
@@ -290,7 +393,14 @@ async def confirm_add_user(callback: CallbackQuery, state: FSMContext, session:
 # ============= ADMIN: LIST USERS (с синхронизацией Marzban) =============
 @router.callback_query(F.data == "admin_list_users")
 @router.callback_query(F.data.startswith("admin_users_page:"))
-async def list_all_users(callback: CallbackQuery, is_admin: bool, session: AsyncSession, marzban: MarzbanAPI):
+async def list_all_users(
+    callback: CallbackQuery,
+    is_admin: bool,
+    session: AsyncSession,
+    marzban: MarzbanAPI,
+    user_mirror: MarzbanUserMirror | None = None,
+    panels: PanelRegistry | None = None,
+):
     """List users with Marzban sync"""
     if not is_admin:
         await callback.answer("❌ Доступ запрещён", show_alert=True)
@@ -305,23 +415,36 @@ async def list_all_users(callback: CallbackQuery, is_admin: bool, session: Async
     offset = page * page_size
 
     try:
-        # Get Marzban users
-        logger.info(f"Fetching Marzban users list (offset={offset}, limit={page_size})")
-        marzban_users_list, marzban_total = await marzban.list_users(offset=offset, limit=page_size)
-
-        if marzban_users_list is None:
-            logger.error("marzban.list_users() returned None for users list")
-            await callback.answer("❌ Marzban API вернул пустой ответ", show_alert=True)
-            return
+        # Get Marzban users (local snapshot if loaded)
+        data_age_line = ""
+        if panels is not None and len(panels) > 1:
+            # All panels, one after another
+            panel_users, marzban_total = await panels.list_users(offset=offset, limit=page_size)
+        elif _mirror_ready(user_mirror):
+            marzban_users_list, marzban_total = user_mirror.page(offset=offset, limit=page_size)
+            panel_users = [(None, user_data) for user_data in marzban_users_list]
+            data_age_line = f"{format_data_age(user_mirror.age)}\n"
+        else:
+            logger.info(f"Fetching Marzban users list (offset={offset}, limit={page_size})")
+            marzban_users_list, marzban_total = await marzban.list_users(offset=offset, limit=page_size)
+            if marzban_users_list is None:
+                logger.error("marzban.list_users() returned None for users list")
+                await callback.answer("❌ Marzban API вернул пустой ответ", show_alert=True)
+                return
+            panel_users = [(None, user_data) for user_data in marzban_users_list]
 
-        logger.info(f"Got {len(marzban_users_list)} users from Marzban (total: {marzban_total})")
+        logger.info(f"Got {len(panel_users)} users from Marzban (total: {marzban_total})")
 
-        # Get bot DB users
-        db_users, db_total = await list_users(session, offset=0, limit=1000)
+        # Bot bindings of the users on this page only
+        page_usernames = [
+            user_data.get("username") for _, user_data in panel_users if isinstance(user_data, dict)
+        ]
+        db_users = await list_bindings_for_usernames(session, page_usernames)
+        db_total = await count_users(session)
         db_users_map: dict[str, list[User]] = defaultdict(list)
         for db_user in db_users:
             db_users_map[db_user.marzban_username].append(db_user)
-        logger.info(f"Got {db_total} users from bot database")
+        logger.info(f"Got {len(db_users)} page bindings of {db_total} bot users")
 
         total_pages = math.ceil(marzban_total / page_size) if marzban_total > 0 else 1
 
@@ -329,13 +452,14 @@ async def list_all_users(callback: CallbackQuery, is_admin: bool, session: Async
             f"📋 <b>Список пользователей Marzban</b>\n"
             f"Страница {page + 1}/{total_pages}\n"
             f"Всего в Marzban: <b>{marzban_total}</b>\n"
-            f"Зарегистрировано в боте: <b>{db_total}</b>\n\n"
+            f"Зарегистрировано в боте: <b>{db_total}</b>\n"
+            f"{data_age_line}\n"
         )
 
-        if not marzban_users_list:
+        if not panel_users:
             text += "📭 Пользователей не найдено на этой странице"
         else:
-            for i, marzban_user_data in enumerate(marzban_users_list, start=offset + 1):
+            for i, (panel_name, marzban_user_data) in enumerate(panel_users, start=offset + 1):
                 if not isinstance(marzban_user_data, dict):
                     logger.warning(f"Invalid user data format at index {i}: {type(marzban_user_data)}")
                     continue
@@ -352,9 +476,10 @@ async def list_all_users(callback: CallbackQuery, is_admin: bool, session: Async
                 admin_badge = "👑 " if any(binding.is_admin for binding in bindings) else ""
 
                 bindings_hint = f" ({len(bindings)} TG)" if len(bindings) > 1 else ""
+                panel_tag = f"[{panel_name}] " if panel_name else ""
 
                 text += (
-                    f"{i}. {admin_badge}<b>{username}</b> {in_bot}{bindings_hint}\n"
+                    f"{i}. {admin_badge}{panel_tag}<b>{username}</b> {in_bot}{bindings_hint}\n"
                     f"   ├ Статус: {status}\n"
                     f"   └ Использовано: {format_bytes(used)}\n\n"
                 )
@@ -376,6 +501,78 @@ async def list_all_users(callback: CallbackQuery, is_admin: bool, session: Async
         await callback.answer("❌ Не удалось получить список пользователей", show_alert=True)
 
 
+# ============= ADMIN: BOT BINDINGS AND AUDIT LOG =============
+DB_LIST_PAGE_SIZE = 10
+
+
+async def _show_db_page(callback: CallbackQuery, text: str, prefix: str, page: int, db_page: Page) -> None:
+    """Render page of a bot database list with cursor navigation"""
+    total_pages = max(math.ceil(db_page.total / DB_LIST_PAGE_SIZE), page + 1)
+    keyboard = get_cursor_navigation(prefix, page, total_pages, db_page.prev_cursor, db_page.next_cursor)
+    try:
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    except TelegramBadRequest:
+        # Same page requested again
+        pass
+    await callback.answer()
+
+
+@router.callback_query((F.data == "admin_bindings") | F.data.startswith("admin_bindings_page:"))
+async def list_bot_bindings(callback: CallbackQuery, is_admin: bool, session: AsyncSession):
+    """Telegram bindings stored in the bot database, newest first"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    page, cursor = parse_page_callback(callback.data)
+    users_page = await list_users(session, limit=DB_LIST_PAGE_SIZE, cursor=cursor)
+
+    text = f"🤖 <b>Привязки в боте</b>\nВсего: <b>{users_page.total}</b>\n\n"
+    if not users_page.items:
+        text += "📭 Привязок нет"
+    for i, user in enumerate(users_page.items, start=page * DB_LIST_PAGE_SIZE + 1):
+        admin_badge = "👑 " if user.is_admin else ""
+        role_label = "⭐️ Основной" if user.primary_user else "➕ Дополнительный"
+        panel_tag = f"[{html.escape(user.panel)}] " if user.panel else ""
+        text += (
+            f"{i}. {admin_badge}{panel_tag}<b>{html.escape(user.marzban_username)}</b>\n"
+            f"   ├ Роль: {role_label}\n"
+            f"   ├ TG ID: <code>{user.telegram_id}</code>\n"
+            f"   └ Создан: {user.created_at.strftime('%d.%m.%Y')}\n\n"
+        )
+
+    await _show_db_page(callback, text, "admin_bindings_page", page, users_page)
+
+
+@router.callback_query((F.data == "admin_audit") | F.data.startswith("admin_audit_page:"))
+async def show_audit_log(callback: CallbackQuery, is_admin: bool, session: AsyncSession):
+    """Admin actions log, newest first"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    page, cursor = parse_page_callback(callback.data)
+    logs_page = await get_admin_logs(session, limit=DB_LIST_PAGE_SIZE, cursor=cursor)
+
+    text = f"📜 <b>Журнал действий</b>\nВсего записей: <b>{logs_page.total}</b>\n\n"
+    if not logs_page.items:
+        text += "📭 Записей нет"
+    for log in logs_page.items:
+        lines = [
+            f"Админ: <code>{log.admin_telegram_id}</code>",
+            f"Действие: <b>{html.escape(log.action)}</b>",
+        ]
+        if log.target_username:
+            lines.append(f"Пользователь: <code>{html.escape(log.target_username)}</code>")
+        if log.details:
+            lines.append(f"Детали: {html.escape(log.details[:200])}")
+        text += f"🕐 {log.created_at.strftime('%d.%m.%Y %H:%M')}\n"
+        text += "".join(f"{'└' if i == len(lines) - 1 else '├'} {line}\n" for i, line in enumerate(lines))
+        text += "\n"
+
+    await _show_db_page(callback, text, "admin_audit_page", page, logs_page)
+
+
 # ============= ADMIN: SEARCH USER =============
 @router.callback_query(F.data == "admin_search_user")
 async def start_search(callback: CallbackQuery, state: FSMContext, is_admin: bool):
@@ -394,8 +591,33 @@ async def start_search(callback: CallbackQuery, state: FSMContext, is_admin: boo
     await callback.answer()
 
 
+async def _search_panel(panel: Panel, query: str) -> tuple[dict | None, list[dict]]:
+    """Exact match and similar users on one panel (similar ones only from a loaded snapshot)"""
+    if panel.mirror_ready:
+        user_data = panel.mirror.get(query)
+        if user_data is not None:
+            return user_data, []
+        return None, panel.mirror.search(query, limit=10)
+
+    try:
+        found = await panel.api.get_user(query)
+    except MarzbanAPIError as e:
+        if "not found" in str(e):
+            return None, []
+        raise
+    return {"username": found.username, "status": found.status, "used_traffic": found.used_traffic}, []
+
+
 @router.message(SearchUserStates.waiting_for_query, F.text)
-async def search_query(message: Message, state: FSMContext, session: AsyncSession, marzban: MarzbanAPI, is_admin: bool):
+async def search_query(
+    message: Message,
+    state: FSMContext,
+    session: AsyncSession,
+    marzban: MarzbanAPI,
+    is_admin: bool,
+    user_mirror: MarzbanUserMirror | None = None,
+    panels: PanelRegistry | None = None,
+):
     """Handle search query"""
     if not is_admin:
         return
@@ -405,17 +627,24 @@ async def search_query(message: Message, state: FSMContext, session: AsyncSessio
     # Search in bot DB
     db_users = await search_users(session, query)
 
-    # Try to find in Marzban
-    marzban_user = None
+    # Try to find on every Marzban panel (local snapshots if loaded)
+    search_panels = _all_panels(marzban, user_mirror, panels)
     try:
-        marzban_user = await marzban.get_user(query)
-    except MarzbanAPIError:
-        pass
+        results, failed = await _query_panels(
+            [(panel.name, panel) for panel in search_panels], lambda panel: _search_panel(panel, query)
+        )
+    except MarzbanUnavailableError:
+        results, failed = [], [panel.name for panel in search_panels]
+
+    marzban_users = [(name, exact) for name, (exact, _) in results if exact is not None]
+    similar_users = [(name, user_data) for name, (_, similar) in results for user_data in similar][:10]
+    show_panel = len(search_panels) > 1
+    failed_note = f"\n\n⚠️ Недоступны панели: {', '.join(failed)}" if failed else ""
 
-    if not db_users and not marzban_user:
+    if not db_users and not marzban_users and not similar_users:
         await message.answer(
             f"❌ Не найдено: <code>{query}</code>\n\n"
-            "Пользователь не найден ни в боте, ни в Marzban.",
+            f"Пользователь не найден ни в боте, ни в Marzban.{failed_note}",
             parse_mode="HTML"
         )
         await state.clear()
@@ -437,83 +666,155 @@ async def search_query(message: Message, state: FSMContext, session: AsyncSessio
             )
 
     # Marzban results
-    if marzban_user:
-        in_bot = any(u.marzban_username == marzban_user.username for u in db_users) if db_users else False
-
+    if marzban_users:
+        bound = {(u.marzban_username, u.panel or settings.marzban_panel_name) for u in db_users}
         text += f"\n<b>🔐 В Marzban:</b>\n\n"
-        text += f"<b>{marzban_user.username}</b>\n"
-        text += f"├ Статус: {marzban_user.status}\n"
-        text += f"├ Использовано: {format_bytes(marzban_user.used_traffic)}\n"
-        text += f"└ В боте: {'✅ Да' if in_bot else '❌ Нет'}\n"
+        for panel_name, user_data in marzban_users:
+            marzban_username = user_data["username"]
+            in_bot = (marzban_username, panel_name) in bound
+
+            text += f"<b>{marzban_username}</b>\n"
+            if show_panel:
+                text += f"├ Панель: {panel_name}\n"
+            text += f"├ Статус: {user_data.get('status', 'unknown')}\n"
+            text += f"├ Использовано: {format_bytes(user_data.get('used_traffic') or 0)}\n"
+            text += f"└ В боте: {'✅ Да' if in_bot else '❌ Нет'}\n\n"
+    elif similar_users:
+        text += f"\n<b>🔐 Похожие в Marzban ({len(similar_users)}):</b>\n\n"
+        for panel_name, user_data in similar_users:
+            panel_label = f" ({panel_name})" if show_panel else ""
+            text += f"• <code>{user_data['username']}</code> — {user_data.get('status', 'unknown')}{panel_label}\n"
+
+    ages = [panel.mirror.age for panel in search_panels if panel.mirror_ready and panel.mirror.age is not None]
+    if ages:
+        text += f"\n{format_data_age(max(ages))}"
+    text += failed_note
 
     await message.answer(text, parse_mode="HTML")
     await state.clear()
 
 
 # ============= ADMIN: STATISTICS (улучшенная) =============
-@router.callback_query(F.data == "admin_stats")
-async def show_advanced_stats(callback: CallbackQuery, is_admin: bool, session: AsyncSession, marzban: MarzbanAPI):
+STATS_NEAR_LIMIT_RATIO = 0.9
+STATS_EXPIRING_DAYS = 7
+STATS_DEFAULT_PERIOD = 30
+STATS_PERIOD_LABELS = {1: "24 часа", 7: "7 дней", 30: "30 дней"}
+STATS_NODES_LIMIT = 20
+
+
+def _stats_period(data: str, prefix: str) -> int:
+    """Report period (days) from callback data"""
+    days = data[len(prefix):] if data.startswith(prefix) else ""
+    return int(days) if days.isdigit() and int(days) in STATS_PERIOD_LABELS else STATS_DEFAULT_PERIOD
+
+
+def _period_start(days: int) -> datetime:
+    """Start of report period (UTC, as Marzban stores usage)"""
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+
+
+def _mirror_columns(user_mirror: MarzbanUserMirror | None, panels: PanelRegistry | None) -> UserColumns | None:
+    """Columnar snapshot of users from loaded mirrors (None if no snapshot is loaded yet)"""
+    if panels is not None:
+        ready = [panel.mirror for panel in panels if panel.mirror_ready]
+    else:
+        ready = [user_mirror] if _mirror_ready(user_mirror) else []
+
+    if not ready:
+        return None
+    if len(ready) == 1:
+        return ready[0].columns()
+    return UserColumns.merge(mirror.columns() for mirror in ready)
+
+
+@router.callback_query((F.data == "admin_stats") | F.data.startswith("admin_stats_period_"))
+async def show_advanced_stats(
+    callback: CallbackQuery,
+    is_admin: bool,
+    session: AsyncSession,
+    marzban: MarzbanAPI,
+    user_mirror: MarzbanUserMirror | None = None,
+    panels: PanelRegistry | None = None,
+):
     """Show advanced statistics with Marzban data"""
     if not is_admin:
         await callback.answer("❌ Доступ запрещён", show_alert=True)
         return
 
+    days = _stats_period(callback.data, "admin_stats_period_")
     try:
-        # Get bot users
-        logger.info("Fetching bot database users for statistics")
-        db_users, db_total = await list_users(session, limit=1000)
-        db_admins = sum(1 for u in db_users if u.is_admin)
+        # Bot users: one row of maintained counters
+        counters = await get_user_counters(session)
+        db_total = counters.total_bindings
+        db_admins = counters.admins
         logger.info(f"Bot DB: {db_total} users ({db_admins} admins)")
 
-        # Get Marzban stats
-        logger.info("Fetching Marzban users for statistics")
-        marzban_users_list, marzban_total = await marzban.list_users(offset=0, limit=1000)
-
-        if marzban_users_list is None:
-            logger.error("marzban.list_users() returned None in statistics")
-            marzban_users_list = []
-            marzban_total = 0
-
-        logger.info(f"Marzban API: {marzban_total} users ({len(marzban_users_list)} fetched)")
-
-        # Calculate Marzban stats
-        active_users = sum(1 for u in marzban_users_list if isinstance(u, dict) and u.get('status') == 'active')
-        disabled_users = sum(1 for u in marzban_users_list if isinstance(u, dict) and u.get('status') == 'disabled')
-        limited_users = sum(1 for u in marzban_users_list if isinstance(u, dict) and u.get('status') == 'limited')
-        expired_users = sum(1 for u in marzban_users_list if isinstance(u, dict) and u.get('status') == 'expired')
+        # Panel counters and period traffic: two aggregate calls per panel instead of a user dump
+        clients = _panel_clients(marzban, panels)
+        start = _period_start(days)
+        (systems, failed), (usages, _) = await asyncio.gather(
+            _query_panels(clients, lambda api: api.get_system_stats()),
+            _query_panels(clients, lambda api: api.get_users_usage(start)),
+        )
 
-        # Calculate total traffic
-        total_traffic = sum(u.get('used_traffic', 0) for u in marzban_users_list if isinstance(u, dict))
+        def total(key: str) -> int:
+            return sum(system.get(key) or 0 for _, system in systems)
 
-        # Calculate online users (активность за последние 5 минут)
-        now = datetime.now().timestamp()
-        online_users = sum(1 for u in marzban_users_list
-                          if isinstance(u, dict) and u.get('online_at') and (now - u.get('online_at')) < 300)
+        marzban_total = total("total_user")
+        period_traffic = sum(usage.get("used_traffic") or 0 for _, panel_usages in usages for usage in panel_usages)
+        logger.info(f"Marzban API: {marzban_total} users, {period_traffic} bytes in {days} days")
 
         text = (
             "📊 <b>Расширенная статистика</b>\n\n"
             "<b>📊 База бота:</b>\n"
             f"├ Всего пользователей: <b>{db_total}</b>\n"
             f"├ Администраторов: <b>{db_admins}</b>\n"
-            f"└ Обычных: <b>{db_total - db_admins}</b>\n\n"
+            f"├ Обычных: <b>{db_total - db_admins}</b>\n"
+            f"└ Аккаунтов Marzban: <b>{counters.marzban_usernames}</b>\n\n"
             "<b>🔐 Marzban панель:</b>\n"
             f"├ Всего аккаунтов: <b>{marzban_total}</b>\n"
-            f"├ 🟢 Активных: <b>{active_users}</b>\n"
-            f"├ 🔴 Отключенных: <b>{disabled_users}</b>\n"
-            f"├ 🟡 Ограниченных: <b>{limited_users}</b>\n"
-            f"├ ⚪️ Истекших: <b>{expired_users}</b>\n"
-            f"└ 💚 Онлайн сейчас: <b>{online_users}</b>\n\n"
-            "<b>📈 Трафик:</b>\n"
-            f"└ Общий использованный: <b>{format_bytes(total_traffic)}</b>\n\n"
+            f"├ 🟢 Активных: <b>{total('users_active')}</b>\n"
+            f"├ 🔴 Отключенных: <b>{total('users_disabled')}</b>\n"
+            f"├ 🟡 Ограниченных: <b>{total('users_limited')}</b>\n"
+            f"├ ⚪️ Истекших: <b>{total('users_expired')}</b>\n"
+            f"├ ⏸ Ожидают активации: <b>{total('users_on_hold')}</b>\n"
+            f"└ 💚 Онлайн сейчас: <b>{total('online_users')}</b>\n\n"
+            f"<b>📈 Трафик за {STATS_PERIOD_LABELS[days]}:</b>\n"
+            f"└ Пользователи: <b>{format_bytes(period_traffic)}</b>\n\n"
+        )
+
+        # Per-user distribution needs every user record - only from the local snapshot
+        columns = _mirror_columns(user_mirror, panels)
+        if columns is not None:
+            quantiles = columns.traffic_quantiles((0.5, 0.9, 0.99))
+            near_limit = columns.near_limit(STATS_NEAR_LIMIT_RATIO)
+            expiring = columns.expiring_within(STATS_EXPIRING_DAYS)
+            text += (
+                "<b>📦 Трафик на аккаунт:</b>\n"
+                f"├ Медиана: <b>{format_bytes(quantiles[0.5])}</b>\n"
+                f"├ 90-й перцентиль: <b>{format_bytes(quantiles[0.9])}</b>\n"
+                f"└ 99-й перцентиль: <b>{format_bytes(quantiles[0.99])}</b>\n\n"
+                "<b>⚠️ Требуют внимания:</b>\n"
+                f"├ Трафик ≥{STATS_NEAR_LIMIT_RATIO:.0%} лимита: <b>{len(near_limit)}</b>\n"
+                f"└ Истекают в ближайшие {STATS_EXPIRING_DAYS} дн.: <b>{len(expiring)}</b>\n\n"
+            )
+        else:
+            text += "<i>Распределение трафика появится после загрузки снимка пользователей</i>\n\n"
+
+        text += (
             f"<b>🔗 Синхронизация:</b>\n"
             f"└ В боте / В Marzban: <b>{db_total}/{marzban_total}</b>"
         )
+        if failed:
+            text += f"\n\n⚠️ Недоступны панели: {', '.join(failed)}"
+        if _mirror_ready(user_mirror):
+            text += f"\n\n{format_data_age(user_mirror.age)}"
 
-        await callback.message.edit_text(
-            text,
-            reply_markup=get_back_to_admin_menu(),
-            parse_mode="HTML"
-        )
+        try:
+            await callback.message.edit_text(text, reply_markup=get_stats_menu(days), parse_mode="HTML")
+        except TelegramBadRequest:
+            # Same period selected again - nothing changed
+            pass
         await callback.answer()
 
     except Exception as e:
@@ -521,6 +822,457 @@ async def show_advanced_stats(callback: CallbackQuery, is_admin: bool, session:
         await callback.answer("❌ Не удалось получить статистику", show_alert=True)
 
 
+@router.callback_query(F.data.startswith("admin_nodes_"))
+async def show_nodes_usage(
+    callback: CallbackQuery,
+    is_admin: bool,
+    marzban: MarzbanAPI,
+    panels: PanelRegistry | None = None,
+):
+    """Show traffic per Marzban node"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    days = _stats_period(callback.data, "admin_nodes_")
+    try:
+        clients = _panel_clients(marzban, panels)
+        start = _period_start(days)
+        (nodes, failed), (usages, _) = await asyncio.gather(
+            _query_panels(clients, lambda api: api.get_nodes_usage(start)),
+            _query_panels(clients, lambda api: api.get_users_usage(start)),
+        )
+        users_by_node = {
+            (name, usage.get("node_id")): usage.get("used_traffic") or 0
+            for name, panel_usages in usages
+            for usage in panel_usages
+        }
+
+        text = f"🖥 <b>Трафик по узлам за {STATS_PERIOD_LABELS[days]}</b>\n\n"
+        for name, panel_nodes in nodes:
+            if len(clients) > 1:
+                text += f"<b>🔐 {html.escape(name)}:</b>\n"
+            if not panel_nodes:
+                text += "└ Нет данных\n\n"
+                continue
+
+            ordered = sorted(
+                panel_nodes, key=lambda node: (node.get("uplink") or 0) + (node.get("downlink") or 0), reverse=True
+            )
+            shown = ordered[:STATS_NODES_LIMIT]
+            for index, node in enumerate(shown):
+                prefix = "└" if index == len(shown) - 1 else "├"
+                text += (
+                    f"{prefix} <b>{html.escape(str(node.get('node_name') or node.get('node_id')))}</b>: "
+                    f"↑ {format_bytes(node.get('uplink') or 0)} ↓ {format_bytes(node.get('downlink') or 0)}"
+                )
+                user_traffic = users_by_node.get((name, node.get("node_id")))
+                if user_traffic is not None:
+                    text += f" | 👥 {format_bytes(user_traffic)}"
+                text += "\n"
+            if len(ordered) > len(shown):
+                text += f"<i>... и ещё {len(ordered) - len(shown)} узлов</i>\n"
+            text += "\n"
+
+        text += "<i>↑/↓ - трафик узла, 👥 - трафик пользователей через узел</i>"
+        if failed:
+            text += f"\n\n⚠️ Недоступны панели: {', '.join(failed)}"
+
+        try:
+            await callback.message.edit_text(text, reply_markup=get_nodes_menu(days), parse_mode="HTML")
+        except TelegramBadRequest:
+            pass
+        await callback.answer()
+
+    except Exception as e:
+        logger.error(f"Failed to get nodes usage: {e}", exc_info=True)
+        await callback.answer("❌ Не удалось получить трафик по узлам", show_alert=True)
+
+
+# ============= ADMIN: INBOUNDS =============
+async def _render_inbounds(
+    callback: CallbackQuery, panel_inbounds: list[tuple[str, dict[str, list[str]]]], failed: list[str]
+):
+    """Show inbounds screen (grouped by panel if there are several)"""
+    show_panel = len(panel_inbounds) + len(failed) > 1
+    text = "🔌 <b>Inbounds Marzban</b>\n\n"
+    for panel_name, inbounds in panel_inbounds:
+        if show_panel:
+            text += f"🖥 <b>Панель {panel_name}</b>\n"
+        if not inbounds:
+            text += "📭 Inbounds не найдены\n"
+        for protocol, tags in inbounds.items():
+            text += f"<b>{protocol}</b>\n"
+            for tag in tags:
+                text += f"└ <code>{tag}</code>\n"
+            text += "\n"
+    if failed:
+        text += f"⚠️ Недоступны панели: {', '.join(failed)}\n\n"
+    text += (
+        "Новые пользователи создаются со всеми inbounds своей панели из этого списка.\n"
+        "После изменения конфигурации панели нажмите «Обновить»."
+    )
+
+    await callback.message.edit_text(text, reply_markup=get_inbounds_menu(), parse_mode="HTML")
+
+
+@router.callback_query(F.data == "admin_inbounds")
+async def show_inbounds(
+    callback: CallbackQuery, is_admin: bool, marzban: MarzbanAPI, panels: PanelRegistry | None = None
+):
+    """Show cached inbounds of every panel"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    try:
+        inbounds, failed = await _query_panels(_panel_clients(marzban, panels), lambda api: api.get_inbounds())
+    except MarzbanAPIError as e:
+        logger.error(f"Failed to get inbounds: {e}", exc_info=True)
+        await callback.answer("❌ Не удалось получить inbounds", show_alert=True)
+        return
+
+    await _render_inbounds(callback, inbounds, failed)
+    await callback.answer()
+
+
+@router.callback_query(F.data == "admin_inbounds_refresh")
+async def refresh_inbounds(
+    callback: CallbackQuery,
+    is_admin: bool,
+    session: AsyncSession,
+    marzban: MarzbanAPI,
+    panels: PanelRegistry | None = None,
+):
+    """Drop inbounds cache and reload from every panel"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    clients = _panel_clients(marzban, panels)
+    for _, api in clients:
+        api.invalidate_inbounds()
+    try:
+        inbounds, failed = await _query_panels(clients, lambda api: api.get_inbounds())
+    except MarzbanAPIError as e:
+        logger.error(f"Failed to refresh inbounds: {e}", exc_info=True)
+        await callback.answer("❌ Не удалось получить inbounds", show_alert=True)
+        return
+
+    await log_admin_action(
+        session,
+        callback.from_user.id,
+        "refresh_inbounds",
+        details="; ".join(
+            f"{panel_name}: " + ", ".join(f"{protocol}: {len(tags)}" for protocol, tags in panel_inbounds.items())
+            for panel_name, panel_inbounds in inbounds
+        ),
+    )
+
+    await _render_inbounds(callback, inbounds, failed)
+    await callback.answer("✅ Inbounds обновлены")
+
+
+# ============= ADMIN: BULK CHANGES =============
+BULK_TARGET_NAMES = {
+    "active": "все активные",
+    "expired": "все истёкшие",
+    "limited": "все с исчерпанным трафиком",
+    "disabled": "все отключённые",
+}
+
+BULK_PROGRESS_INTERVAL = 2.0  # Seconds between progress message edits
+
+
+def _parse_usernames(text: str) -> list[str]:
+    """Split username list separated by spaces, commas or new lines"""
+    return list(dict.fromkeys(re.findall(r"[^\s,;]+", text)))
+
+
+def _bulk_changes(action: str, value: int | None) -> UserChanges:
+    """Build change from selected action"""
+    if action == "extend_days":
+        return UserChanges(extend_days=value)
+    if action == "add_gb":
+        return UserChanges(add_data_limit=value * 1024 ** 3)
+    if action == "enable":
+        return UserChanges(status="active")
+    return UserChanges(status="disabled")
+
+
+def _bulk_description(action: str, value: int | None) -> str:
+    """Human readable change description"""
+    if action == "extend_days":
+        return f"📅 Продлить срок на {value} дн."
+    if action == "add_gb":
+        return f"📦 Добавить {value} ГБ трафика"
+    if action == "enable":
+        return "▶️ Включить"
+    return "⏸ Отключить"
+
+
+async def _status_targets(panel: Panel, status: str) -> list[str]:
+    """Usernames with given status on one panel (local snapshot if loaded)"""
+    if panel.mirror_ready:
+        return sorted(panel.mirror.usernames_with_status(status))
+    return [user_data["username"] async for user_data in panel.api.iter_users() if user_data.get("status") == status]
+
+
+async def _ask_bulk_action(
+    message: Message,
+    state: FSMContext,
+    usernames: list[str],
+    source: str,
+    edit: bool,
+    groups: dict[str, list[str]] | None = None,
+    failed_panels: list[str] | None = None,
+):
+    """Store selected users (grouped by panel if known) and show change types"""
+    await state.update_data(bulk_usernames=usernames, bulk_groups=groups, bulk_source=source)
+    await state.set_state(BulkModifyStates.choosing_action)
+
+    text = (
+        "🧰 <b>Массовые изменения</b>\n\n"
+        f"Выбрано пользователей: <b>{len(usernames)}</b> ({source})\n\n"
+    )
+    if failed_panels:
+        text += f"⚠️ Недоступны панели, их пользователи не выбраны: {', '.join(failed_panels)}\n\n"
+    text += "Что сделать?"
+    if edit:
+        await message.edit_text(text, reply_markup=get_bulk_action_menu(), parse_mode="HTML")
+    else:
+        await message.answer(text, reply_markup=get_bulk_action_menu(), parse_mode="HTML")
+
+
+async def _ask_bulk_confirmation(message: Message, state: FSMContext, edit: bool):
+    """Show summary before applying bulk change"""
+    data = await state.get_data()
+    usernames = data["bulk_usernames"]
+    preview = ", ".join(f"<code>{username}</code>" for username in usernames[:10])
+    if len(usernames) > 10:
+        preview += f" и ещё {len(usernames) - 10}"
+
+    await state.set_state(BulkModifyStates.confirmation)
+    text = (
+        "🧰 <b>Подтвердите массовое изменение</b>\n\n"
+        f"{_bulk_description(data['bulk_action'], data.get('bulk_value'))}\n"
+        f"Пользователей: <b>{len(usernames)}</b>\n\n"
+        f"{preview}"
+    )
+    if edit:
+        await message.edit_text(text, reply_markup=get_confirmation_inline("confirm_bulk"), parse_mode="HTML")
+    else:
+        await message.answer(text, reply_markup=get_confirmation_inline("confirm_bulk"), parse_mode="HTML")
+
+
+@router.callback_query(F.data == "admin_bulk")
+async def start_bulk(callback: CallbackQuery, state: FSMContext, is_admin: bool):
+    """Start bulk change flow"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    await state.set_state(BulkModifyStates.waiting_for_usernames)
+    await callback.message.edit_text(
+        "🧰 <b>Массовые изменения</b>\n\n"
+        "Отправьте список Marzban username (через пробел, запятую или с новой строки) "
+        "или выберите группу пользователей. Изменения применяются на всех панелях.",
+        reply_markup=get_bulk_target_menu(),
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@router.message(BulkModifyStates.waiting_for_usernames, F.text)
+async def bulk_usernames_entered(message: Message, state: FSMContext, is_admin: bool):
+    """Handle username list"""
+    if not is_admin:
+        return
+
+    usernames = _parse_usernames(message.text)
+    if not usernames:
+        await message.answer("❌ Не найдено ни одного username. Попробуйте ещё раз:", reply_markup=get_cancel_inline())
+        return
+
+    await _ask_bulk_action(message, state, usernames, "из списка", edit=False)
+
+
+@router.callback_query(BulkModifyStates.waiting_for_usernames, F.data.startswith("bulk_target:"))
+async def bulk_target_selected(
+    callback: CallbackQuery,
+    state: FSMContext,
+    is_admin: bool,
+    marzban: MarzbanAPI,
+    user_mirror: MarzbanUserMirror | None = None,
+    panels: PanelRegistry | None = None,
+):
+    """Select all users with given status on every panel"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    status = callback.data.split(":", 1)[1]
+    try:
+        targets, failed = await _query_panels(
+            [(panel.name, panel) for panel in _all_panels(marzban, user_mirror, panels)],
+            lambda panel: _status_targets(panel, status),
+        )
+    except MarzbanAPIError as e:
+        logger.error(f"Failed to collect users for bulk change: {e}", exc_info=True)
+        await callback.answer("❌ Не удалось получить пользователей из Marzban", show_alert=True)
+        return
+
+    groups = {name: usernames for name, usernames in targets if usernames}
+    usernames = [username for group in groups.values() for username in group]
+    if not usernames:
+        await callback.answer("📭 В этой группе нет пользователей", show_alert=True)
+        return
+
+    await _ask_bulk_action(
+        callback.message,
+        state,
+        usernames,
+        BULK_TARGET_NAMES.get(status, status),
+        edit=True,
+        groups=groups,
+        failed_panels=failed,
+    )
+    await callback.answer()
+
+
+@router.callback_query(BulkModifyStates.choosing_action, F.data.startswith("bulk_action:"))
+async def bulk_action_selected(callback: CallbackQuery, state: FSMContext, is_admin: bool):
+    """Handle change type"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    action = callback.data.split(":", 1)[1]
+    await state.update_data(bulk_action=action, bulk_value=None)
+
+    if action in ("extend_days", "add_gb"):
+        await state.set_state(BulkModifyStates.waiting_for_value)
+        prompt = "Сколько дней добавить?" if action == "extend_days" else "Сколько ГБ добавить?"
+        await callback.message.edit_text(
+            f"🧰 <b>Массовые изменения</b>\n\n{prompt}\n\n"
+            "<i>Пользователи с безлимитом останутся без ограничений.</i>",
+            reply_markup=get_cancel_inline(),
+            parse_mode="HTML"
+        )
+    else:
+        await _ask_bulk_confirmation(callback.message, state, edit=True)
+    await callback.answer()
+
+
+@router.message(BulkModifyStates.waiting_for_value, F.text)
+async def bulk_value_entered(message: Message, state: FSMContext, is_admin: bool):
+    """Handle days/GB amount"""
+    if not is_admin:
+        return
+
+    value = message.text.strip()
+    if not value.isdigit() or not 0 < int(value) <= 10000:
+        await message.answer("❌ Введите целое число от 1 до 10000:", reply_markup=get_cancel_inline())
+        return
+
+    await state.update_data(bulk_value=int(value))
+    await _ask_bulk_confirmation(message, state, edit=False)
+
+
+@router.callback_query(BulkModifyStates.confirmation, F.data == "confirm_bulk")
+async def confirm_bulk(
+    callback: CallbackQuery,
+    state: FSMContext,
+    session: AsyncSession,
+    is_admin: bool,
+    marzban: MarzbanAPI,
+    panels: PanelRegistry | None = None,
+):
+    """Apply bulk change with live progress (users of every panel)"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    data = await state.get_data()
+    await state.clear()
+    usernames = data["bulk_usernames"]
+    action, value = data["bulk_action"], data.get("bulk_value")
+    description = _bulk_description(action, value)
+    await callback.answer("⏳ Запущено")
+
+    total = len(usernames)
+    succeeded = 0
+    failures: list[BulkResult] = []
+    started = time.monotonic()
+    last_update = started
+
+    async def show_progress(done: int):
+        try:
+            await callback.message.edit_text(
+                f"⏳ <b>Массовое изменение</b>\n\n{description}\n\n"
+                f"{format_progress_bar(done, total)}\n"
+                f"Обработано: {done}/{total}\n"
+                f"✅ Успешно: {succeeded}\n"
+                f"❌ Ошибок: {len(failures)}",
+                parse_mode="HTML"
+            )
+        except TelegramBadRequest:
+            # Message text did not change or message was deleted
+            pass
+
+    # The callback is already answered, bulk changes are not bound by its time budget
+    with no_deadline():
+        await show_progress(0)
+        changes = _bulk_changes(action, value)
+        concurrency = settings.marzban_bulk_concurrency
+        if panels is None:
+            results = marzban.bulk_modify(usernames, changes, concurrency)
+        else:
+            # Users typed by hand are looked up on the panels that have them
+            groups = data.get("bulk_groups")
+            if groups is None:
+                groups, unresolved = await panels.group_by_panel(usernames, concurrency)
+                failures.extend(unresolved)
+            results = panels.bulk_modify(groups, changes, concurrency)
+
+        done = len(failures)
+        async for result in results:
+            done += 1
+            if result.ok:
+                succeeded += 1
+            else:
+                failures.append(result)
+
+            # Telegram limits message edits, so update progress periodically
+            if time.monotonic() - last_update >= BULK_PROGRESS_INTERVAL:
+                last_update = time.monotonic()
+                await show_progress(done)
+
+        elapsed = time.monotonic() - started
+        await log_admin_action(
+            session,
+            callback.from_user.id,
+            "bulk_modify",
+            details=f"{description}: {succeeded}/{total} ok ({data.get('bulk_source')})",
+        )
+
+    text = (
+        "✅ <b>Массовое изменение завершено</b>\n\n"
+        f"{description}\n\n"
+        f"✅ Успешно: {succeeded}/{total}\n"
+        f"❌ Ошибок: {len(failures)}\n"
+        f"⏱ Время: {elapsed:.1f} сек\n"
+    )
+    if failures:
+        text += "\n<b>Ошибки:</b>\n"
+        for result in failures[:10]:
+            text += f"• <code>{result.username}</code>: {html.escape(result.error or '')[:100]}\n"
+        if len(failures) > 10:
+            text += f"... и ещё {len(failures) - 10}\n"
+
+    await callback.message.edit_text(text, reply_markup=get_back_to_admin_menu(), parse_mode="HTML")
+
+
 # ============= CANCEL ACTIONS =============
 @router.callback_query(F.data == "cancel_action")
 async def cancel_action(callback: CallbackQuery, state: FSMContext, is_admin: bool):
@@ -538,6 +1290,149 @@ async def cancel_action(callback: CallbackQuery, state: FSMContext, is_admin: bo
     await callback.answer()
 
 
+# ============= ADMIN: DIAGNOSTICS =============
+def _format_ms(seconds: float) -> str:
+    """Format latency in milliseconds"""
+    return f"{seconds * 1000:.0f} мс"
+
+
+def _format_operations(metrics: RequestMetrics, limit: int = 6) -> str:
+    """Slowest operations as tree lines"""
+    rows = metrics.summary()[:limit]
+    if not rows:
+        return "└ Запросов ещё не было\n"
+
+    text = ""
+    for index, row in enumerate(rows):
+        prefix = "└" if index == len(rows) - 1 else "├"
+        errors = f", ❌ {row['errors']}" if row["errors"] else ""
+        text += (
+            f"{prefix} <code>{row['operation']}</code>: {row['calls']}{errors} | "
+            f"p50 {_format_ms(row['p50'])}, p95 {_format_ms(row['p95'])}\n"
+        )
+    return text
+
+
+def _diagnostics_snapshot(
+    marzban: MarzbanAPI,
+    panels: PanelRegistry | None,
+    telegram_metrics: RequestMetrics | None,
+    db_metrics: SessionMetrics | None,
+    pool_metrics: PoolMetrics | None,
+) -> dict:
+    """Machine-readable diagnostics document"""
+    return {
+        "generated_at": time.time(),
+        "marzban": {
+            name: {
+                "requests": api.metrics.snapshot(),
+                "circuit_breaker": api.breaker_stats(),
+                "limiter": api.limiter_stats(),
+                "cache": api.cache_stats(),
+                "coalescing": api.coalescing_stats(),
+            }
+            for name, api in _panel_clients(marzban, panels)
+        },
+        "telegram": telegram_metrics.snapshot() if telegram_metrics is not None else None,
+        "database": {
+            "sessions": db_metrics.snapshot() if db_metrics is not None else None,
+            "pool": pool_metrics.snapshot() if pool_metrics is not None else None,
+            "identity_cache": identity_cache.stats(),
+        },
+    }
+
+
+@router.callback_query(F.data == "admin_diagnostics")
+async def show_diagnostics(
+    callback: CallbackQuery,
+    is_admin: bool,
+    marzban: MarzbanAPI,
+    panels: PanelRegistry | None = None,
+    telegram_metrics: RequestMetrics | None = None,
+    db_metrics: SessionMetrics | None = None,
+    pool_metrics: PoolMetrics | None = None,
+):
+    """Show request latency and error metrics"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    text = "📈 <b>Диагностика</b>\n\n"
+    for name, api in _panel_clients(marzban, panels):
+        breaker = api.breaker_stats()
+        limiter = api.limiter_stats()
+        user_cache = api.cache_stats()["users"]
+        breaker_icon = "🟢" if breaker["state"] == "closed" else "🔴"
+        text += (
+            f"<b>🔐 Marzban ({name}):</b>\n"
+            f"├ {breaker_icon} Circuit breaker: {breaker['state']}\n"
+            f"├ Параллельно: {limiter['in_flight']}/{limiter['limit']}, в очереди: {limiter['waiting']}\n"
+            f"├ Кэш пользователей: {user_cache['hit_rate']:.0%} попаданий\n"
+            f"{_format_operations(api.metrics)}\n"
+        )
+
+    if telegram_metrics is not None:
+        text += f"<b>✈️ Telegram:</b>\n{_format_operations(telegram_metrics)}\n"
+
+    identity = identity_cache.stats()
+    text += "<b>🗄 База бота:</b>\n"
+    if db_metrics is not None and db_metrics.updates:
+        hold = db_metrics.hold_time
+        text += (
+            f"├ Обновлений с соединением: {db_metrics.connections_used}/{db_metrics.updates} "
+            f"({db_metrics.connections_used / db_metrics.updates:.0%})\n"
+        )
+        if hold.count:
+            wait = db_metrics.wait_time
+            text += (
+                f"├ Ожидание соединения: p50 {_format_ms(wait.quantile(0.5))}, p95 {_format_ms(wait.quantile(0.95))}\n"
+                f"├ Удержание соединения: p50 {_format_ms(hold.quantile(0.5))}, p95 {_format_ms(hold.quantile(0.95))}\n"
+            )
+    if pool_metrics is not None:
+        text += (
+            f"├ Пул: занято {pool_metrics.checked_out}/{pool_metrics.size}+{pool_metrics.max_overflow}, "
+            f"пик {pool_metrics.peak_checked_out}, сверх размера: {pool_metrics.overflow_checkouts}\n"
+            f"├ Подключений открыто: {pool_metrics.connects}, сброшено: {pool_metrics.invalidations}\n"
+        )
+    text += (
+        f"└ Кэш авторизации: {identity['hit_rate']:.0%} попаданий "
+        f"({identity['size']}/{identity['maxsize']}, незарегистрированных: {identity['negative_hits']})\n\n"
+    )
+
+    text += "<i>p50/p95 - верхние границы корзин гистограммы</i>"
+
+    try:
+        await callback.message.edit_text(text, reply_markup=get_diagnostics_menu(), parse_mode="HTML")
+    except TelegramBadRequest:
+        # Nothing changed since the last refresh
+        pass
+    await callback.answer()
+
+
+@router.callback_query(F.data == "admin_diagnostics_export")
+async def export_diagnostics(
+    callback: CallbackQuery,
+    is_admin: bool,
+    marzban: MarzbanAPI,
+    panels: PanelRegistry | None = None,
+    telegram_metrics: RequestMetrics | None = None,
+    db_metrics: SessionMetrics | None = None,
+    pool_metrics: PoolMetrics | None = None,
+):
+    """Send full metrics as JSON document"""
+    if not is_admin:
+        await callback.answer("❌ Доступ запрещён", show_alert=True)
+        return
+
+    snapshot = _diagnostics_snapshot(marzban, panels, telegram_metrics, db_metrics, pool_metrics)
+    filename = f"diagnostics_{time.strftime('%Y%m%d_%H%M%S')}.json"
+    await callback.message.answer_document(
+        BufferedInputFile(json_codec.dumps_bytes(snapshot), filename=filename),
+        caption="📈 Метрики запросов к Marzban и Telegram",
+    )
+    await callback.answer()
+
+
 # ============= ADMIN: ABOUT BOT =============
 @router.callback_query(F.data == "admin_about")
 async def show_about(callback: CallbackQuery, is_admin: bool):
@@ -21,7 +21,7 @@ from bot.database import (
     update_notification_settings,
     log_admin_action,
 )
-from bot.services import MarzbanAPI, MarzbanAPIError
+from bot.services import MarzbanAPI, MarzbanAPIError, MarzbanUnavailableError
 from bot.services.formatters import format_bytes
 from bot.utils.formatters import format_progress_bar, format_date_relative, format_status_emoji
 from bot.keyboards.inline import (
@@ -188,6 +188,10 @@ async def show_subscription(callback: CallbackQuery, db_user: User | None, marzb
         )
         await callback.answer()
 
+    except MarzbanUnavailableError as e:
+        logger.warning(f"Failed to get subscription: {e}")
+        await callback.answer("⚠️ Панель временно недоступна, попробуйте через минуту", show_alert=True)
+
     except Exception as e:
         logger.error(f"Failed to get subscription: {e}", exc_info=True)
         await callback.answer("❌ Не удалось получить информацию о подписке", show_alert=True)
@@ -227,6 +231,10 @@ async def get_subscription_link(callback: CallbackQuery, db_user: User | None, m
         )
         await callback.answer()
 
+    except MarzbanUnavailableError as e:
+        logger.warning(f"Failed to get subscription link: {e}")
+        await callback.answer("⚠️ Панель временно недоступна, попробуйте через минуту", show_alert=True)
+
     except Exception as e:
         logger.error(f"Failed to get subscription link: {e}", exc_info=True)
         await callback.answer("❌ Не удалось получить ссылку на подписку", show_alert=True)
@@ -20,6 +20,8 @@ from bot.database import (
     get_notification_settings,
     update_notification_settings,
     log_admin_action,
+    get_user_counters,
+    parse_page_callback,
 )
 from bot.services import MarzbanAPI, MarzbanAPIError
 from bot.services.formatters import format_bytes
@@ -553,13 +555,13 @@ async def list_all_users(message: Message, is_admin: bool, session: AsyncSession
     await show_users_page(message, session, 0)
 
 
-async def show_users_page(message: Message, session: AsyncSession, page: int):
+async def show_users_page(message: Message, session: AsyncSession, page: int, cursor: str | None = None):
     """Show users page"""
     page_size = 10
-    offset = page * page_size
 
-    users, total = await list_users(session, offset=offset, limit=page_size)
-    total_pages = math.ceil(total / page_size)
+    users_page = await list_users(session, limit=page_size, cursor=cursor)
+    users, total = users_page.items, users_page.total
+    total_pages = max(math.ceil(total / page_size), page + 1)
 
     if not users:
         await message.answer("📋 Пользователей не найдено")
@@ -567,7 +569,7 @@ async def show_users_page(message: Message, session: AsyncSession, page: int):
 
     text = f"👥 <b>Список пользователей</b> (стр. {page + 1}/{total_pages})\nВсего: {total}\n\n"
 
-    for i, user in enumerate(users, start=offset + 1):
+    for i, user in enumerate(users, start=page * page_size + 1):
         admin_badge = "👑 " if user.is_admin else ""
         role_label = "⭐️ Основной" if user.primary_user else "➕ Дополнительный"
         text += (
@@ -579,7 +581,7 @@ async def show_users_page(message: Message, session: AsyncSession, page: int):
 
     await message.answer(
         text,
-        reply_markup=get_user_list_navigation(page, total_pages),
+        reply_markup=get_user_list_navigation(page, users_page.prev_cursor, users_page.next_cursor),
         parse_mode="HTML"
     )
 
@@ -591,16 +593,16 @@ async def users_pagination(callback: CallbackQuery, session: AsyncSession, is_ad
         await callback.answer("❌ Доступ запрещён", show_alert=True)
         return
 
-    page = int(callback.data.split(":")[1])
+    page, cursor = parse_page_callback(callback.data)
     page_size = 10
-    offset = page * page_size
 
-    users, total = await list_users(session, offset=offset, limit=page_size)
-    total_pages = math.ceil(total / page_size)
+    users_page = await list_users(session, limit=page_size, cursor=cursor)
+    users, total = users_page.items, users_page.total
+    total_pages = max(math.ceil(total / page_size), page + 1)
 
     text = f"👥 <b>Список пользователей</b> (стр. {page + 1}/{total_pages})\nВсего: {total}\n\n"
 
-    for i, user in enumerate(users, start=offset + 1):
+    for i, user in enumerate(users, start=page * page_size + 1):
         admin_badge = "👑 " if user.is_admin else ""
         role_label = "⭐️ Основной" if user.primary_user else "➕ Дополнительный"
         text += (
@@ -612,7 +614,7 @@ async def users_pagination(callback: CallbackQuery, session: AsyncSession, is_ad
 
     await callback.message.edit_text(
         text,
-        reply_markup=get_user_list_navigation(page, total_pages),
+        reply_markup=get_user_list_navigation(page, users_page.prev_cursor, users_page.next_cursor),
         parse_mode="HTML"
     )
     await callback.answer()
@@ -626,15 +628,16 @@ async def show_stats(message: Message, is_admin: bool, session: AsyncSession):
         await message.answer("❌ Доступно только админам")
         return
 
-    users, total = await list_users(session, limit=1000)
-
-    admin_count = sum(1 for u in users if u.is_admin)
-    primary_count = sum(1 for u in users if u.primary_user)
+    counters = await get_user_counters(session)
+    total = counters.total_bindings
+    admin_count = counters.admins
+    primary_count = counters.primary_bindings
     secondary_count = total - primary_count
 
     text = (
         "📊 <b>Статистика</b>\n\n"
         f"👥 Всего привязок: <b>{total}</b>\n"
+        f"🔐 Аккаунтов Marzban: <b>{counters.marzban_usernames}</b>\n"
         f"⭐️ Основных аккаунтов: <b>{primary_count}</b>\n"
         f"➕ Дополнительных аккаунтов: <b>{secondary_count}</b>\n"
         f"👑 Администраторов: <b>{admin_count}</b>\n"
@@ -1,5 +1,7 @@
 """Admin keyboards"""
 
+from typing import Optional
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 
@@ -14,16 +16,18 @@ def get_admin_main_menu() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def get_user_list_keyboard(page: int = 0, total_pages: int = 1) -> InlineKeyboardMarkup:
-    """Get user list keyboard with pagination"""
+def get_user_list_keyboard(
+    page: int = 0, prev_cursor: Optional[str] = None, next_cursor: Optional[str] = None
+) -> InlineKeyboardMarkup:
+    """Get user list keyboard with pagination (cursors from crud.list_users)"""
     buttons = []
 
     # Pagination buttons
     nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton(text="◀️ Пред", callback_data=f"admin_users_page:{page-1}"))
-    if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton(text="След ▶️", callback_data=f"admin_users_page:{page+1}"))
+    if prev_cursor:
+        nav_buttons.append(InlineKeyboardButton(text="◀️ Пред", callback_data=f"admin_users_page:{page-1}:{prev_cursor}"))
+    if next_cursor:
+        nav_buttons.append(InlineKeyboardButton(text="След ▶️", callback_data=f"admin_users_page:{page+1}:{next_cursor}"))
 
     if nav_buttons:
         buttons.append(nav_buttons)
@@ -34,16 +38,18 @@ def get_user_list_keyboard(page: int = 0, total_pages: int = 1) -> InlineKeyboar
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def get_logs_keyboard(page: int = 0, total_pages: int = 1) -> InlineKeyboardMarkup:
-    """Get logs keyboard with pagination"""
+def get_logs_keyboard(
+    page: int = 0, prev_cursor: Optional[str] = None, next_cursor: Optional[str] = None
+) -> InlineKeyboardMarkup:
+    """Get logs keyboard with pagination (cursors from crud.get_admin_logs)"""
     buttons = []
 
     # Pagination buttons
     nav_buttons = []
-    if page > 0:
-        nav_buttons.append(InlineKeyboardButton(text="◀️ Пред", callback_data=f"admin_logs_page:{page-1}"))
-    if page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton(text="След ▶️", callback_data=f"admin_logs_page:{page+1}"))
+    if prev_cursor:
+        nav_buttons.append(InlineKeyboardButton(text="◀️ Пред", callback_data=f"admin_logs_page:{page-1}:{prev_cursor}"))
+    if next_cursor:
+        nav_buttons.append(InlineKeyboardButton(text="След ▶️", callback_data=f"admin_logs_page:{page+1}:{next_cursor}"))
 
     if nav_buttons:
         buttons.append(nav_buttons)
@@ -1,5 +1,7 @@
 """Inline keyboards - все взаимодействия только через callback кнопки"""
 
+from typing import Optional
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, KeyboardButton, ReplyKeyboardMarkup, KeyboardButtonRequestUsers
 
 
@@ -35,9 +37,22 @@ def get_admin_main_menu() -> InlineKeyboardMarkup:
         [
             InlineKeyboardButton(text="🔍 Найти пользователя", callback_data="admin_search_user"),
         ],
+        [
+            InlineKeyboardButton(text="🤖 Привязки в боте", callback_data="admin_bindings"),
+            InlineKeyboardButton(text="📜 Журнал действий", callback_data="admin_audit"),
+        ],
         [
             InlineKeyboardButton(text="📊 Статистика", callback_data="admin_stats"),
         ],
+        [
+            InlineKeyboardButton(text="🧰 Массовые изменения", callback_data="admin_bulk"),
+        ],
+        [
+            InlineKeyboardButton(text="🔌 Inbounds", callback_data="admin_inbounds"),
+        ],
+        [
+            InlineKeyboardButton(text="📈 Диагностика", callback_data="admin_diagnostics"),
+        ],
         [
             InlineKeyboardButton(text="ℹ️ О боте", callback_data="admin_about"),
         ],
@@ -152,7 +167,108 @@ def get_user_list_navigation(page: int, total_pages: int) -> InlineKeyboardMarku
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def get_cursor_navigation(
+    prefix: str,
+    page: int,
+    total_pages: int,
+    prev_cursor: Optional[str] = None,
+    next_cursor: Optional[str] = None,
+) -> InlineKeyboardMarkup:
+    """Pagination for bot database lists (cursors from crud.list_users/get_admin_logs)"""
+    nav_row = []
+    if prev_cursor:
+        nav_row.append(InlineKeyboardButton(text="⬅️", callback_data=f"{prefix}:{page - 1}:{prev_cursor}"))
+
+    nav_row.append(InlineKeyboardButton(text=f"{page + 1}/{total_pages}", callback_data="noop"))
+
+    if next_cursor:
+        nav_row.append(InlineKeyboardButton(text="➡️", callback_data=f"{prefix}:{page + 1}:{next_cursor}"))
+
+    buttons = [
+        nav_row,
+        [InlineKeyboardButton(text="« Назад в админ-панель", callback_data="admin_menu")],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+# ============= ADMIN: INBOUNDS =============
+def get_inbounds_menu() -> InlineKeyboardMarkup:
+    """Inbounds screen with manual refresh"""
+    buttons = [
+        [InlineKeyboardButton(text="🔄 Обновить из панели", callback_data="admin_inbounds_refresh")],
+        [InlineKeyboardButton(text="« Назад в админ-панель", callback_data="admin_menu")],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 # ============= BACK BUTTONS =============
+# Report periods (days) offered on statistics screens
+STATS_PERIOD_BUTTONS = ((1, "24 ч"), (7, "7 дн"), (30, "30 дн"))
+
+
+def _period_buttons(prefix: str, current: int) -> list[InlineKeyboardButton]:
+    """Row of report period buttons, current one marked"""
+    return [
+        InlineKeyboardButton(text=f"• {label}" if days == current else label, callback_data=f"{prefix}{days}")
+        for days, label in STATS_PERIOD_BUTTONS
+    ]
+
+
+def get_stats_menu(days: int) -> InlineKeyboardMarkup:
+    """Statistics screen: period and per-node report"""
+    buttons = [
+        _period_buttons("admin_stats_period_", days),
+        [InlineKeyboardButton(text="🖥 Трафик по узлам", callback_data=f"admin_nodes_{days}")],
+        [InlineKeyboardButton(text="« Назад в админ-панель", callback_data="admin_menu")],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def get_nodes_menu(days: int) -> InlineKeyboardMarkup:
+    """Per-node traffic screen"""
+    buttons = [
+        _period_buttons("admin_nodes_", days),
+        [InlineKeyboardButton(text="« К статистике", callback_data=f"admin_stats_period_{days}")],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def get_diagnostics_menu() -> InlineKeyboardMarkup:
+    """Diagnostics screen actions"""
+    buttons = [
+        [InlineKeyboardButton(text="🔄 Обновить", callback_data="admin_diagnostics")],
+        [InlineKeyboardButton(text="📤 Экспорт JSON", callback_data="admin_diagnostics_export")],
+        [InlineKeyboardButton(text="« Назад в админ-панель", callback_data="admin_menu")],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def get_bulk_target_menu() -> InlineKeyboardMarkup:
+    """User groups for bulk changes"""
+    buttons = [
+        [InlineKeyboardButton(text="🟢 Все активные", callback_data="bulk_target:active")],
+        [InlineKeyboardButton(text="⏰ Все истёкшие", callback_data="bulk_target:expired")],
+        [InlineKeyboardButton(text="📦 Все с исчерпанным трафиком", callback_data="bulk_target:limited")],
+        [InlineKeyboardButton(text="🔴 Все отключённые", callback_data="bulk_target:disabled")],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_action")],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+def get_bulk_action_menu() -> InlineKeyboardMarkup:
+    """Change types for bulk changes"""
+    buttons = [
+        [InlineKeyboardButton(text="📅 Продлить срок", callback_data="bulk_action:extend_days")],
+        [InlineKeyboardButton(text="📦 Добавить трафик", callback_data="bulk_action:add_gb")],
+        [
+            InlineKeyboardButton(text="▶️ Включить", callback_data="bulk_action:enable"),
+            InlineKeyboardButton(text="⏸ Отключить", callback_data="bulk_action:disable"),
+        ],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_action")],
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
 def get_back_to_menu() -> InlineKeyboardMarkup:
     """Simple back button"""
     buttons = [[InlineKeyboardButton(text="« Назад в меню", callback_data="back_to_user_menu")]]
@@ -1,5 +1,7 @@
 """Simplified keyboards with ReplyKeyboardMarkup for better UX"""
 
+from typing import Optional
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton, KeyboardButtonRequestUsers
 
 
@@ -83,15 +85,17 @@ def get_instruction_inline() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
-def get_user_list_navigation(page: int, total_pages: int) -> InlineKeyboardMarkup:
-    """Pagination for user list"""
+def get_user_list_navigation(
+    page: int, prev_cursor: Optional[str] = None, next_cursor: Optional[str] = None
+) -> InlineKeyboardMarkup:
+    """Pagination for user list (cursors from crud.list_users)"""
     buttons = []
 
     nav_row = []
-    if page > 0:
-        nav_row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"users_page:{page-1}"))
-    if page < total_pages - 1:
-        nav_row.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"users_page:{page+1}"))
+    if prev_cursor:
+        nav_row.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"users_page:{page-1}:{prev_cursor}"))
+    if next_cursor:
+        nav_row.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"users_page:{page+1}:{next_cursor}"))
 
     if nav_row:
         buttons.append(nav_row)
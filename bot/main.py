@@ -6,16 +6,35 @@ import sys
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
 from aiogram.enums import ParseMode
 from aiogram.fsm.storage.memory import MemoryStorage
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
 
 from bot.config import settings
+from bot.database import (
+    create_engine,
+    identity_cache,
+    list_recent_marzban_usernames,
+    reconcile_user_counters,
+)
 from bot.database.models import Base
 from bot.handlers.new_handlers import router as user_router
 from bot.handlers.admin_improved import router as admin_router
-from bot.middleware import AuthMiddleware, DatabaseMiddleware
-from bot.services import MarzbanAPI
+from bot.middleware import AuthMiddleware, DatabaseMiddleware, DeadlineMiddleware, TelegramMetricsMiddleware
+from bot.services import (
+    MarzbanAPI,
+    MarzbanAPIError,
+    MarzbanUserMirror,
+    Panel,
+    PanelRegistry,
+    Priority,
+    PoolMetrics,
+    RequestMetrics,
+    SessionMetrics,
+    request_priority,
+)
+from bot.utils import Warmup, WarmupError, json_codec
 
 
 # Configure logging
@@ -34,45 +53,183 @@ async def create_tables(engine):
     logger.info("Database tables created")
 
 
+async def connect_panel(panel: Panel) -> None:
+    """Obtain Marzban API token (raises if the panel is unreachable)"""
+    if not await panel.api.check_connection():
+        raise MarzbanAPIError(f"Failed to connect to Marzban panel {panel.name}")
+
+
+async def prime_panel_users(panel: Panel, session_pool, is_default: bool) -> int:
+    """Load Marzban users of recently active bot users into client cache"""
+    # Runs in its own warm-up task, so the priority change stays there
+    request_priority.set(Priority.BACKGROUND)
+    async with session_pool() as session:
+        usernames = await list_recent_marzban_usernames(
+            session, panel.name, settings.startup_prime_users, include_unassigned=is_default
+        )
+    return await panel.api.prime_users(usernames)
+
+
+async def reconcile_counters(session_pool) -> None:
+    """Recount user totals, log counters that had drifted"""
+    async with session_pool() as session:
+        _, drift = await reconcile_user_counters(session)
+    if drift:
+        logger.warning(f"User counters drifted (stored - actual): {drift}")
+
+
+async def reconcile_counters_periodically(session_pool, interval: float) -> None:
+    """Recount user totals every ``interval`` seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reconcile_counters(session_pool)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"User counters reconciliation failed: {e}")
+
+
+def create_marzban_client(base_url: str, username: str, password: str) -> MarzbanAPI:
+    """Create Marzban API client with settings shared by all panels"""
+    return MarzbanAPI(
+        base_url=base_url,
+        username=username,
+        password=password,
+        connection_limit=settings.marzban_connection_limit,
+        connection_limit_per_host=settings.marzban_connection_limit_per_host,
+        keepalive_timeout=settings.marzban_keepalive_timeout,
+        dns_cache_ttl=settings.marzban_dns_cache_ttl,
+        token_refresh_margin=settings.marzban_token_refresh_margin,
+        user_cache_size=settings.marzban_user_cache_size,
+        user_cache_ttl=settings.marzban_user_cache_ttl,
+        user_cache_stale_ttl=settings.marzban_user_cache_stale_ttl,
+        inbounds_cache_ttl=settings.marzban_inbounds_cache_ttl,
+        usage_cache_ttl=settings.marzban_usage_cache_ttl,
+        request_timeout=settings.marzban_request_timeout,
+        retry_attempts=settings.marzban_retry_attempts,
+        breaker_failure_threshold=settings.marzban_breaker_failure_threshold,
+        breaker_reset_timeout=settings.marzban_breaker_reset_timeout,
+        min_concurrency=settings.marzban_min_concurrency,
+        max_concurrency=settings.marzban_max_concurrency,
+        latency_target=settings.marzban_latency_target,
+    )
+
+
 async def main():
     """Main function"""
     logger.info("Starting Marzban Telegram Bot...")
 
     # Create database engine
-    engine = create_async_engine(settings.database_url, echo=False, future=True)
+    pool_metrics = PoolMetrics(size=settings.db_pool_size, max_overflow=settings.db_max_overflow)
+    engine = create_engine(
+        settings.database_url,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_recycle=settings.db_pool_recycle,
+        statement_cache_size=settings.db_statement_cache_size,
+        metrics=pool_metrics,
+    )
     session_pool = async_sessionmaker(engine, expire_on_commit=False)
-
-    # Create tables
-    await create_tables(engine)
+    identity_cache.configure(
+        maxsize=settings.identity_cache_size,
+        ttl=settings.identity_cache_ttl,
+        negative_ttl=settings.identity_cache_negative_ttl,
+    )
 
     # Initialize bot and dispatcher with FSM storage
     bot = Bot(
         token=settings.telegram_bot_token,
+        session=AiohttpSession(json_loads=json_codec.loads, json_dumps=json_codec.dumps),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
+    logger.info(f"JSON codec: {json_codec.JSON_CODEC}")
+    telegram_metrics = RequestMetrics("telegram")
+    bot.session.middleware(TelegramMetricsMiddleware(telegram_metrics))
     storage = MemoryStorage()
     dp = Dispatcher(storage=storage)
 
-    # Initialize Marzban API client
-    marzban = MarzbanAPI(
-        base_url=settings.marzban_api_url,
-        username=settings.marzban_admin_username,
-        password=settings.marzban_admin_password,
-    )
+    # Initialize Marzban API clients (one per panel)
+    panels = PanelRegistry(settings.marzban_panel_name, placement=settings.marzban_panel_placement)
+    for panel_config in settings.marzban_panel_configs:
+        marzban = create_marzban_client(panel_config["url"], panel_config["username"], panel_config["password"])
+        await marzban.start()
 
-    # Check Marzban connection
-    if not await marzban.check_connection():
-        logger.error("Failed to connect to Marzban API. Please check your configuration.")
+        # Local snapshot of Marzban users for admin screens (loaded in background)
+        user_mirror = None
+        if settings.marzban_mirror_enabled:
+            user_mirror = MarzbanUserMirror(
+                marzban,
+                delta_interval=settings.marzban_mirror_delta_interval,
+                full_sync_interval=settings.marzban_mirror_full_sync_interval,
+            )
+        panels.add(Panel(panel_config["name"], marzban, user_mirror))
+
+    # Warm up concurrently: polling starts once DB and the default panel token are ready,
+    # inbounds and user caches keep loading in background
+    warmup = Warmup(timeout=settings.startup_step_timeout)
+    warmup.add("database", lambda: create_tables(engine), critical=True)
+    warmup.add("telegram", bot.me)
+    warmup.add("counters", lambda: reconcile_counters(session_pool), after=["database"])
+    for panel in panels:
+        is_default = panel.name == panels.default_panel
+        token_step = f"token:{panel.name}"
+        warmup.add(token_step, lambda panel=panel: connect_panel(panel), critical=is_default)
+        warmup.add(f"inbounds:{panel.name}", panel.api.get_inbounds, after=[token_step])
+        if settings.startup_prime_users > 0:
+            warmup.add(
+                f"users:{panel.name}",
+                lambda panel=panel, is_default=is_default: prime_panel_users(panel, session_pool, is_default),
+                after=["database", token_step],
+            )
+
+    try:
+        ready_in = await warmup.wait_critical()
+    except WarmupError as e:
+        logger.error(f"{e}. Please check your configuration.")
+        await warmup.cancel()
+        logger.info(f"Startup steps:\n{warmup.summary()}")
+        await bot.session.close()
+        await panels.close()
+        await engine.dispose()
         sys.exit(1)
-    logger.info("Marzban API connection successful")
+    logger.info(f"Critical startup steps ready in {ready_in:.2f}s")
+
+    await panels.start()
 
-    # Register middlewares
-    dp.update.middleware(DatabaseMiddleware(session_pool))
+    async def report_warmup():
+        total = await warmup.wait_all()
+        logger.info(f"Startup warm-up finished in {total:.2f}s:\n{warmup.summary()}")
+
+    warmup_report = asyncio.create_task(report_warmup())
+    counters_task = None
+    if settings.user_counters_reconcile_interval > 0:
+        counters_task = asyncio.create_task(
+            reconcile_counters_periodically(session_pool, settings.user_counters_reconcile_interval)
+        )
+
+    # Register middlewares (deadline first, so DB and auth calls are within the budget)
+    dp.update.middleware(
+        DeadlineMiddleware(
+            callback_timeout=settings.callback_deadline,
+            message_timeout=settings.message_deadline,
+        )
+    )
+    db_metrics = SessionMetrics()
+    dp.update.middleware(DatabaseMiddleware(session_pool, db_metrics))
     dp.update.middleware(AuthMiddleware())
 
-    # Inject MarzbanAPI into all handlers
+    # Inject MarzbanAPI of the user's panel into all handlers
     async def marzban_middleware(handler, event, data):
-        data["marzban"] = marzban
+        panel = panels.for_user(data.get("db_user"))
+        data["marzban"] = panel.api
+        data["user_mirror"] = panel.mirror
+        data["panels"] = panels
+        data["telegram_metrics"] = telegram_metrics
+        data["db_metrics"] = db_metrics
+        data["pool_metrics"] = pool_metrics
         return await handler(event, data)
 
     dp.update.middleware.register(marzban_middleware)
@@ -88,7 +245,12 @@ async def main():
     try:
         await dp.start_polling(bot)
     finally:
+        warmup_report.cancel()
+        if counters_task is not None:
+            counters_task.cancel()
+        await warmup.cancel()
         await bot.session.close()
+        await panels.close()
         await engine.dispose()
 
 
@@ -2,5 +2,7 @@
 
 from .database import DatabaseMiddleware
 from .auth import AuthMiddleware
+from .request_metrics import TelegramMetricsMiddleware
+from .deadline import DeadlineMiddleware
 
-__all__ = ["DatabaseMiddleware", "AuthMiddleware"]
+__all__ = ["DatabaseMiddleware", "AuthMiddleware", "TelegramMetricsMiddleware", "DeadlineMiddleware"]
@@ -9,6 +9,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.database import get_user_by_telegram_id, create_user
 from bot.config import settings
+from bot.services.limiter import Priority, request_priority
 
 
 logger = logging.getLogger(__name__)
@@ -29,8 +30,8 @@ class AuthMiddleware(BaseMiddleware):
         if not telegram_user or not session:
             return await handler(event, data)
 
-        # Get or create user record
-        user = await get_user_by_telegram_id(session, telegram_user.id)
+        # Get or create user record (usually served from the identity cache)
+        user = await get_user_by_telegram_id(session, telegram_user.id, use_cache=True)
 
         # Auto-add initial admins
         if not user and telegram_user.id in settings.admin_ids:
@@ -46,4 +47,12 @@ class AuthMiddleware(BaseMiddleware):
         data["db_user"] = user
         data["is_admin"] = user.is_admin if user else False
 
-        return await handler(event, data)
+        if not data["is_admin"]:
+            return await handler(event, data)
+
+        # Admin actions go ahead of other Marzban requests
+        token = request_priority.set(Priority.ADMIN)
+        try:
+            return await handler(event, data)
+        finally:
+            request_priority.reset(token)
@@ -1,18 +1,87 @@
 """Database middleware"""
 
-from typing import Any, Awaitable, Callable, Dict
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
+from bot.services.metrics import SessionMetrics
 
-class DatabaseMiddleware(BaseMiddleware):
-    """Middleware to provide database session"""
+
+logger = logging.getLogger(__name__)
+
+
+class LazySession:
+    """
+    AsyncSession proxy that creates the session on first use
+
+    Handlers that never touch the database (instructions, FAQ, pagination
+    no-ops) neither create a session nor check out a pooled connection.
+    Attribute access is forwarded to the real session, so the proxy is
+    passed wherever an AsyncSession is expected.
+    """
+
+    __slots__ = ("_session_pool", "_session", "opened_at", "began_at")
 
     def __init__(self, session_pool: async_sessionmaker[AsyncSession]):
+        self._session_pool = session_pool
+        self._session: Optional[AsyncSession] = None
+        self.opened_at: Optional[float] = None
+        self.began_at: Optional[float] = None
+
+    @property
+    def opened(self) -> bool:
+        """Session was created (some code used it)"""
+        return self._session is not None
+
+    def _open(self) -> AsyncSession:
+        if self._session is None:
+            self.opened_at = time.perf_counter()
+            self._session = self._session_pool()
+            # Fires when the session checks out a connection and begins a transaction
+            event.listen(self._session.sync_session, "after_begin", self._on_begin)
+        return self._session
+
+    def _on_begin(self, session, transaction, connection) -> None:
+        if self.began_at is None:
+            self.began_at = time.perf_counter()
+
+    @property
+    def waited(self) -> Optional[float]:
+        """Seconds from first use until a connection was ready (None = no connection used)"""
+        if self.began_at is None:
+            return None
+        return self.began_at - self.opened_at
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._open(), name)
+
+    async def close(self) -> Optional[float]:
+        """
+        Close session if it was created
+
+        Returns:
+            Seconds since the first connection checkout (None = no connection used)
+        """
+        if self._session is None:
+            return None
+        await self._session.close()
+        if self.began_at is None:
+            return None
+        return time.perf_counter() - self.began_at
+
+
+class DatabaseMiddleware(BaseMiddleware):
+    """Middleware to provide database session (created lazily, closed right after the handler)"""
+
+    def __init__(self, session_pool: async_sessionmaker[AsyncSession], metrics: Optional[SessionMetrics] = None):
         super().__init__()
         self.session_pool = session_pool
+        self.metrics = metrics
 
     async def __call__(
         self,
@@ -20,6 +89,13 @@ class DatabaseMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any],
     ) -> Any:
-        async with self.session_pool() as session:
-            data["session"] = session
+        session = LazySession(self.session_pool)
+        data["session"] = session
+        try:
             return await handler(event, data)
+        finally:
+            held = await session.close()
+            if self.metrics is not None:
+                self.metrics.record(session.opened, session.waited, held)
+            if held is not None:
+                logger.debug(f"Database connection held for {held * 1000:.0f} ms")
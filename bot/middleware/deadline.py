@@ -0,0 +1,75 @@
+"""Per-update deadline middleware"""
+
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import TelegramObject, Update
+
+from bot.utils.deadline import DeadlineExceeded, deadline_after
+
+
+logger = logging.getLogger(__name__)
+
+TIMEOUT_TEXT = "⏳ Сервер отвечает слишком долго, попробуйте ещё раз"
+
+
+class DeadlineMiddleware(BaseMiddleware):
+    """
+    Give every update a time budget
+
+    Marzban API and database calls made while handling the update are
+    bounded by the remaining budget. If a handler lets DeadlineExceeded
+    through, the user still gets an answer instead of an endless spinner.
+
+    Args:
+        callback_timeout: Budget for callback queries (Telegram keeps the spinner meanwhile)
+        message_timeout: Budget for messages
+    """
+
+    def __init__(self, callback_timeout: float, message_timeout: float):
+        super().__init__()
+        self.callback_timeout = callback_timeout
+        self.message_timeout = message_timeout
+
+    def _timeout(self, event: TelegramObject) -> Optional[float]:
+        """Budget for update (None = unlimited)"""
+        if not isinstance(event, Update):
+            return None
+        if event.callback_query is not None:
+            timeout = self.callback_timeout
+        elif event.message is not None:
+            timeout = self.message_timeout
+        else:
+            return None
+        return timeout if timeout > 0 else None
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        timeout = self._timeout(event)
+        if timeout is None:
+            return await handler(event, data)
+
+        with deadline_after(timeout):
+            try:
+                return await handler(event, data)
+            except DeadlineExceeded as e:
+                logger.warning(f"Update {event.update_id} ran out of its {timeout}s budget: {e}")
+                await self._answer_timeout(event)
+
+    @staticmethod
+    async def _answer_timeout(event: Update) -> None:
+        """Tell the user to retry"""
+        try:
+            if event.callback_query is not None:
+                await event.callback_query.answer(TIMEOUT_TEXT, show_alert=True)
+            elif event.message is not None:
+                await event.message.answer(TIMEOUT_TEXT)
+        except TelegramBadRequest as e:
+            # Callback was already answered or is too old
+            logger.debug(f"Could not answer timed out update {event.update_id}: {e}")
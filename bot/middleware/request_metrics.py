@@ -0,0 +1,75 @@
+"""Telegram Bot API request metrics middleware"""
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramBadRequest,
+    TelegramConflictError,
+    TelegramEntityTooLarge,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramNotFound,
+    TelegramRetryAfter,
+    TelegramServerError,
+    TelegramUnauthorizedError,
+)
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from bot.services.metrics import RequestMetrics
+
+
+# aiogram raises one exception class per HTTP status and drops the code itself
+_ERROR_STATUSES: tuple[tuple[type[TelegramAPIError], str], ...] = (
+    (TelegramEntityTooLarge, "413"),
+    (TelegramNetworkError, "network"),
+    (TelegramRetryAfter, "429"),
+    (TelegramBadRequest, "400"),
+    (TelegramUnauthorizedError, "401"),
+    (TelegramForbiddenError, "403"),
+    (TelegramNotFound, "404"),
+    (TelegramConflictError, "409"),
+    (TelegramServerError, "5xx"),
+)
+
+
+def telegram_error_status(error: TelegramAPIError) -> str:
+    """Status label of a failed Bot API call"""
+    for error_type, status in _ERROR_STATUSES:
+        if isinstance(error, error_type):
+            return status
+    return "api_error"
+
+
+class TelegramMetricsMiddleware(BaseRequestMiddleware):
+    """Record latency and result of every Telegram Bot API call"""
+
+    def __init__(self, metrics: RequestMetrics):
+        self.metrics = metrics
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot,
+        method: TelegramMethod[TelegramType],
+    ) -> TelegramType:
+        # Long polling waits on purpose, its latency says nothing about Telegram
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+
+        # make_request returns the unwrapped result, failures arrive as exceptions
+        operation = type(method).__name__
+        started = self.metrics.start(operation)
+        status = "error"
+        try:
+            result = await make_request(bot, method)
+            status = "200"
+            return result
+        except TelegramAPIError as e:
+            status = telegram_error_status(e)
+            raise
+        except Exception as e:
+            status = type(e).__name__
+            raise
+        finally:
+            self.metrics.finish(operation, started, status)
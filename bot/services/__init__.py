@@ -1,12 +1,44 @@
 """Services package"""
 
-from .marzban_api import MarzbanAPI, MarzbanUser, MarzbanAPIError
+from .marzban_api import (
+    MarzbanAPI,
+    MarzbanUser,
+    MarzbanAPIError,
+    MarzbanUnavailableError,
+    MarzbanDeadlineError,
+    UserChanges,
+    BulkResult,
+    parse_marzban_timestamp,
+)
+from .limiter import AdaptiveLimiter, Priority, request_priority
+from .resilience import CircuitBreaker, RetryPolicy
+from .user_mirror import MarzbanUserMirror
+from .user_stats import UserColumns
+from .panels import Panel, PanelRegistry
+from .metrics import PoolMetrics, RequestMetrics, SessionMetrics
 from .formatters import format_bytes, format_date, format_user_info, format_subscription_status
 
 __all__ = [
     "MarzbanAPI",
     "MarzbanUser",
     "MarzbanAPIError",
+    "MarzbanUnavailableError",
+    "MarzbanDeadlineError",
+    "UserChanges",
+    "BulkResult",
+    "parse_marzban_timestamp",
+    "AdaptiveLimiter",
+    "Priority",
+    "request_priority",
+    "CircuitBreaker",
+    "RetryPolicy",
+    "MarzbanUserMirror",
+    "UserColumns",
+    "Panel",
+    "PanelRegistry",
+    "PoolMetrics",
+    "RequestMetrics",
+    "SessionMetrics",
     "format_bytes",
     "format_date",
     "format_user_info",
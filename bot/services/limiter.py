@@ -0,0 +1,152 @@
+"""Adaptive concurrency limiter with prioritized waiters"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class Priority(IntEnum):
+    """Request priority (lower value is served first)"""
+
+    ADMIN = 0
+    INTERACTIVE = 1
+    BACKGROUND = 2
+
+
+# Priority of requests made from the current task (set by middleware and background jobs)
+request_priority: ContextVar[Priority] = ContextVar("request_priority", default=Priority.INTERACTIVE)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on the number of in-flight requests
+
+    Every completed request is a sample: a failure or a response slower than
+    ``latency_target`` shrinks the limit multiplicatively (at most once per
+    ``latency_target`` seconds, so one burst counts once), a fast success
+    while the limit is fully used grows it by ~1 per limit's worth of requests.
+    Callers over the limit wait in priority order, FIFO within one priority.
+
+    Args:
+        name: Name used in logs
+        min_limit: Limit never drops below this
+        max_limit: Limit never grows above this (also the initial limit)
+        latency_target: Responses slower than this (seconds) count as overload
+        decrease_ratio: Multiplier applied on overload
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        min_limit: int = 2,
+        max_limit: int = 20,
+        latency_target: float = 1.0,
+        decrease_ratio: float = 0.7,
+    ):
+        self.name = name
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.latency_target = latency_target
+        self.decrease_ratio = decrease_ratio
+
+        self._limit = float(self.max_limit)
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._last_decrease = 0.0
+
+        self.decreases = 0
+        self.queued = 0
+
+    @property
+    def limit(self) -> int:
+        """Current number of allowed in-flight requests"""
+        return max(int(self._limit), self.min_limit)
+
+    @property
+    def in_flight(self) -> int:
+        """Number of requests holding a slot"""
+        return self._in_flight
+
+    async def acquire(self, priority: Optional[Priority] = None) -> None:
+        """Wait for a free slot"""
+        if priority is None:
+            priority = request_priority.get()
+
+        if self._in_flight < self.limit and not self._waiters:
+            self._in_flight += 1
+            return
+
+        self.queued += 1
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (int(priority), next(self._sequence), future))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over right before cancellation - pass it on
+                self._in_flight -= 1
+                self._wake()
+            raise
+
+    def release(self, latency: float, failed: Optional[bool]) -> None:
+        """
+        Free a slot and feed the request outcome into the limit
+
+        Args:
+            latency: Seconds the request held the slot
+            failed: Whether the request failed (None - do not use as a sample)
+        """
+        self._in_flight -= 1
+        if failed is not None:
+            self._adjust(latency, failed)
+        self._wake()
+
+    def _adjust(self, latency: float, failed: bool) -> None:
+        """Apply AIMD step for one sample"""
+        if failed or latency > self.latency_target:
+            now = time.monotonic()
+            if now - self._last_decrease < self.latency_target:
+                return
+            previous = self.limit
+            self._limit = max(self._limit * self.decrease_ratio, float(self.min_limit))
+            self._last_decrease = now
+            self.decreases += 1
+            if self.limit != previous:
+                logger.info(
+                    f"Limiter '{self.name}' decreased to {self.limit} "
+                    f"({'error' if failed else f'latency {latency:.2f}s'})"
+                )
+        elif self._in_flight + 1 >= self.limit:
+            # Grow only when the limit was actually the bottleneck
+            self._limit = min(self._limit + 1 / self._limit, float(self.max_limit))
+
+    def _wake(self) -> None:
+        """Hand free slots to waiters with the highest priority"""
+        while self._waiters and self._in_flight < self.limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                # Waiter was cancelled
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+
+    def stats(self) -> dict[str, Any]:
+        """Limiter state for diagnostics"""
+        return {
+            "limit": self.limit,
+            "in_flight": self._in_flight,
+            "waiting": sum(1 for _, _, future in self._waiters if not future.done()),
+            "queued": self.queued,
+            "decreases": self.decreases,
+        }
@@ -1,27 +1,124 @@
 """Marzban API client"""
 
+import asyncio
+import base64
 import logging
+import sys
+import time
+from collections import deque
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Hashable, Optional, Union
 from dataclasses import dataclass
 
 import aiohttp
 
+from bot.utils import deadline, json_codec
+from bot.utils.cache import TTLCache
+from bot.utils.coalescer import RequestCoalescer
+from bot.utils.deadline import DeadlineExceeded
+
+from .limiter import AdaptiveLimiter, Priority, request_priority
+from .metrics import RequestMetrics
+from .resilience import CircuitBreaker, RetryPolicy
+
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
 class MarzbanUser:
-    """Marzban user data"""
+    """
+    Marzban user data
 
-    username: str
-    status: str
-    used_traffic: int
-    data_limit: Optional[int]
-    expire: Optional[datetime]
-    subscription_url: str
-    links: list[str]
+    Slotted to keep thousands of cached users compact: expiry is stored as
+    a unix timestamp and turned into datetime on access, status strings are
+    interned, and ``links`` keeps the list decoded from the panel response
+    instead of copying it (users without links share no list at all).
+    """
+
+    __slots__ = ("username", "status", "used_traffic", "data_limit", "expire_ts", "subscription_url", "_links")
+
+    def __init__(
+        self,
+        username: str,
+        status: str,
+        used_traffic: int,
+        data_limit: Optional[int],
+        expire_ts: Optional[int],
+        subscription_url: str,
+        links: Optional[list[str]] = None,
+    ):
+        self.username = username
+        self.status = sys.intern(status)
+        self.used_traffic = used_traffic
+        self.data_limit = data_limit
+        self.expire_ts = expire_ts
+        self.subscription_url = subscription_url
+        self._links = links or None
+
+    @property
+    def expire(self) -> Optional[datetime]:
+        """Expiry time (None = unlimited)"""
+        if self.expire_ts is None:
+            return None
+        return datetime.fromtimestamp(self.expire_ts)
+
+    @property
+    def links(self) -> list[str]:
+        """Connection links"""
+        if self._links is None:
+            return []
+        return self._links
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, MarzbanUser):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return (
+            f"MarzbanUser(username={self.username!r}, status={self.status!r}, "
+            f"used_traffic={self.used_traffic}, data_limit={self.data_limit}, expire_ts={self.expire_ts})"
+        )
+
+
+def _parse_user(data: dict) -> MarzbanUser:
+    """Build MarzbanUser from panel response"""
+    expire_ts = None
+    if data.get("expire"):
+        try:
+            expire_ts = int(data["expire"])
+        except (ValueError, TypeError):
+            logger.warning(f"Failed to parse expire date: {data.get('expire')}")
+
+    return MarzbanUser(
+        username=data["username"],
+        status=data.get("status") or "unknown",
+        used_traffic=data.get("used_traffic") or 0,
+        data_limit=data.get("data_limit"),
+        expire_ts=expire_ts,
+        subscription_url=data.get("subscription_url") or "",
+        links=data.get("links"),
+    )
+
+
+def parse_marzban_timestamp(value: Union[int, float, str, None]) -> Optional[float]:
+    """Convert Marzban time value (unix timestamp or ISO string) to unix timestamp"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_unknown_inbound_error(status_code: int, body: Any) -> bool:
+    """Check if panel rejected a request because of unknown inbound or disabled protocol"""
+    if status_code not in (400, 422):
+        return False
+    text = str(body).lower()
+    return "inbound" in text or "protocol" in text
 
 
 class MarzbanAPIError(Exception):
@@ -30,85 +127,674 @@ class MarzbanAPIError(Exception):
     pass
 
 
+@dataclass(frozen=True)
+class UserChanges:
+    """
+    Change applied to many users by MarzbanAPI.bulk_modify()
+
+    Absolute fields are sent as is (see modify_user). Relative fields are
+    applied to the user's current values; users with unlimited expiry or
+    traffic keep them unlimited.
+    """
+
+    status: Optional[str] = None
+    data_limit: Optional[int] = None
+    expire: Optional[int] = None
+    extend_days: int = 0
+    add_data_limit: int = 0
+
+    @property
+    def is_relative(self) -> bool:
+        """Current user state is needed to compute the update"""
+        return bool(self.extend_days or self.add_data_limit)
+
+    def resolve(self, current: Optional[MarzbanUser]) -> dict[str, Any]:
+        """Get modify_user() arguments for a user"""
+        status, data_limit, expire = self.status, self.data_limit, self.expire
+
+        if current is not None and self.extend_days and current.expire is not None:
+            # Expired users get the extension counted from now
+            start = max(current.expire, datetime.now())
+            expire = int((start + timedelta(days=self.extend_days)).timestamp())
+        if current is not None and self.add_data_limit and current.data_limit:
+            data_limit = current.data_limit + self.add_data_limit
+
+        return {"status": status, "data_limit": data_limit, "expire": expire}
+
+
+@dataclass
+class BulkResult:
+    """Outcome of bulk change for one user"""
+
+    username: str
+    user: Optional[MarzbanUser] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class MarzbanUnavailableError(MarzbanAPIError):
+    """Panel is unreachable (request failed after retries or circuit breaker is open)"""
+
+    pass
+
+
+class MarzbanDeadlineError(MarzbanUnavailableError, DeadlineExceeded):
+    """Time budget of the current update ran out before the panel answered"""
+
+    pass
+
+
+# Gateway errors worth another attempt; other statuses are final answers from the panel
+RETRYABLE_STATUSES = frozenset({502, 503, 504})
+
+
+# Marzban parses usage period bounds with datetime.fromisoformat (UTC, naive).
+# Minute precision lets screens opened within the same minute share cached reports.
+USAGE_TIME_FORMAT = "%Y-%m-%dT%H:%M:00"
+
+
+def _usage_params(start: Optional[datetime], end: Optional[datetime]) -> dict[str, str]:
+    """Query parameters of a usage report period"""
+    params = {}
+    if start is not None:
+        params["start"] = start.strftime(USAGE_TIME_FORMAT)
+    if end is not None:
+        params["end"] = end.strftime(USAGE_TIME_FORMAT)
+    return params
+
+
+def _parse_token_expiry(token: str) -> Optional[datetime]:
+    """Read expiry time from JWT payload (signature is not verified)"""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json_codec.loads(base64.urlsafe_b64decode(payload))
+        return datetime.fromtimestamp(int(claims["exp"]))
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
 class MarzbanAPI:
     """Marzban API client"""
 
-    def __init__(self, base_url: str, username: str, password: str):
+    def __init__(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        *,
+        connection_limit: int = 100,
+        connection_limit_per_host: int = 20,
+        keepalive_timeout: float = 30.0,
+        dns_cache_ttl: int = 300,
+        token_refresh_margin: float = 300.0,
+        user_cache_size: int = 1024,
+        user_cache_ttl: float = 30.0,
+        user_cache_stale_ttl: float = 300.0,
+        inbounds_cache_ttl: float = 600.0,
+        usage_cache_ttl: float = 60.0,
+        request_timeout: float = 10.0,
+        retry_attempts: int = 3,
+        breaker_failure_threshold: int = 5,
+        breaker_reset_timeout: float = 30.0,
+        min_concurrency: int = 2,
+        max_concurrency: int = 20,
+        latency_target: float = 1.0,
+    ):
         self.base_url = base_url.rstrip("/")
         self.username = username
         self.password = password
         self.token: Optional[str] = None
         self.token_expires: Optional[datetime] = None
-        self._inbounds_cache: Optional[dict[str, list[str]]] = None
+        self._token_obtained_at: Optional[datetime] = None
+        # Renew token this many seconds before it expires
+        self.token_refresh_margin = token_refresh_margin
+        self._token_lock = asyncio.Lock()
+        self._token_updated = asyncio.Event()
+        self._token_refresh_task: Optional[asyncio.Task] = None
 
-    async def _get_token(self) -> str:
-        """Get access token (with caching)"""
-        if self.token and self.token_expires and datetime.now() < self.token_expires:
-            return self.token
+        # Inbounds rarely change; stale value is served while refreshing in background
+        self._inbounds_cache: TTLCache[dict[str, list[str]]] = TTLCache(
+            maxsize=1, ttl=inbounds_cache_ttl, stale_ttl=inbounds_cache_ttl * 6
+        )
+
+        # get_user() results, served stale while a background refresh runs
+        self._user_cache: TTLCache[MarzbanUser] = TTLCache(
+            maxsize=user_cache_size, ttl=user_cache_ttl, stale_ttl=user_cache_stale_ttl
+        )
+
+        # /api/system and usage reports: cheap for the panel, but admins refresh them often
+        self._usage_cache: TTLCache[Any] = TTLCache(maxsize=64, ttl=usage_cache_ttl, stale_ttl=usage_cache_ttl * 4)
+
+        # Running background refreshes of cached data, keyed like coalesced requests
+        self._refresh_tasks: dict[Hashable, asyncio.Task] = {}
+
+        # Concurrent identical reads share one in-flight request
+        self._coalescer = RequestCoalescer()
+
+        # Callbacks receiving raw user data after every fetch/create/modify
+        self._user_listeners: list[Callable[[dict], None]] = []
+
+        # Connection pool settings for the shared session
+        self.connection_limit = connection_limit
+        self.connection_limit_per_host = connection_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        # Only idempotent reads are retried; writes get a single attempt
+        self.retry_policies: dict[str, RetryPolicy] = {
+            "GET": RetryPolicy(attempts=max(retry_attempts, 1), timeout=request_timeout),
+        }
+        self.default_retry_policy = RetryPolicy(attempts=1, timeout=request_timeout)
+        self.request_timeout = request_timeout
+        self._breaker = CircuitBreaker(
+            "marzban", failure_threshold=breaker_failure_threshold, reset_timeout=breaker_reset_timeout
+        )
+
+        # Latency/status/bytes per API operation, shown on the diagnostics screen
+        self.metrics = RequestMetrics("marzban")
+
+        # Shrinks the number of in-flight requests when the panel slows down
+        self._limiter = AdaptiveLimiter(
+            "marzban", min_limit=min_concurrency, max_limit=max_concurrency, latency_target=latency_target
+        )
+
+    async def start(self) -> None:
+        """Open shared HTTP session with pooled keep-alive connections"""
+        if self._session is not None and not self._session.closed:
+            return
+
+        connector = aiohttp.TCPConnector(
+            limit=self.connection_limit,
+            limit_per_host=self.connection_limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, json_serialize=json_codec.dumps)
+        logger.info(
+            f"Opened Marzban API session (limit={self.connection_limit}, "
+            f"per_host={self.connection_limit_per_host}, keepalive={self.keepalive_timeout}s)"
+        )
+
+        if self._token_refresh_task is None or self._token_refresh_task.done():
+            self._token_refresh_task = asyncio.create_task(self._token_refresh_loop())
 
-        async with aiohttp.ClientSession() as session:
-            data = aiohttp.FormData()
-            data.add_field("username", self.username)
-            data.add_field("password", self.password)
+    async def close(self) -> None:
+        """Close shared HTTP session and release pooled connections"""
+        if self._token_refresh_task is not None:
+            self._token_refresh_task.cancel()
+            try:
+                await self._token_refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._token_refresh_task = None
 
-            async with session.post(f"{self.base_url}/api/admin/token", data=data) as response:
-                if response.status != 200:
-                    raise MarzbanAPIError(f"Authentication failed: {response.status}")
+        # Shared and background requests must not outlive the session
+        refresh_tasks = list(self._refresh_tasks.values())
+        for task in refresh_tasks:
+            task.cancel()
+        await asyncio.gather(*refresh_tasks, return_exceptions=True)
+        self._refresh_tasks.clear()
+        await self._coalescer.cancel()
 
-                result = await response.json()
-                self.token = result["access_token"]
-                # Token обычно действует 1 час, сохраним на 50 минут для безопасности
-                self.token_expires = datetime.now() + timedelta(minutes=50)
-                logger.info("Obtained new Marzban API token")
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("Closed Marzban API session")
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get shared session (opened lazily if start() was not called)"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+
+    def _token_is_valid(self) -> bool:
+        """Check if cached token exists and has not expired yet"""
+        return bool(self.token and self.token_expires and datetime.now() < self.token_expires)
+
+    async def _get_token(self, stale_token: Optional[str] = None) -> str:
+        """Get access token (with caching)
+
+        Concurrent callers share a single login request. Passing ``stale_token``
+        forces a refresh unless another caller has already replaced that token.
+        """
+        if self._token_is_valid() and self.token != stale_token:
+            return self.token
+
+        async with self._token_lock:
+            # Token may have been refreshed while we were waiting for the lock
+            if self._token_is_valid() and self.token != stale_token:
                 return self.token
+            return await self._login()
+
+    async def _login(self) -> str:
+        """Obtain new access token from Marzban"""
+        session = await self._get_session()
+        data = aiohttp.FormData()
+        data.add_field("username", self.username)
+        data.add_field("password", self.password)
+
+        started = self.metrics.start("login")
+        status: Union[int, str] = "error"
+        body = b""
+        try:
+            async with session.post(
+                f"{self.base_url}/api/admin/token",
+                data=data,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+            ) as response:
+                body = await response.read()
+                status = response.status
+        except asyncio.TimeoutError:
+            status = "timeout"
+            raise
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            self.metrics.finish("login", started, status, len(body))
+
+        if status != 200:
+            raise MarzbanAPIError(f"Authentication failed: {status}")
 
-    async def get_user(self, username: str) -> MarzbanUser:
-        """Get user information from Marzban"""
-        token = await self._get_token()
-
-        headers = {"Authorization": f"Bearer {token}"}
-
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{self.base_url}/api/user/{username}", headers=headers) as response:
-                if response.status == 404:
-                    raise MarzbanAPIError(f"User {username} not found in Marzban")
-                if response.status != 200:
-                    raise MarzbanAPIError(f"Failed to get user: {response.status}")
-
-                data = await response.json()
-
-                # Parse expire date
-                expire = None
-                if data.get("expire"):
-                    try:
-                        expire = datetime.fromtimestamp(data["expire"])
-                    except (ValueError, TypeError):
-                        logger.warning(f"Failed to parse expire date: {data.get('expire')}")
-
-                return MarzbanUser(
-                    username=data["username"],
-                    status=data.get("status", "unknown"),
-                    used_traffic=data.get("used_traffic", 0),
-                    data_limit=data.get("data_limit"),
-                    expire=expire,
-                    subscription_url=data.get("subscription_url", ""),
-                    links=data.get("links", []),
+        result = json_codec.loads(body)
+        self.token = result["access_token"]
+        self._token_obtained_at = datetime.now()
+        self.token_expires = _parse_token_expiry(self.token)
+        if self.token_expires is None:
+            # Token expiry is unknown, assume the default 1 hour minus a safety margin
+            self.token_expires = datetime.now() + timedelta(minutes=50)
+        self._token_updated.set()
+        logger.info(f"Obtained new Marzban API token (expires at {self.token_expires:%H:%M:%S})")
+        return self.token
+
+    def _token_refresh_at(self) -> Optional[datetime]:
+        """Time when the current token should be renewed"""
+        if self.token_expires is None or self._token_obtained_at is None:
+            return None
+        # Never renew earlier than halfway through token lifetime
+        lifetime = (self.token_expires - self._token_obtained_at).total_seconds()
+        margin = min(self.token_refresh_margin, lifetime / 2)
+        return self.token_expires - timedelta(seconds=margin)
+
+    async def _token_refresh_loop(self) -> None:
+        """Renew token in background before it expires"""
+        while True:
+            delay = None
+            refresh_at = self._token_refresh_at()
+            if refresh_at is not None:
+                delay = max((refresh_at - datetime.now()).total_seconds(), 0.0)
+
+            # Wake up either when it is time to refresh or when token was replaced
+            self._token_updated.clear()
+            try:
+                await asyncio.wait_for(self._token_updated.wait(), timeout=delay)
+                continue
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                async with self._token_lock:
+                    if datetime.now() >= self._token_refresh_at():
+                        await self._login()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Background Marzban token refresh failed: {e}")
+                await asyncio.sleep(30)
+
+    async def _request(self, method: str, path: str, *, operation: str, **kwargs) -> tuple[int, Any]:
+        """Send authorized request to Marzban API
+
+        ``operation`` names the API method in metrics (e.g. "get_user").
+
+        Transient failures (connection errors, timeouts, 502/503/504) are retried
+        with backoff according to the method's RetryPolicy. While the circuit
+        breaker is open the call fails immediately. Each attempt holds a slot of
+        the adaptive limiter, queued by the caller's request priority.
+
+        Waiting for a slot, every attempt and retries are bounded by the time
+        budget of the current update (bot.utils.deadline). Attempts cut short
+        by the budget do not count as panel failures.
+
+        Returns:
+            Tuple of (status code, decoded JSON for 200 responses or raw text otherwise)
+
+        Raises:
+            MarzbanUnavailableError: Panel is unreachable
+            MarzbanDeadlineError: Time budget ran out
+        """
+        policy = self.retry_policies.get(method, self.default_retry_policy)
+
+        for attempt in range(1, policy.attempts + 1):
+            if not self._breaker.allow_request():
+                self.metrics.count(operation, "circuit_open")
+                raise MarzbanUnavailableError(
+                    f"Marzban API is unavailable, next attempt in {self._breaker.retry_after:.0f}s"
                 )
 
-    async def list_users(self, offset: int = 0, limit: int = 100) -> tuple[list[dict], int]:
-        """List all users from Marzban"""
-        token = await self._get_token()
+            try:
+                await deadline.within_budget(self._limiter.acquire())
+            except DeadlineExceeded:
+                self.metrics.count(operation, "deadline")
+                raise MarzbanDeadlineError(f"No time left for Marzban {method} {path}") from None
 
-        headers = {"Authorization": f"Bearer {token}"}
-        params = {"offset": offset, "limit": limit}
+            # Retry only if the budget leaves room for the backoff and another attempt
+            delay = policy.backoff(attempt)
+            left = deadline.remaining()
+            last_attempt = attempt >= policy.attempts or (left is not None and left <= delay)
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{self.base_url}/api/users", headers=headers, params=params) as response:
-                if response.status != 200:
-                    raise MarzbanAPIError(f"Failed to list users: {response.status}")
+            started = time.monotonic()
+            failed: Optional[bool] = None
+            try:
+                timeout = deadline.budget(policy.timeout)
+                status_code, data = await self._send(method, path, timeout, operation, **kwargs)
+                failed = status_code in RETRYABLE_STATUSES
+            except DeadlineExceeded:
+                self.metrics.count(operation, "deadline")
+                raise MarzbanDeadlineError(f"No time left for Marzban {method} {path}") from None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, asyncio.TimeoutError) and deadline.expired():
+                    # Cut short by the update's budget, says nothing about the panel
+                    raise MarzbanDeadlineError(f"Marzban {method} {path} did not answer in time") from e
+                failed = True
+                self._breaker.record_failure()
+                if last_attempt:
+                    raise MarzbanUnavailableError(f"Marzban API request {method} {path} failed: {e!r}") from e
+                logger.warning(f"Marzban {method} {path} failed ({e!r}), retry {attempt}/{policy.attempts - 1}")
+            else:
+                if status_code not in RETRYABLE_STATUSES:
+                    self._breaker.record_success()
+                    return status_code, data
 
-                data = await response.json()
-                return data.get("users", []), data.get("total", 0)
+                self._breaker.record_failure()
+                if last_attempt:
+                    return status_code, data
+                logger.warning(f"Marzban {method} {path} returned {status_code}, retry {attempt}/{policy.attempts - 1}")
+            finally:
+                self._limiter.release(time.monotonic() - started, failed)
+
+            await asyncio.sleep(delay)
+
+    async def _send(self, method: str, path: str, timeout: float, operation: str, **kwargs) -> tuple[int, Any]:
+        """Send single request, re-authenticating once if the panel answers 401"""
+        session = await self._get_session()
+        token = await deadline.within_budget(self._get_token())
+
+        for attempt in range(2):
+            headers = {"Authorization": f"Bearer {token}"}
+            status_code, body = await self._exchange(
+                session, method, path, operation, headers=headers, timeout=timeout, **kwargs
+            )
+            if status_code == 401 and attempt == 0:
+                logger.warning(f"Marzban rejected token for {method} {path}, re-authenticating")
+                token = await self._get_token(stale_token=token)
+                continue
+
+            if status_code == 200:
+                # Decode raw bytes directly, skipping the intermediate str of big user lists
+                return status_code, json_codec.loads(body)
+            return status_code, body.decode("utf-8", errors="replace")
+
+    async def _exchange(
+        self,
+        session: aiohttp.ClientSession,
+        method: str,
+        path: str,
+        operation: str,
+        *,
+        timeout: float,
+        **kwargs,
+    ) -> tuple[int, bytes]:
+        """Perform one HTTP exchange and record it in metrics"""
+        started = self.metrics.start(operation)
+        status: Union[int, str] = "error"
+        body = b""
+        try:
+            async with session.request(
+                method,
+                f"{self.base_url}{path}",
+                timeout=aiohttp.ClientTimeout(total=timeout),
+                **kwargs,
+            ) as response:
+                body = await response.read()
+                status = response.status
+                return status, body
+        except asyncio.TimeoutError:
+            status = "timeout"
+            raise
+        except asyncio.CancelledError:
+            status = "cancelled"
+            raise
+        finally:
+            self.metrics.finish(operation, started, status, len(body))
+
+    def breaker_stats(self) -> dict[str, Any]:
+        """Circuit breaker state for diagnostics"""
+        return self._breaker.stats()
+
+    def limiter_stats(self) -> dict[str, Any]:
+        """Adaptive concurrency limiter state for diagnostics"""
+        return self._limiter.stats()
+
+    async def get_user(self, username: str, *, use_cache: bool = True) -> MarzbanUser:
+        """Get user information from Marzban
+
+        Fresh cached data is returned without a request. Stale data is returned
+        as well, while a single background request refreshes the cache. If the
+        update's time budget runs out, any cached data (even expired) is served.
+
+        Args:
+            username: Marzban username
+            use_cache: Set to False to always fetch from the panel (cached data
+                is never returned then, MarzbanDeadlineError is raised instead)
+        """
+        # Kept before lookup(), which drops entries past the stale window
+        fallback = self._user_cache.peek(username)
+        if use_cache:
+            entry = self._user_cache.lookup(username)
+            if entry is not None:
+                if not entry.is_fresh:
+                    self._schedule_refresh(("user", username), lambda: self._refresh_user(username))
+                return entry.value
+
+        try:
+            return await self._shared(("user", username), lambda: self._load_user(username))
+        except MarzbanDeadlineError:
+            if not use_cache or fallback is None:
+                raise
+            # Out of time: answer with whatever we have and refresh in background
+            logger.info(f"Serving {fallback.age:.0f}s old data of Marzban user {username}, panel is too slow")
+            self._schedule_refresh(("user", username), lambda: self._refresh_user(username))
+            return fallback.value
+
+    async def _load_user(self, username: str) -> MarzbanUser:
+        """Fetch user into cache, returns the newest known state"""
+        started_at = time.monotonic()
+        user = await self._fetch_user(username)
+        # Do not overwrite data stored by a write that finished while we were fetching
+        entry = self._user_cache.peek(username)
+        if entry is not None and entry.stored_at > started_at:
+            return entry.value
+        self._user_cache.set(username, user)
+        return user
+
+    async def _shared(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Coalesced call, waited for within the caller's time budget
+
+        Raises:
+            MarzbanDeadlineError: Budget ran out while waiting (the shared request goes on)
+        """
+        try:
+            return await self._coalescer.run(key, factory)
+        except MarzbanDeadlineError:
+            raise
+        except DeadlineExceeded:
+            raise MarzbanDeadlineError(f"No time left waiting for Marzban request {key}") from None
+
+    def _schedule_refresh(self, key: Hashable, refresh: Callable[[], Awaitable[None]]) -> None:
+        """Run refresh() in background unless a refresh for key is already running"""
+        task = self._refresh_tasks.get(key)
+        if task is not None and not task.done():
+            return
+        self._refresh_tasks[key] = asyncio.create_task(self._run_in_background(refresh))
+
+    @staticmethod
+    async def _run_in_background(job: Callable[[], Awaitable[None]]) -> None:
+        """Run job with background priority and no deadline (contextvar changes stay inside the task)"""
+        request_priority.set(Priority.BACKGROUND)
+        deadline.request_deadline.set(None)
+        await job()
+
+    async def _refresh_user(self, username: str) -> None:
+        """Re-fetch user into cache (background task)"""
+        try:
+            await self._shared(("user", username), lambda: self._load_user(username))
+        except MarzbanAPIError as e:
+            logger.warning(f"Background refresh of Marzban user {username} failed: {e}")
+            if "not found" in str(e):
+                self._user_cache.invalidate(username)
+        except Exception as e:
+            logger.warning(f"Background refresh of Marzban user {username} failed: {e}")
+        finally:
+            self._refresh_tasks.pop(("user", username), None)
+
+    def add_user_listener(self, listener: Callable[[dict], None]) -> None:
+        """Register callback receiving raw user data whenever it is fetched or changed"""
+        self._user_listeners.append(listener)
+
+    def _notify_user_data(self, data: dict) -> None:
+        """Pass fresh user data to listeners"""
+        for listener in self._user_listeners:
+            try:
+                listener(data)
+            except Exception as e:
+                logger.warning(f"Marzban user listener failed: {e}")
+
+    def invalidate_user(self, username: str) -> None:
+        """Drop cached data for user"""
+        self._user_cache.invalidate(username)
+
+    def cache_stats(self) -> dict[str, dict]:
+        """Hit/miss counters of client caches"""
+        return {
+            "users": self._user_cache.stats(),
+            "inbounds": self._inbounds_cache.stats(),
+            "usage": self._usage_cache.stats(),
+        }
+
+    def coalescing_stats(self) -> dict:
+        """Counters of requests saved by coalescing concurrent identical reads"""
+        return self._coalescer.stats()
+
+    async def _fetch_user(self, username: str) -> MarzbanUser:
+        """Fetch user information from Marzban (bypasses cache)"""
+        status_code, data = await self._request("GET", f"/api/user/{username}", operation="get_user")
+        if status_code == 404:
+            raise MarzbanAPIError(f"User {username} not found in Marzban")
+        if status_code != 200:
+            raise MarzbanAPIError(f"Failed to get user: {status_code}")
+
+        self._notify_user_data(data)
+        return _parse_user(data)
+
+    async def list_users(
+        self,
+        offset: int = 0,
+        limit: int = 100,
+        sort: Optional[str] = None,
+        usernames: Optional[list[str]] = None,
+    ) -> tuple[list[dict], int]:
+        """List all users from Marzban
+
+        Args:
+            offset: Number of users to skip
+            limit: Page size
+            sort: Panel sort option, e.g. "-created_at" (None = panel default)
+            usernames: Only return these users
+        """
+        key = ("users", offset, limit, sort, tuple(usernames) if usernames else None)
+        return await self._shared(key, lambda: self._fetch_users_page(offset, limit, sort, usernames))
+
+    async def prime_users(self, usernames: list[str], batch_size: int = 100) -> int:
+        """Load users into the get_user() cache with a few list requests
+
+        Args:
+            usernames: Users to load (unknown usernames are ignored)
+            batch_size: Usernames per request
+
+        Returns:
+            Number of users cached
+        """
+        loaded = 0
+        for start in range(0, len(usernames), batch_size):
+            batch = usernames[start:start + batch_size]
+            users, _ = await self.list_users(offset=0, limit=len(batch), usernames=batch)
+            for user_data in users:
+                self._notify_user_data(user_data)
+                user = _parse_user(user_data)
+                self._user_cache.set(user.username, user)
+            loaded += len(users)
+        return loaded
+
+    async def iter_users(self, page_size: int = 500, concurrency: int = 4) -> AsyncIterator[dict]:
+        """Iterate over all Marzban users
+
+        The first page tells the total, remaining pages are prefetched
+        concurrently (at most ``concurrency`` at a time) and users are yielded
+        in panel order as soon as their page arrives, so memory use does not
+        grow with the number of users.
+
+        Args:
+            page_size: Users per request
+            concurrency: Max pages requested in parallel
+        """
+        users, total = await self.list_users(offset=0, limit=page_size)
+        offsets = iter(range(page_size, total, page_size))
+        pending: deque[asyncio.Task] = deque(
+            asyncio.create_task(self.list_users(offset=offset, limit=page_size))
+            # range() goes first so zip() does not consume an extra offset
+            for _, offset in zip(range(max(concurrency, 1)), offsets)
+        )
+
+        try:
+            for user in users:
+                yield user
+
+            while pending:
+                users, _ = await pending.popleft()
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    pending.append(asyncio.create_task(self.list_users(offset=next_offset, limit=page_size)))
+
+                for user in users:
+                    yield user
+        finally:
+            # Consumer may stop early - wait for cancelled prefetches before the session can close
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _fetch_users_page(
+        self, offset: int, limit: int, sort: Optional[str] = None, usernames: Optional[list[str]] = None
+    ) -> tuple[list[dict], int]:
+        """Fetch one page of users from Marzban"""
+        params: list[tuple[str, Union[str, int]]] = [("offset", offset), ("limit", limit)]
+        if sort:
+            params.append(("sort", sort))
+        for username in usernames or ():
+            params.append(("username", username))
+
+        status_code, data = await self._request("GET", "/api/users", operation="list_users", params=params)
+        if status_code != 200:
+            raise MarzbanAPIError(f"Failed to list users: {status_code}")
+
+        return data.get("users", []), data.get("total", 0)
 
     async def create_user(
         self,
@@ -132,16 +818,10 @@ class MarzbanAPI:
         Returns:
             MarzbanUser object with created user data
         """
-        token = await self._get_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-
         # Get all available inbounds if not specified
-        if inbounds is None or not inbounds:
-            available_inbounds = await self.get_inbounds()
-            inbounds = available_inbounds
+        auto_inbounds = not inbounds
+        if auto_inbounds:
+            inbounds = await self.get_inbounds()
             logger.info(f"Using all available inbounds for user {username}: {inbounds}")
 
         # Create proxies dict with empty settings for each protocol
@@ -162,38 +842,27 @@ class MarzbanAPI:
 
         logger.info(f"Creating user {username} with payload: {payload}")
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{self.base_url}/api/user",
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status == 409:
-                    raise MarzbanAPIError(f"User {username} already exists in Marzban")
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise MarzbanAPIError(f"Failed to create user: {response.status} - {error_text}")
-
-                data = await response.json()
-                logger.info(f"Created user {username} in Marzban")
-
-                # Parse expire date
-                expire_dt = None
-                if data.get("expire"):
-                    try:
-                        expire_dt = datetime.fromtimestamp(data["expire"])
-                    except (ValueError, TypeError):
-                        logger.warning(f"Failed to parse expire date: {data.get('expire')}")
-
-                return MarzbanUser(
-                    username=data["username"],
-                    status=data.get("status", "active"),
-                    used_traffic=data.get("used_traffic", 0),
-                    data_limit=data.get("data_limit"),
-                    expire=expire_dt,
-                    subscription_url=data.get("subscription_url", ""),
-                    links=data.get("links", []),
-                )
+        status_code, data = await self._request("POST", "/api/user", operation="create_user", json=payload)
+        if auto_inbounds and _is_unknown_inbound_error(status_code, data):
+            # Cached inbounds are outdated (panel was reconfigured) - reload them and retry once
+            logger.warning(f"Marzban rejected cached inbounds for {username}, refreshing: {data}")
+            self.invalidate_inbounds()
+            inbounds = await self.get_inbounds()
+            payload["inbounds"] = inbounds
+            payload["proxies"] = {protocol: {} for protocol in inbounds.keys()}
+            status_code, data = await self._request("POST", "/api/user", operation="create_user", json=payload)
+
+        if status_code == 409:
+            raise MarzbanAPIError(f"User {username} already exists in Marzban")
+        if status_code != 200:
+            raise MarzbanAPIError(f"Failed to create user: {status_code} - {data}")
+
+        logger.info(f"Created user {username} in Marzban")
+        self._notify_user_data(data)
+
+        user = _parse_user(data)
+        self._user_cache.set(user.username, user)
+        return user
 
     async def modify_user(
         self,
@@ -204,105 +873,228 @@ class MarzbanAPI:
     ) -> MarzbanUser:
         """Modify existing user in Marzban
 
+        Only the changed fields are sent, the panel keeps the rest as is,
+        so no read is needed before the update and concurrent edits of other
+        fields are not overwritten. Changes relative to the current values
+        belong in bulk_modify() (UserChanges), which reads fresh panel state.
+
         Args:
             username: Username to modify
             status: User status (active/disabled/limited/expired/on_hold)
-            data_limit: Data limit in bytes (None = keep current)
-            expire: Expiry timestamp (None = keep current)
+            data_limit: Data limit in bytes (None = keep current, 0 = unlimited)
+            expire: Expiry timestamp (None = keep current, 0 = unlimited)
 
         Returns:
             MarzbanUser object with updated user data
         """
-        # First get current user data
-        current_user = await self.get_user(username)
-
-        token = await self._get_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-
-        # Build payload with current values and modifications
         payload = {
-            "username": username,
-            "status": status if status is not None else current_user.status,
-            "data_limit": data_limit if data_limit is not None else current_user.data_limit or 0,
-            "data_limit_reset_strategy": "no_reset",
+            field: value
+            for field, value in (("status", status), ("data_limit", data_limit), ("expire", expire))
+            if value is not None
         }
-
-        # Handle expire
-        if expire is not None:
-            payload["expire"] = expire
-        elif current_user.expire:
-            payload["expire"] = int(current_user.expire.timestamp())
-        else:
-            payload["expire"] = 0
+        if not payload:
+            # Nothing to change - just return current state
+            return await self.get_user(username)
 
         logger.info(f"Modifying user {username} with payload: {payload}")
 
-        async with aiohttp.ClientSession() as session:
-            async with session.put(
-                f"{self.base_url}/api/user/{username}",
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status == 404:
-                    raise MarzbanAPIError(f"User {username} not found in Marzban")
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise MarzbanAPIError(f"Failed to modify user: {response.status} - {error_text}")
-
-                data = await response.json()
-                logger.info(f"Modified user {username} in Marzban")
-
-                # Parse expire date
-                expire_dt = None
-                if data.get("expire"):
-                    try:
-                        expire_dt = datetime.fromtimestamp(data["expire"])
-                    except (ValueError, TypeError):
-                        logger.warning(f"Failed to parse expire date: {data.get('expire')}")
-
-                return MarzbanUser(
-                    username=data["username"],
-                    status=data.get("status", "active"),
-                    used_traffic=data.get("used_traffic", 0),
-                    data_limit=data.get("data_limit"),
-                    expire=expire_dt,
-                    subscription_url=data.get("subscription_url", ""),
-                    links=data.get("links", []),
-                )
+        status_code, data = await self._request("PUT", f"/api/user/{username}", operation="modify_user", json=payload)
+        if status_code == 404:
+            raise MarzbanAPIError(f"User {username} not found in Marzban")
+        if status_code != 200:
+            raise MarzbanAPIError(f"Failed to modify user: {status_code} - {data}")
+
+        logger.info(f"Modified user {username} in Marzban")
+        self._notify_user_data(data)
+
+        user = _parse_user(data)
+        self._user_cache.set(user.username, user)
+        return user
+
+    async def bulk_modify(
+        self,
+        usernames: list[str],
+        changes: UserChanges,
+        concurrency: int = 10,
+    ) -> AsyncIterator[BulkResult]:
+        """Apply the same change to many users
+
+        Up to ``concurrency`` users are updated at a time. Results are yielded
+        as soon as each user is done (not in input order); a failure for one
+        user is reported in its BulkResult and does not stop the others.
+        Requests run with background priority.
+
+        Usage:
+            async for result in marzban.bulk_modify(usernames, UserChanges(extend_days=30)):
+                ...
+        """
+        usernames = list(dict.fromkeys(usernames))
+        if not usernames:
+            return
 
-    async def get_inbounds(self) -> dict[str, list[str]]:
+        pending = iter(usernames)
+        results: asyncio.Queue[BulkResult] = asyncio.Queue()
+
+        async def worker() -> None:
+            # Bulk updates yield to interactive requests (the change stays inside the worker task)
+            request_priority.set(Priority.BACKGROUND)
+            # Workers share one iterator, so each username is taken exactly once
+            for username in pending:
+                await results.put(await self._bulk_modify_one(username, changes))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(max(concurrency, 1), len(usernames)))]
+        try:
+            for _ in range(len(usernames)):
+                yield await results.get()
+        finally:
+            # Consumer may stop early - do not leave updates running
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _bulk_modify_one(self, username: str, changes: UserChanges) -> BulkResult:
+        """Apply bulk change to one user, capturing the error"""
+        try:
+            # Absolute changes need a single PUT; relative ones read current panel state first
+            # (a cached expiry or limit may be minutes old and would undo recent panel edits)
+            current = await self.get_user(username, use_cache=False) if changes.is_relative else None
+            user = await self.modify_user(username, **changes.resolve(current))
+            return BulkResult(username=username, user=user)
+        except Exception as e:
+            logger.warning(f"Bulk change of Marzban user {username} failed: {e}")
+            return BulkResult(username=username, error=str(e))
+
+    async def get_inbounds(self, *, use_cache: bool = True) -> dict[str, list[str]]:
         """Get available inbounds from Marzban
 
+        Cached for ``inbounds_cache_ttl`` seconds; after that the cached value
+        is still returned while a background request refreshes it.
+
         Returns:
             Dictionary mapping protocol to list of inbound tags
             Example: {"vless": ["VLESS TCP REALITY"], "vmess": ["VMess WS"]}
         """
-        # Return cached inbounds if available
-        if self._inbounds_cache is not None:
-            return self._inbounds_cache
+        if use_cache:
+            entry = self._inbounds_cache.lookup("inbounds")
+            if entry is not None:
+                if not entry.is_fresh:
+                    self._schedule_refresh("inbounds", self._refresh_inbounds)
+                return entry.value
+
+        return await self._shared("inbounds", self._fetch_inbounds)
+
+    async def _refresh_inbounds(self) -> None:
+        """Re-fetch inbounds into cache (background task)"""
+        try:
+            await self._shared("inbounds", self._fetch_inbounds)
+        except Exception as e:
+            logger.warning(f"Background refresh of Marzban inbounds failed: {e}")
+        finally:
+            self._refresh_tasks.pop("inbounds", None)
+
+    def invalidate_inbounds(self) -> None:
+        """Drop cached inbounds so the next call fetches them from the panel"""
+        self._inbounds_cache.invalidate("inbounds")
+        logger.info("Marzban inbounds cache invalidated")
+
+    async def _fetch_inbounds(self) -> dict[str, list[str]]:
+        """Fetch inbounds from Marzban and cache them"""
+        status_code, data = await self._request("GET", "/api/inbounds", operation="get_inbounds")
+        if status_code != 200:
+            raise MarzbanAPIError(f"Failed to get inbounds: {status_code}")
+
+        # Convert to format {protocol: [tag1, tag2, ...]}
+        inbounds = {}
+        for protocol, inbound_list in data.items():
+            inbounds[protocol] = [inbound["tag"] for inbound in inbound_list]
+
+        # Cache the result
+        self._inbounds_cache.set("inbounds", inbounds)
+        logger.info(f"Retrieved inbounds: {inbounds}")
+        return inbounds
+
+    async def get_system_stats(self, *, use_cache: bool = True) -> dict[str, Any]:
+        """Get panel-wide counters (GET /api/system)
+
+        One cheap call instead of listing every user: total_user, users_active,
+        users_disabled, users_limited, users_expired, users_on_hold,
+        online_users, incoming/outgoing_bandwidth, memory and CPU usage.
+        """
+        return await self._cached_get("/api/system", operation="get_system_stats", use_cache=use_cache)
+
+    async def get_users_usage(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        *,
+        use_cache: bool = True,
+    ) -> list[dict]:
+        """Get traffic of all users per node for a period (GET /api/users/usage)
+
+        Args:
+            start: Period start in UTC (None = panel default, 30 days ago)
+            end: Period end in UTC (None = now)
+
+        Returns:
+            List of {"node_id", "node_name", "used_traffic"}
+        """
+        data = await self._cached_get(
+            "/api/users/usage", operation="get_users_usage", params=_usage_params(start, end), use_cache=use_cache
+        )
+        return data.get("usages", [])
 
-        token = await self._get_token()
-        headers = {"Authorization": f"Bearer {token}"}
+    async def get_nodes_usage(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        *,
+        use_cache: bool = True,
+    ) -> list[dict]:
+        """Get uplink/downlink traffic per node for a period (GET /api/nodes/usage)
 
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f"{self.base_url}/api/inbounds", headers=headers) as response:
-                if response.status != 200:
-                    raise MarzbanAPIError(f"Failed to get inbounds: {response.status}")
+        Args:
+            start: Period start in UTC (None = panel default, 30 days ago)
+            end: Period end in UTC (None = now)
 
-                data = await response.json()
+        Returns:
+            List of {"node_id", "node_name", "uplink", "downlink"}
+        """
+        data = await self._cached_get(
+            "/api/nodes/usage", operation="get_nodes_usage", params=_usage_params(start, end), use_cache=use_cache
+        )
+        return data.get("usages", [])
+
+    async def _cached_get(
+        self, path: str, *, operation: str, params: Optional[dict] = None, use_cache: bool = True
+    ) -> Any:
+        """GET aggregate endpoint, cached for ``usage_cache_ttl`` (stale value served while refreshing)"""
+        key = (path, tuple(sorted((params or {}).items())))
+        if use_cache:
+            entry = self._usage_cache.lookup(key)
+            if entry is not None:
+                if not entry.is_fresh:
+                    self._schedule_refresh(key, lambda: self._refresh_cached_get(key, path, operation, params))
+                return entry.value
+
+        return await self._shared(key, lambda: self._fetch_cached_get(key, path, operation, params))
 
-                # Convert to format {protocol: [tag1, tag2, ...]}
-                inbounds = {}
-                for protocol, inbound_list in data.items():
-                    inbounds[protocol] = [inbound["tag"] for inbound in inbound_list]
+    async def _fetch_cached_get(self, key: Hashable, path: str, operation: str, params: Optional[dict]) -> Any:
+        """Fetch aggregate endpoint and cache the result"""
+        status_code, data = await self._request("GET", path, operation=operation, params=params)
+        if status_code != 200:
+            raise MarzbanAPIError(f"Failed to get {path}: {status_code}")
 
-                # Cache the result
-                self._inbounds_cache = inbounds
-                logger.info(f"Retrieved inbounds: {inbounds}")
-                return inbounds
+        self._usage_cache.set(key, data)
+        return data
+
+    async def _refresh_cached_get(self, key: Hashable, path: str, operation: str, params: Optional[dict]) -> None:
+        """Re-fetch aggregate endpoint into cache (background task)"""
+        try:
+            await self._shared(key, lambda: self._fetch_cached_get(key, path, operation, params))
+        except Exception as e:
+            logger.warning(f"Background refresh of Marzban {path} failed: {e}")
+        finally:
+            self._refresh_tasks.pop(key, None)
 
     async def check_connection(self) -> bool:
         """Check if Marzban API is accessible"""
@@ -0,0 +1,263 @@
+"""Latency and error metrics for outgoing requests"""
+
+import math
+import time
+from collections import Counter
+from typing import Any, Optional, Union
+
+
+# Upper bounds of latency buckets in seconds (last bucket catches everything slower)
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, math.inf)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (cumulative counts are computed on read)"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add one sample (seconds)"""
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (max for the last bucket)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> dict[str, Any]:
+        """Histogram state for export"""
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "max": round(self.max, 6),
+            "p50": round(self.quantile(0.5), 6),
+            "p95": round(self.quantile(0.95), 6),
+            "p99": round(self.quantile(0.99), 6),
+            "buckets": {
+                ("+Inf" if math.isinf(bound) else str(bound)): count
+                for bound, count in zip(LATENCY_BUCKETS, self.counts)
+            },
+        }
+
+
+class OperationMetrics:
+    """Metrics of one operation (API method)"""
+
+    __slots__ = ("latency", "statuses", "bytes_received", "in_flight")
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.statuses: Counter[str] = Counter()
+        self.bytes_received = 0
+        self.in_flight = 0
+
+
+class RequestMetrics:
+    """
+    Per-operation latency histograms, status counters, bytes received and
+    in-flight gauges for calls to one upstream service
+
+    Usage:
+        started = metrics.start("get_user")
+        ...
+        metrics.finish("get_user", started, status=200, bytes_received=len(body))
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.created_at = time.time()
+        self._operations: dict[str, OperationMetrics] = {}
+
+    def _operation(self, operation: str) -> OperationMetrics:
+        metrics = self._operations.get(operation)
+        if metrics is None:
+            metrics = self._operations[operation] = OperationMetrics()
+        return metrics
+
+    @property
+    def in_flight(self) -> int:
+        """Calls currently running (all operations)"""
+        return sum(metrics.in_flight for metrics in self._operations.values())
+
+    def start(self, operation: str) -> float:
+        """Register call start, returns start time for finish()"""
+        self._operation(operation).in_flight += 1
+        return time.perf_counter()
+
+    def finish(
+        self,
+        operation: str,
+        started: float,
+        status: Union[int, str],
+        bytes_received: int = 0,
+    ) -> None:
+        """
+        Register call end
+
+        Args:
+            operation: Operation name
+            started: Value returned by start()
+            status: HTTP status code or error kind ("timeout", "error", ...)
+            bytes_received: Response body size
+        """
+        metrics = self._operation(operation)
+        metrics.in_flight -= 1
+        metrics.latency.observe(time.perf_counter() - started)
+        metrics.statuses[str(status)] += 1
+        metrics.bytes_received += bytes_received
+
+    def count(self, operation: str, status: str) -> None:
+        """Register call that was not sent (e.g. rejected by circuit breaker)"""
+        self._operation(operation).statuses[status] += 1
+
+    def summary(self) -> list[dict[str, Any]]:
+        """Short per-operation view, slowest p95 first"""
+        rows = []
+        for operation, metrics in self._operations.items():
+            total = sum(metrics.statuses.values())
+            failed = sum(
+                count for status, count in metrics.statuses.items()
+                if not (status.isdigit() and int(status) < 500)
+            )
+            rows.append({
+                "operation": operation,
+                "calls": total,
+                "errors": failed,
+                "p50": metrics.latency.quantile(0.5),
+                "p95": metrics.latency.quantile(0.95),
+                "max": metrics.latency.max,
+                "in_flight": metrics.in_flight,
+                "bytes_received": metrics.bytes_received,
+            })
+        rows.sort(key=lambda row: row["p95"], reverse=True)
+        return rows
+
+    def snapshot(self) -> dict[str, Any]:
+        """Full metrics state for export"""
+        return {
+            "name": self.name,
+            "since": self.created_at,
+            "in_flight": self.in_flight,
+            "operations": {
+                operation: {
+                    "latency": metrics.latency.snapshot(),
+                    "statuses": dict(metrics.statuses),
+                    "bytes_received": metrics.bytes_received,
+                    "in_flight": metrics.in_flight,
+                }
+                for operation, metrics in self._operations.items()
+            },
+        }
+
+
+class SessionMetrics:
+    """
+    Database use per update: was a session touched, did it check out a
+    connection, how long it waited for one and how long it held it
+    """
+
+    def __init__(self):
+        self.created_at = time.time()
+        self.updates = 0
+        self.sessions_opened = 0
+        self.connections_used = 0
+        self.wait_time = Histogram()
+        self.hold_time = Histogram()
+
+    def record(self, opened: bool, waited: Optional[float], held: Optional[float]) -> None:
+        """
+        Register finished update
+
+        Args:
+            opened: Handler code touched the session
+            waited: Seconds from first session use until a connection was ready
+                (pool checkout wait, plus connect time for new connections)
+            held: Seconds a pooled connection was held (None = no connection used)
+        """
+        self.updates += 1
+        self.sessions_opened += opened
+        if held is not None:
+            self.connections_used += 1
+            self.hold_time.observe(held)
+        if waited is not None:
+            self.wait_time.observe(waited)
+
+    def snapshot(self) -> dict[str, Any]:
+        """Usage counters for export"""
+        return {
+            "since": self.created_at,
+            "updates": self.updates,
+            "sessions_opened": self.sessions_opened,
+            "connections_used": self.connections_used,
+            "connection_ratio": self.connections_used / self.updates if self.updates else 0.0,
+            "wait_time": self.wait_time.snapshot(),
+            "hold_time": self.hold_time.snapshot(),
+        }
+
+
+class PoolMetrics:
+    """Connection pool counters fed by SQLAlchemy pool events"""
+
+    def __init__(self, size: int, max_overflow: int):
+        self.created_at = time.time()
+        self.size = size
+        self.max_overflow = max_overflow
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.checkouts = 0
+        self.overflow_checkouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def on_connect(self) -> None:
+        """New DBAPI connection opened"""
+        self.connects += 1
+
+    def on_checkout(self) -> None:
+        """Connection handed out by the pool"""
+        self.checkouts += 1
+        self.checked_out += 1
+        self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+        if self.checked_out > self.size:
+            self.overflow_checkouts += 1
+
+    def on_checkin(self) -> None:
+        """Connection returned to the pool"""
+        self.checked_out = max(self.checked_out - 1, 0)
+
+    def on_invalidate(self) -> None:
+        """Connection dropped (failed pre-ping, server restart)"""
+        self.invalidations += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """Pool counters for export"""
+        return {
+            "since": self.created_at,
+            "size": self.size,
+            "max_overflow": self.max_overflow,
+            "checked_out": self.checked_out,
+            "peak_checked_out": self.peak_checked_out,
+            "checkouts": self.checkouts,
+            "overflow_checkouts": self.overflow_checkouts,
+            "connects": self.connects,
+            "invalidations": self.invalidations,
+        }
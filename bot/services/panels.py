@@ -0,0 +1,284 @@
+"""Registry of Marzban panels served by one bot"""
+
+import asyncio
+import itertools
+import logging
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Iterator, Optional, TypeVar, Union
+
+from .limiter import Priority, request_priority
+from .marzban_api import BulkResult, MarzbanAPI, MarzbanAPIError, MarzbanUnavailableError, MarzbanUser, UserChanges
+from .user_mirror import MarzbanUserMirror
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PLACEMENT_STRATEGIES = ("least_loaded", "round_robin")
+
+
+@dataclass
+class Panel:
+    """Marzban instance with its own client and optional user mirror"""
+
+    name: str
+    api: MarzbanAPI
+    mirror: Optional[MarzbanUserMirror] = None
+
+    @property
+    def mirror_ready(self) -> bool:
+        """Local snapshot of panel users can be used"""
+        return self.mirror is not None and self.mirror.is_ready
+
+    async def user_count(self) -> int:
+        """Number of users on the panel"""
+        if self.mirror_ready:
+            return self.mirror.total
+        _, total = await self.api.list_users(offset=0, limit=1)
+        return total
+
+    async def page(self, offset: int, limit: int) -> list[dict]:
+        """Page of panel users in panel order"""
+        if self.mirror_ready:
+            users, _ = self.mirror.page(offset=offset, limit=limit)
+            return users
+        users, _ = await self.api.list_users(offset=offset, limit=limit)
+        return users
+
+
+class PanelRegistry:
+    """
+    All Marzban panels known to the bot
+
+    Each bot user is bound to one panel (``User.panel``, NULL = default panel).
+    Fleet-wide reads (user list, statistics) query all panels concurrently
+    and merge the results; new Marzban users are placed according to the
+    placement strategy:
+
+    - ``least_loaded`` - panel with the fewest users
+    - ``round_robin`` - panels in turn
+    """
+
+    def __init__(self, default_panel: str, placement: str = "least_loaded"):
+        if placement not in PLACEMENT_STRATEGIES:
+            raise ValueError(f"Unknown panel placement strategy: {placement}")
+        self.default_panel = default_panel
+        self.placement = placement
+        self._panels: dict[str, Panel] = {}
+        self._round_robin = itertools.count()
+
+    def add(self, panel: Panel) -> None:
+        """Register panel"""
+        if panel.name in self._panels:
+            raise ValueError(f"Duplicate Marzban panel name: {panel.name}")
+        self._panels[panel.name] = panel
+
+    def __iter__(self) -> Iterator[Panel]:
+        return iter(self._panels.values())
+
+    def __len__(self) -> int:
+        return len(self._panels)
+
+    @property
+    def default(self) -> Panel:
+        """Panel used for bindings without explicit panel"""
+        return self._panels[self.default_panel]
+
+    def get(self, name: Optional[str]) -> Panel:
+        """Get panel by name (None = default panel)"""
+        if name is None:
+            return self.default
+        try:
+            return self._panels[name]
+        except KeyError:
+            raise KeyError(f"Unknown Marzban panel: {name}") from None
+
+    def for_user(self, db_user: Any) -> Panel:
+        """Panel the bot user is bound to"""
+        name = getattr(db_user, "panel", None)
+        try:
+            return self.get(name)
+        except KeyError:
+            logger.warning(
+                f"User {getattr(db_user, 'telegram_id', None)} is bound to unknown panel {name}, using default"
+            )
+            return self.default
+
+    # ----- lifecycle -----
+
+    async def start(self) -> None:
+        """Start background sync of all mirrors"""
+        for panel in self:
+            if panel.mirror is not None:
+                await panel.mirror.start()
+
+    async def close(self) -> None:
+        """Stop mirrors and close all clients"""
+        for panel in self:
+            if panel.mirror is not None:
+                await panel.mirror.stop()
+            await panel.api.close()
+
+    # ----- fleet-wide operations -----
+
+    async def fan_out(self, call: Callable[[Panel], Awaitable[T]]) -> dict[str, Union[T, BaseException]]:
+        """Run call(panel) for all panels concurrently; failures are returned, not raised"""
+        panels = list(self)
+        results = await asyncio.gather(*(call(panel) for panel in panels), return_exceptions=True)
+        return {panel.name: result for panel, result in zip(panels, results)}
+
+    async def list_users(self, offset: int = 0, limit: int = 10) -> tuple[list[tuple[str, dict]], int]:
+        """
+        Page of users across all panels (panels one after another)
+
+        Returns:
+            Tuple of ([(panel name, user data)], total users on reachable panels)
+        """
+        counts = await self.fan_out(lambda panel: panel.user_count())
+
+        # Map the global window onto per-panel windows
+        windows: list[tuple[Panel, int, int]] = []
+        start = 0
+        for panel in self:
+            count = counts[panel.name]
+            if isinstance(count, BaseException):
+                logger.warning(f"Panel {panel.name} skipped in user list: {count}")
+                continue
+            low, high = max(offset, start), min(offset + limit, start + count)
+            if high > low:
+                windows.append((panel, low - start, high - low))
+            start += count
+
+        pages = await asyncio.gather(*(panel.page(panel_offset, size) for panel, panel_offset, size in windows))
+        users = [(panel.name, user_data) for (panel, _, _), page in zip(windows, pages) for user_data in page]
+        return users, start
+
+    async def locate(self, username: str) -> Optional[tuple[Panel, MarzbanUser]]:
+        """
+        Find panel that has the Marzban user
+
+        Raises:
+            MarzbanAPIError: User was not found, but some panel could not be checked
+        """
+        results = await self.fan_out(lambda panel: panel.api.get_user(username))
+
+        failure: Optional[BaseException] = None
+        for panel in self:
+            result = results[panel.name]
+            if isinstance(result, MarzbanUser):
+                return panel, result
+            if not (isinstance(result, MarzbanAPIError) and "not found" in str(result)):
+                failure = result
+
+        if failure is not None:
+            raise MarzbanUnavailableError(f"Could not check all panels for {username}: {failure}")
+        return None
+
+    async def group_by_panel(
+        self, usernames: Iterable[str], concurrency: int = 10
+    ) -> tuple[dict[str, list[str]], list[BulkResult]]:
+        """
+        Split Marzban usernames by the panel that has them
+
+        Loaded mirrors answer first, the rest are looked up on all panels
+        (at most ``concurrency`` usernames at a time, background priority).
+
+        Returns:
+            Tuple of ({panel name: usernames}, failed results of usernames that could not be placed)
+        """
+        usernames = list(dict.fromkeys(usernames))
+        panels = list(self)
+        if len(panels) == 1:
+            return ({panels[0].name: usernames} if usernames else {}), []
+
+        groups: dict[str, list[str]] = {panel.name: [] for panel in panels}
+        unresolved = []
+        for username in usernames:
+            panel = next((p for p in panels if p.mirror_ready and p.mirror.get(username) is not None), None)
+            if panel is not None:
+                groups[panel.name].append(username)
+            else:
+                unresolved.append(username)
+
+        failures: list[BulkResult] = []
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def resolve(username: str) -> None:
+            # Lookups yield to interactive requests (the change stays inside this task)
+            request_priority.set(Priority.BACKGROUND)
+            async with semaphore:
+                try:
+                    found = await self.locate(username)
+                except MarzbanAPIError as e:
+                    failures.append(BulkResult(username=username, error=str(e)))
+                    return
+            if found is None:
+                failures.append(BulkResult(username=username, error=f"User {username} not found on any Marzban panel"))
+            else:
+                groups[found[0].name].append(username)
+
+        await asyncio.gather(*(asyncio.create_task(resolve(username)) for username in unresolved))
+        return {name: group for name, group in groups.items() if group}, failures
+
+    async def bulk_modify(
+        self, groups: dict[str, list[str]], changes: UserChanges, concurrency: int = 10
+    ) -> AsyncIterator[BulkResult]:
+        """
+        Apply the same change to users of several panels
+
+        Panels are updated at the same time, each with up to ``concurrency``
+        users in flight (see MarzbanAPI.bulk_modify). Results are yielded as
+        soon as each user is done.
+
+        Args:
+            groups: Usernames by panel name (see group_by_panel)
+        """
+        runs = []
+        for name, usernames in groups.items():
+            try:
+                runs.append((self.get(name), usernames))
+            except KeyError as e:
+                for username in usernames:
+                    yield BulkResult(username=username, error=str(e))
+
+        # None marks a panel that is done
+        results: asyncio.Queue[Optional[BulkResult]] = asyncio.Queue()
+
+        async def run(panel: Panel, usernames: list[str]) -> None:
+            try:
+                async for result in panel.api.bulk_modify(usernames, changes, concurrency):
+                    await results.put(result)
+            finally:
+                await results.put(None)
+
+        tasks = [asyncio.create_task(run(panel, usernames)) for panel, usernames in runs]
+        try:
+            running = len(tasks)
+            while running:
+                result = await results.get()
+                if result is None:
+                    running -= 1
+                else:
+                    yield result
+        finally:
+            # Consumer may stop early - do not leave updates running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def choose_for_new_user(self) -> Panel:
+        """Pick panel for a new Marzban user according to placement strategy"""
+        panels = list(self)
+        if len(panels) == 1:
+            return panels[0]
+
+        if self.placement == "round_robin":
+            return panels[next(self._round_robin) % len(panels)]
+
+        counts = await self.fan_out(lambda panel: panel.user_count())
+        available = [(count, index) for index, (name, count) in enumerate(counts.items()) if isinstance(count, int)]
+        if not available:
+            raise MarzbanUnavailableError("No Marzban panel is reachable")
+        _, index = min(available)
+        return panels[index]
@@ -0,0 +1,112 @@
+"""Retry policies and circuit breaker for outgoing requests"""
+
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How a request is retried on transient failures
+
+    Args:
+        attempts: Total number of attempts (1 = no retries)
+        timeout: Timeout of a single attempt in seconds
+        backoff_base: Delay before the first retry (upper bound, seconds)
+        backoff_max: Max delay between retries (seconds)
+    """
+
+    attempts: int = 1
+    timeout: float = 10.0
+    backoff_base: float = 0.2
+    backoff_max: float = 2.0
+
+    def backoff(self, attempt: int) -> float:
+        """Exponential delay with full jitter before retrying after ``attempt`` (1-based)"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a remote service is down
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    rejects requests for ``reset_timeout`` seconds. Then a single probe
+    request is let through (half-open): success closes the breaker,
+    failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+
+        self.opened_count = 0
+        self.rejected = 0
+
+    @property
+    def retry_after(self) -> float:
+        """Seconds until the next probe is allowed (0 if closed)"""
+        if self.state == self.CLOSED:
+            return 0.0
+        return max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+
+    def allow_request(self) -> bool:
+        """Check if request may be sent now"""
+        if self.state == self.CLOSED:
+            return True
+
+        if time.monotonic() - self._opened_at >= self.reset_timeout:
+            # Let one probe through; others wait for its result for another reset_timeout
+            self.state = self.HALF_OPEN
+            self._opened_at = time.monotonic()
+            logger.info(f"Circuit breaker '{self.name}' half-open, probing")
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        """Register successful request"""
+        self._consecutive_failures = 0
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit breaker '{self.name}' closed")
+            self.state = self.CLOSED
+
+    def record_failure(self) -> None:
+        """Register failed request"""
+        self._consecutive_failures += 1
+        if self.state == self.HALF_OPEN or (
+            self.state == self.CLOSED and self._consecutive_failures >= self.failure_threshold
+        ):
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self.opened_count += 1
+            logger.warning(
+                f"Circuit breaker '{self.name}' opened after {self._consecutive_failures} failures, "
+                f"failing fast for {self.reset_timeout:.0f}s"
+            )
+
+    def stats(self) -> dict[str, Any]:
+        """Breaker state for diagnostics"""
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "opened_count": self.opened_count,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after, 1),
+        }
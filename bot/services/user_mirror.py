@@ -0,0 +1,275 @@
+"""Local mirror of the Marzban user table"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from itertools import islice
+from typing import Iterator, Optional
+
+from .limiter import Priority, request_priority
+from .marzban_api import MarzbanAPI
+from .user_stats import UserColumns
+
+
+logger = logging.getLogger(__name__)
+
+
+class MarzbanUserMirror:
+    """
+    In-process snapshot of all Marzban users
+
+    A full sync loads every user at startup and then every
+    ``full_sync_interval`` seconds. Between full syncs a cheap delta sync
+    runs every ``delta_interval`` seconds: it requests the newest users
+    (sorted by creation date) until it reaches already known ones, and
+    falls back to a full sync when the panel total does not match. Every
+    delta sync also re-reads one page of known users, moving through the
+    list in a rolling window: status, traffic and expiry change on the
+    panel without any new user appearing, so each user is refreshed at
+    least every ``ceil(total / page_size)`` delta syncs.
+    Users fetched or changed through MarzbanAPI are written into the
+    mirror immediately.
+
+    Reads are O(1) dictionary lookups, so admin screens do not have to
+    query the panel on every click.
+    """
+
+    def __init__(
+        self,
+        marzban: MarzbanAPI,
+        *,
+        delta_interval: float = 60.0,
+        full_sync_interval: float = 900.0,
+        page_size: int = 500,
+    ):
+        self.marzban = marzban
+        self.delta_interval = delta_interval
+        self.full_sync_interval = full_sync_interval
+        self.page_size = page_size
+
+        self._users: dict[str, dict] = {}
+        self._by_status: dict[str, set[str]] = defaultdict(set)
+        self._synced_at: Optional[float] = None
+        self._full_synced_at: Optional[float] = None
+        self._sync_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # Offset (by creation date) of the next page re-read by delta sync
+        self._refresh_offset = 0
+
+        # Users written through while a full sync is running
+        self._touched_during_sync: Optional[dict[str, dict]] = None
+
+        # Bumped on every change; columnar snapshot is rebuilt only when it moved
+        self._version = 0
+        self._columns: Optional[UserColumns] = None
+        self._columns_version = -1
+
+        marzban.add_user_listener(self.apply)
+
+    # ----- lifecycle -----
+
+    async def start(self) -> None:
+        """Start background sync (first full sync runs immediately)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._sync_loop())
+
+    async def stop(self) -> None:
+        """Stop background sync"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _sync_loop(self) -> None:
+        """Run full and delta syncs periodically"""
+        # Sync requests yield to users and admins when the panel is busy
+        request_priority.set(Priority.BACKGROUND)
+        while True:
+            try:
+                full_sync_due = (
+                    self._full_synced_at is None
+                    or time.monotonic() - self._full_synced_at >= self.full_sync_interval
+                )
+                if full_sync_due:
+                    await self.full_sync()
+                else:
+                    await self.delta_sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Marzban mirror sync failed: {e}")
+
+            await asyncio.sleep(self.delta_interval)
+
+    # ----- sync -----
+
+    async def full_sync(self) -> None:
+        """Reload all users from the panel"""
+        async with self._sync_lock:
+            started = time.monotonic()
+            self._touched_during_sync = {}
+            try:
+                users: dict[str, dict] = {}
+                async for user_data in self.marzban.iter_users(page_size=self.page_size):
+                    if isinstance(user_data, dict) and user_data.get("username"):
+                        users[user_data["username"]] = user_data
+
+                # Data written through during the sync is newer than the pages we got
+                users.update(self._touched_during_sync)
+            finally:
+                self._touched_during_sync = None
+
+            self._users = users
+            self._version += 1
+            self._rebuild_status_index()
+            self._synced_at = self._full_synced_at = time.monotonic()
+            logger.info(f"Marzban mirror full sync: {len(users)} users in {time.monotonic() - started:.2f}s")
+
+    async def delta_sync(self) -> None:
+        """Pick up users created since the last sync and refresh one page of known users"""
+        async with self._sync_lock:
+            added = 0
+            offset = 0
+            total = 0
+            while True:
+                page, total = await self.marzban.list_users(
+                    offset=offset, limit=min(self.page_size, 100), sort="-created_at"
+                )
+                new_users = [u for u in page if isinstance(u, dict) and u.get("username") not in self._users]
+                for user_data in new_users:
+                    self._store(user_data)
+                added += len(new_users)
+
+                # Stop at the first page that contains known users
+                if len(new_users) < len(page) or not page:
+                    break
+                offset += len(page)
+
+            refreshed = await self._refresh_window()
+            self._synced_at = time.monotonic()
+            if added:
+                logger.info(f"Marzban mirror delta sync: {added} new users")
+            logger.debug(f"Marzban mirror delta sync: refreshed {refreshed} users, next offset {self._refresh_offset}")
+
+        if total != len(self._users):
+            # Users were deleted (or missed) on the panel side - reload everything
+            logger.info(f"Marzban mirror out of sync (panel {total}, mirror {len(self._users)}), running full sync")
+            await self.full_sync()
+
+    async def _refresh_window(self) -> int:
+        """Re-read the next page of users (oldest first), returns number of users refreshed"""
+        self._touched_during_sync = {}
+        try:
+            page, total = await self.marzban.list_users(
+                offset=self._refresh_offset, limit=self.page_size, sort="created_at"
+            )
+            touched = self._touched_during_sync
+        finally:
+            self._touched_during_sync = None
+
+        refreshed = 0
+        for user_data in page:
+            if not isinstance(user_data, dict) or not user_data.get("username"):
+                continue
+            # Data written through during the request is newer than the page
+            if user_data["username"] in touched:
+                continue
+            self._store(user_data)
+            refreshed += 1
+
+        self._refresh_offset += len(page)
+        if not page or self._refresh_offset >= total:
+            self._refresh_offset = 0
+        return refreshed
+
+    # ----- write-through -----
+
+    def apply(self, user_data: dict) -> None:
+        """Insert or update user from fresh panel data"""
+        if not isinstance(user_data, dict) or not user_data.get("username"):
+            return
+        self._store(user_data)
+        if self._touched_during_sync is not None:
+            self._touched_during_sync[user_data["username"]] = user_data
+
+    def remove(self, username: str) -> None:
+        """Drop user from mirror"""
+        user_data = self._users.pop(username, None)
+        if user_data is not None:
+            self._version += 1
+            self._by_status[user_data.get("status")].discard(username)
+
+    def _store(self, user_data: dict) -> None:
+        """Put user into snapshot and status index"""
+        username = user_data["username"]
+        previous = self._users.get(username)
+        if previous is not None:
+            self._by_status[previous.get("status")].discard(username)
+        self._users[username] = user_data
+        self._version += 1
+        self._by_status[user_data.get("status")].add(username)
+
+    def _rebuild_status_index(self) -> None:
+        """Rebuild status -> usernames index from snapshot"""
+        by_status: dict[str, set[str]] = defaultdict(set)
+        for username, user_data in self._users.items():
+            by_status[user_data.get("status")].add(username)
+        self._by_status = by_status
+
+    # ----- reads -----
+
+    @property
+    def is_ready(self) -> bool:
+        """Snapshot has been loaded at least once"""
+        return self._full_synced_at is not None
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the last successful sync"""
+        if self._synced_at is None:
+            return None
+        return time.monotonic() - self._synced_at
+
+    @property
+    def total(self) -> int:
+        """Number of users in snapshot"""
+        return len(self._users)
+
+    def get(self, username: str) -> Optional[dict]:
+        """Get user by exact username"""
+        return self._users.get(username)
+
+    def users(self) -> Iterator[dict]:
+        """Iterate over all users in panel order"""
+        return iter(list(self._users.values()))
+
+    def page(self, offset: int = 0, limit: int = 10) -> tuple[list[dict], int]:
+        """Get page of users in panel order"""
+        usernames = list(islice(self._users, offset, offset + limit))
+        return [self._users[username] for username in usernames], len(self._users)
+
+    def usernames_with_status(self, status: str) -> set[str]:
+        """Usernames having given status"""
+        return set(self._by_status.get(status, ()))
+
+    def columns(self) -> UserColumns:
+        """Columnar snapshot for statistics (cached until the mirror changes)"""
+        if self._columns is None or self._columns_version != self._version:
+            self._columns = UserColumns.from_users(self._users.values())
+            self._columns_version = self._version
+        return self._columns
+
+    def search(self, query: str, limit: int = 10) -> list[dict]:
+        """Find users whose username contains query (case-insensitive)"""
+        query = query.lower()
+        matches = []
+        for username, user_data in self._users.items():
+            if query in username.lower():
+                matches.append(user_data)
+                if len(matches) >= limit:
+                    break
+        return matches
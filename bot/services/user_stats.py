@@ -0,0 +1,85 @@
+"""Columnar snapshot of Marzban users for statistics"""
+
+import operator
+import time
+from array import array
+from itertools import compress, repeat
+from typing import Iterable, Optional
+
+
+class UserColumns:
+    """
+    Marzban users stored column by column in typed arrays
+
+    Only per-user distributions live here: totals, status counts and online
+    users come from the panel's aggregate /api/system endpoint. Every
+    statistic is one pass over one or two columns driven by C-level
+    iteration (``map`` with ``operator`` functions, ``sorted``,
+    ``compress``), so no Python code runs per user once the snapshot is
+    built. Typed arrays take 8 bytes per value instead of a boxed int each.
+    Zero means "unlimited" for data_limit/expire.
+
+    Usage:
+        columns = user_mirror.columns()
+        columns.traffic_quantiles(), columns.expiring_within(7)
+    """
+
+    __slots__ = ("usernames", "used_traffic", "data_limit", "expire", "built_at")
+
+    def __init__(self):
+        self.usernames: list[str] = []
+        self.used_traffic = array("q")
+        self.data_limit = array("q")
+        self.expire = array("q")
+        self.built_at = time.time()
+
+    @classmethod
+    def from_users(cls, users: Iterable[dict]) -> "UserColumns":
+        """Build snapshot from raw Marzban user dicts"""
+        columns = cls()
+        for user_data in users:
+            columns.append(user_data)
+        return columns
+
+    @classmethod
+    def merge(cls, parts: Iterable["UserColumns"]) -> "UserColumns":
+        """Concatenate snapshots (e.g. from several panels)"""
+        columns = cls()
+        for part in parts:
+            for name in ("usernames", "used_traffic", "data_limit", "expire"):
+                getattr(columns, name).extend(getattr(part, name))
+        return columns
+
+    def append(self, user_data: dict) -> None:
+        """Add one raw Marzban user dict"""
+        if not isinstance(user_data, dict) or not user_data.get("username"):
+            return
+        self.usernames.append(user_data["username"])
+        self.used_traffic.append(user_data.get("used_traffic") or 0)
+        self.data_limit.append(user_data.get("data_limit") or 0)
+        self.expire.append(int(user_data.get("expire") or 0))
+
+    def __len__(self) -> int:
+        return len(self.usernames)
+
+    def traffic_quantiles(self, quantiles: Iterable[float] = (0.5, 0.9, 0.99)) -> dict[float, int]:
+        """Used traffic per user at given quantiles (nearest rank)"""
+        if not self.used_traffic:
+            return {q: 0 for q in quantiles}
+        ordered = sorted(self.used_traffic)
+        last = len(ordered) - 1
+        return {q: ordered[min(int(q * len(ordered)), last)] for q in quantiles}
+
+    def near_limit(self, ratio: float = 0.9) -> list[str]:
+        """Users with a traffic limit who used at least ``ratio`` of it"""
+        has_limit = map(operator.gt, self.data_limit, repeat(0))
+        thresholds = map(operator.mul, self.data_limit, repeat(ratio))
+        reached = map(operator.ge, self.used_traffic, thresholds)
+        return list(compress(self.usernames, map(operator.and_, has_limit, reached)))
+
+    def expiring_within(self, days: float, now: Optional[float] = None) -> list[str]:
+        """Users whose (not yet passed) expiry falls within ``days`` days"""
+        now = now or time.time()
+        not_expired = map(operator.gt, self.expire, repeat(now))
+        before_deadline = map(operator.le, self.expire, repeat(now + days * 86400))
+        return list(compress(self.usernames, map(operator.and_, not_expired, before_deadline)))
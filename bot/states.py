@@ -56,3 +56,12 @@ class ToggleUserStatusStates(StatesGroup):
     """States for toggling user status (active <-> disabled)"""
 
     confirmation = State()  # Confirmation before changing status
+
+
+class BulkModifyStates(StatesGroup):
+    """States for changing many users at once"""
+
+    waiting_for_usernames = State()  # Waiting for username list or group selection
+    choosing_action = State()  # Waiting for change type
+    waiting_for_value = State()  # Waiting for days/GB amount
+    confirmation = State()  # Confirmation before applying
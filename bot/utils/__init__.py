@@ -11,8 +11,13 @@ from .formatters import (
     format_date_relative,
     format_traffic_speed,
     format_status_emoji,
+    format_data_age,
 )
 from .rate_limiter import rate_limit
+from .cache import CacheEntry, TTLCache
+from .coalescer import RequestCoalescer
+from .warmup import Warmup, WarmupError
+from .deadline import DeadlineExceeded, deadline_after, no_deadline
 
 __all__ = [
     "MarzbanConnectionError",
@@ -23,5 +28,14 @@ __all__ = [
     "format_date_relative",
     "format_traffic_speed",
     "format_status_emoji",
+    "format_data_age",
     "rate_limit",
+    "CacheEntry",
+    "TTLCache",
+    "RequestCoalescer",
+    "Warmup",
+    "WarmupError",
+    "DeadlineExceeded",
+    "deadline_after",
+    "no_deadline",
 ]
@@ -0,0 +1,126 @@
+"""In-memory TTL cache"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Generic, Hashable, Optional, TypeVar
+
+
+V = TypeVar("V")
+
+
+@dataclass
+class CacheEntry(Generic[V]):
+    """Cached value with its timestamps (time.monotonic based)"""
+
+    value: V
+    stored_at: float
+    expires_at: float
+
+    @property
+    def is_fresh(self) -> bool:
+        """Entry has not reached its TTL yet"""
+        return time.monotonic() < self.expires_at
+
+    @property
+    def age(self) -> float:
+        """Seconds since the value was stored"""
+        return time.monotonic() - self.stored_at
+
+
+class TTLCache(Generic[V]):
+    """
+    Bounded LRU cache with per-entry TTL
+
+    Entries older than ``ttl`` are considered stale. Stale entries are still
+    returned by ``lookup()`` for ``stale_ttl`` more seconds, so callers can serve
+    them immediately and refresh in background (stale-while-revalidate).
+
+    Args:
+        maxsize: Max number of entries (0 disables caching)
+        ttl: Seconds an entry stays fresh
+        stale_ttl: Extra seconds a stale entry may still be served
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0, stale_ttl: float = 0.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data: OrderedDict[Hashable, CacheEntry[V]] = OrderedDict()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._data.get(key)
+        return entry is not None and entry.is_fresh
+
+    def lookup(self, key: Hashable) -> Optional[CacheEntry[V]]:
+        """Get entry if it is fresh or still within the stale window"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        if now >= entry.expires_at + self.stale_ttl:
+            del self._data[key]
+            self.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        if now < entry.expires_at:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return entry
+
+    def peek(self, key: Hashable) -> Optional[CacheEntry[V]]:
+        """Get entry (even expired) without touching LRU order or counters"""
+        return self._data.get(key)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get fresh value or default"""
+        entry = self.lookup(key)
+        if entry is None or not entry.is_fresh:
+            return default
+        return entry.value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:
+        """Store value, evicting least recently used entries if needed"""
+        if self.maxsize <= 0:
+            return
+
+        now = time.monotonic()
+        self._data[key] = CacheEntry(value=value, stored_at=now, expires_at=now + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        """Remove entry if present"""
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._data.clear()
+
+    def stats(self) -> dict[str, Any]:
+        """Cache counters for diagnostics"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.stale_hits) / lookups if lookups else 0.0,
+        }
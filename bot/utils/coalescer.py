@@ -0,0 +1,78 @@
+"""Coalescing of concurrent identical requests"""
+
+import asyncio
+import contextvars
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from .deadline import request_deadline, within_budget
+
+
+T = TypeVar("T")
+
+
+class RequestCoalescer:
+    """
+    Share one in-flight call between concurrent callers with the same key
+
+    The first caller starts the call; callers arriving while it is running
+    await the same result (or exception) instead of issuing their own request.
+    Cancelling one caller does not cancel the shared call for the others.
+
+    The shared call runs in a copy of the starting caller's context (so it
+    keeps e.g. the request priority) without the request deadline: one
+    caller's budget must not cut the call short for the others. Each caller
+    waits only within its own time budget.
+
+    Usage:
+        user = await coalescer.run(("user", username), lambda: fetch_user(username))
+    """
+
+    def __init__(self):
+        self._in_flight: dict[Hashable, asyncio.Future] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run factory() unless a call with the same key is already in flight
+
+        Raises:
+            DeadlineExceeded: Caller's time budget ran out (the shared call goes on)
+        """
+        future = self._in_flight.get(key)
+        if future is not None and not future.done():
+            self.coalesced += 1
+            return await within_budget(asyncio.shield(future))
+
+        self.started += 1
+        context = contextvars.copy_context()
+        context.run(request_deadline.set, None)
+        future = asyncio.get_running_loop().create_task(factory(), context=context)
+        self._in_flight[key] = future
+        future.add_done_callback(lambda done: self._release(key, done))
+        return await within_budget(asyncio.shield(future))
+
+    async def cancel(self) -> None:
+        """Cancel calls still in flight and wait until they finish"""
+        futures = list(self._in_flight.values())
+        for future in futures:
+            future.cancel()
+        await asyncio.gather(*futures, return_exceptions=True)
+
+    def _release(self, key: Hashable, future: asyncio.Future) -> None:
+        """Forget finished call"""
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        # Mark exception as retrieved in case every caller was cancelled
+        if not future.cancelled():
+            future.exception()
+
+    def stats(self) -> dict[str, Any]:
+        """Coalescing counters for diagnostics"""
+        total = self.started + self.coalesced
+        return {
+            "started": self.started,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+            "saved_ratio": self.coalesced / total if total else 0.0,
+        }
@@ -0,0 +1,92 @@
+"""Per-update time budget shared by Marzban API and database calls"""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Iterator, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+# time.monotonic() value after which the current update should give up (None = no deadline)
+request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Time budget of the current update ran out"""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the deadline (None = no deadline)"""
+    deadline = request_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def budget(timeout: Optional[float] = None) -> Optional[float]:
+    """
+    Timeout capped by the remaining budget
+
+    Raises:
+        DeadlineExceeded: Nothing is left of the budget
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return left if timeout is None else min(timeout, left)
+
+
+def expired() -> bool:
+    """Deadline is set and has passed"""
+    left = remaining()
+    return left is not None and left <= 0
+
+
+async def within_budget(awaitable: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """
+    Await with timeout capped by the remaining budget
+
+    Raises:
+        DeadlineExceeded: Budget ran out before the awaitable finished
+        asyncio.TimeoutError: Own ``timeout`` (shorter than the budget) passed
+    """
+    try:
+        limit = budget(timeout)
+    except DeadlineExceeded:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise
+    try:
+        return await asyncio.wait_for(awaitable, timeout=limit)
+    except asyncio.TimeoutError:
+        if expired():
+            raise DeadlineExceeded("Request deadline exceeded") from None
+        raise
+
+
+@contextmanager
+def deadline_after(seconds: Optional[float]) -> Iterator[None]:
+    """Set deadline ``seconds`` from now for the block (an earlier outer deadline stays)"""
+    deadline = None if seconds is None else time.monotonic() + seconds
+    current = request_deadline.get()
+    if current is not None and (deadline is None or current < deadline):
+        deadline = current
+    token = request_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
+
+
+@contextmanager
+def no_deadline() -> Iterator[None]:
+    """Lift the deadline for long-running work started by an update (e.g. bulk changes)"""
+    token = request_deadline.set(None)
+    try:
+        yield
+    finally:
+        request_deadline.reset(token)
@@ -149,3 +149,22 @@ def format_status_emoji(status: str, expire: Optional[datetime] = None, used: in
         return "🟡"
 
     return "🟢"
+
+
+def format_data_age(seconds: Optional[float]) -> str:
+    """
+    Format age of cached data
+
+    Args:
+        seconds: Seconds since data was fetched (None = never)
+
+    Returns:
+        String like "🕒 Данные обновлены 2 мин. назад"
+    """
+    if seconds is None:
+        return "🕒 Данные ещё не загружены"
+    if seconds < 60:
+        return f"🕒 Данные обновлены {int(seconds)} сек. назад"
+    if seconds < 3600:
+        return f"🕒 Данные обновлены {int(seconds // 60)} мин. назад"
+    return f"🕒 Данные обновлены {int(seconds // 3600)} ч. назад"
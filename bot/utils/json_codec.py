@@ -0,0 +1,41 @@
+"""JSON codec (orjson if installed, stdlib json otherwise)"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+
+JSON_CODEC = "orjson" if orjson is not None else "json"
+
+
+if orjson is not None:
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Decode JSON document"""
+        return orjson.loads(data)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """Encode object to UTF-8 JSON bytes"""
+        return orjson.dumps(obj)
+
+    def dumps(obj: Any) -> str:
+        """Encode object to JSON string"""
+        return orjson.dumps(obj).decode()
+
+else:
+
+    def loads(data: Union[bytes, str]) -> Any:
+        """Decode JSON document"""
+        return json.loads(data)
+
+    def dumps_bytes(obj: Any) -> bytes:
+        """Encode object to UTF-8 JSON bytes"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+    def dumps(obj: Any) -> str:
+        """Encode object to JSON string"""
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
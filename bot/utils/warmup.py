@@ -0,0 +1,140 @@
+"""Concurrent startup steps with per-step timings"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class WarmupError(Exception):
+    """Critical startup step failed"""
+
+    def __init__(self, step: str, error: BaseException):
+        super().__init__(f"Startup step {step} failed: {str(error) or type(error).__name__}")
+        self.step = step
+        self.error = error
+
+
+@dataclass
+class StepResult:
+    """Outcome of one startup step"""
+
+    name: str
+    critical: bool
+    elapsed: float = 0.0
+    ok: Optional[bool] = None  # None = still running or skipped
+    error: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self.ok is None:
+            state = f"skipped ({self.error})" if self.error else "running"
+        elif self.ok:
+            state = "ok"
+        else:
+            state = f"failed ({self.error})"
+        return f"{self.name}{' [critical]' if self.critical else ''}: {self.elapsed * 1000:.0f} ms {state}"
+
+
+class Warmup:
+    """
+    Startup steps that run concurrently as soon as they are added
+
+    A step may wait for other steps (``after``); it is skipped if any of them
+    failed. The caller waits only for critical steps, the rest keeps
+    warming caches in background.
+
+    Usage:
+        warmup = Warmup()
+        warmup.add("database", create_tables, critical=True)
+        warmup.add("inbounds", marzban.get_inbounds, after=["token"])
+        await warmup.wait_critical()  # raises WarmupError
+        ...
+        await warmup.wait_all()
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self.started_at = time.perf_counter()
+        self.results: dict[str, StepResult] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+
+    def add(
+        self,
+        name: str,
+        job: Callable[[], Awaitable[Any]],
+        *,
+        critical: bool = False,
+        after: Iterable[str] = (),
+    ) -> None:
+        """Start step in background"""
+        if name in self._tasks:
+            raise ValueError(f"Duplicate startup step: {name}")
+        self.results[name] = StepResult(name, critical)
+        self._tasks[name] = asyncio.create_task(self._run(name, job, list(after)), name=f"warmup:{name}")
+
+    async def _run(self, name: str, job: Callable[[], Awaitable[Any]], after: list[str]) -> Any:
+        result = self.results[name]
+        for dependency in after:
+            try:
+                # shield(): a skipped step must not cancel the step it waits for
+                await asyncio.shield(self._tasks[dependency])
+            except Exception:
+                result.error = f"{dependency} failed"
+                raise
+
+        started = time.perf_counter()
+        try:
+            value = await asyncio.wait_for(job(), timeout=self.timeout)
+        except asyncio.CancelledError:
+            raise
+        except BaseException as e:
+            result.elapsed = time.perf_counter() - started
+            result.ok = False
+            result.error = str(e) or type(e).__name__
+            logger.warning(f"Startup step {name} failed after {result.elapsed:.2f}s: {result.error}")
+            raise
+        result.elapsed = time.perf_counter() - started
+        result.ok = True
+        logger.info(f"Startup step {name} done in {result.elapsed * 1000:.0f} ms")
+        return value
+
+    async def wait_critical(self) -> float:
+        """
+        Wait until all critical steps are done
+
+        Returns:
+            Seconds since warmup was created
+
+        Raises:
+            WarmupError: First critical step that failed
+        """
+        critical = {name: task for name, task in self._tasks.items() if self.results[name].critical}
+        pending = set(critical.values())
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for name, task in critical.items():
+                if task in done and not task.cancelled() and task.exception() is not None:
+                    raise WarmupError(name, task.exception())
+        return time.perf_counter() - self.started_at
+
+    async def wait_all(self) -> float:
+        """Wait for every step (failures are only recorded), returns total seconds"""
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        return time.perf_counter() - self.started_at
+
+    async def cancel(self) -> None:
+        """Cancel steps that are still running"""
+        for name, task in self._tasks.items():
+            if not task.done():
+                self.results[name].error = self.results[name].error or "cancelled"
+                task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+
+    def summary(self) -> str:
+        """Per-step timing breakdown, slowest first"""
+        results = sorted(self.results.values(), key=lambda result: result.elapsed, reverse=True)
+        return "\n".join(f"  {result}" for result in results)
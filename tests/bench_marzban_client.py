@@ -0,0 +1,112 @@
+"""Benchmark: MarzbanAPI against the fake Marzban panel
+
+Runs typical client workloads against tests/fake_marzban.py started in the
+same process and reports wall time, throughput, requests that actually
+reached the panel and client-side p50/p95 from MarzbanAPI.metrics.
+
+Scenarios:
+    get_user (no cache)   concurrent uncached reads
+    get_user (cached)     same usernames, served from the client cache
+    iter_users            full user list with page prefetch
+    bulk_modify           extend every user by 30 days
+
+Usage:
+    python tests/bench_marzban_client.py [--users 2000] [--latency 0.02] [--jitter 0.01]
+                                         [--error-rate 0.0] [--conflict-rate 0.0]
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bot.services.marzban_api import MarzbanAPI, UserChanges  # noqa: E402
+from fake_marzban import FakeMarzban  # noqa: E402
+
+
+async def _get_users(api: MarzbanAPI, usernames: list[str], use_cache: bool) -> int:
+    results = await asyncio.gather(
+        *(api.get_user(username, use_cache=use_cache) for username in usernames), return_exceptions=True
+    )
+    return sum(1 for result in results if isinstance(result, BaseException))
+
+
+async def _iter_users(api: MarzbanAPI) -> int:
+    count = 0
+    async for _ in api.iter_users():
+        count += 1
+    return count
+
+
+async def _bulk_extend(api: MarzbanAPI, usernames: list[str]) -> int:
+    failed = 0
+    async for result in api.bulk_modify(usernames, UserChanges(extend_days=30)):
+        failed += not result.ok
+    return failed
+
+
+async def _run(
+    fake: FakeMarzban, api: MarzbanAPI, name: str, operation: str, scenario: Callable[[], Awaitable[int]]
+) -> None:
+    panel_calls = sum(count for key, count in fake.calls.items() if key.startswith(("GET", "PUT", "POST")))
+    started = time.perf_counter()
+    result = await scenario()
+    elapsed = time.perf_counter() - started
+    panel_calls = sum(count for key, count in fake.calls.items() if key.startswith(("GET", "PUT", "POST"))) - panel_calls
+
+    row = next((row for row in api.metrics.summary() if row["operation"] == operation), None)
+    p50 = f"{row['p50'] * 1000:.0f}" if row else "-"
+    p95 = f"{row['p95'] * 1000:.0f}" if row else "-"
+    print(
+        f"{name:<20} | {elapsed * 1000:>8.0f} | {panel_calls:>6} | {panel_calls / elapsed:>7.0f} | "
+        f"{p50:>5} | {p95:>5} | {result}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--conflict-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    fake = FakeMarzban(
+        args.users,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        conflict_rate=args.conflict_rate,
+        seed=args.seed,
+    )
+    async with fake.serve():
+        api = MarzbanAPI(fake.url, fake.username, fake.password)
+        usernames = list(fake.users)[:500]
+        print(
+            f"Fake Marzban: {args.users} users, latency {args.latency * 1000:.0f}±{args.jitter * 1000:.0f} ms, "
+            f"errors {args.error_rate:.0%}, conflicts {args.conflict_rate:.0%}"
+        )
+        print(f"{'scenario':<20} | {'wall ms':>8} | {'calls':>6} | {'calls/s':>7} | {'p50':>5} | {'p95':>5} | result")
+        print("-" * 80)
+        try:
+            await _run(fake, api, "get_user (no cache)", "get_user", lambda: _get_users(api, usernames, False))
+            await _run(fake, api, "get_user (cached)", "get_user", lambda: _get_users(api, usernames, True))
+            await _run(fake, api, "iter_users", "list_users", lambda: _iter_users(api))
+            await _run(fake, api, "bulk_modify", "modify_user", lambda: _bulk_extend(api, usernames))
+        finally:
+            await api.close()
+        print("\nresult: failed calls (get_user, bulk_modify) or users seen (iter_users); p50/p95 in ms, cumulative")
+        print(f"Panel: {dict(fake.calls)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
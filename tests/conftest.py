@@ -0,0 +1,13 @@
+"""Shared pytest setup: import path and the settings bot.config requires"""
+
+import os
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "tests"))
+
+os.environ.setdefault("TELEGRAM_BOT_TOKEN", "42:TEST")
+os.environ.setdefault("MARZBAN_ADMIN_USERNAME", "admin")
+os.environ.setdefault("MARZBAN_ADMIN_PASSWORD", "admin")
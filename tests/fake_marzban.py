@@ -0,0 +1,422 @@
+"""Fake Marzban panel for benchmarks and offline testing
+
+aiohttp stand-in for the part of the Marzban REST API used by the bot:
+
+    POST /api/admin/token      form login, returns JWT with ``exp``
+    GET  /api/user/{username}  single user
+    PUT  /api/user/{username}  partial update
+    POST /api/user             create (409 if user exists)
+    GET  /api/users            offset/limit/sort/status/search/username
+    GET  /api/inbounds         inbounds grouped by protocol
+    GET  /api/system           panel-wide counters
+    GET  /api/users/usage      user traffic per node for start/end
+    GET  /api/nodes/usage      node uplink/downlink for start/end
+
+Users are generated deterministically from a seed, so runs are
+reproducible. Latency (with jitter), server errors and 409 conflicts can
+be injected per request; counters of handled requests are kept in
+``FakeMarzban.calls``.
+
+Usage (standalone):
+    python tests/fake_marzban.py --users 5000 --latency 0.05 --error-rate 0.01
+    MARZBAN_API_URL=http://127.0.0.1:8765 python -m bot.main
+
+Usage (in-process):
+    async with FakeMarzban(users=1000, latency=0.02).serve(port=8765) as fake:
+        api = MarzbanAPI(fake.url, fake.username, fake.password)
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from aiohttp import web
+
+STATUSES = ("active", "active", "active", "active", "disabled", "limited", "expired", "on_hold")
+GB = 1024 ** 3
+
+INBOUNDS = {
+    "vless": [
+        {"tag": "VLESS TCP REALITY", "protocol": "vless", "network": "tcp", "tls": "reality", "port": 443},
+        {"tag": "VLESS GRPC REALITY", "protocol": "vless", "network": "grpc", "tls": "reality", "port": 2053},
+    ],
+    "vmess": [
+        {"tag": "VMess WS", "protocol": "vmess", "network": "ws", "tls": "none", "port": 8080},
+    ],
+    "trojan": [
+        {"tag": "Trojan TCP TLS", "protocol": "trojan", "network": "tcp", "tls": "tls", "port": 8443},
+    ],
+}
+
+
+def _b64(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode().rstrip("=")
+
+
+def _iso(timestamp: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp))
+
+
+class FakeMarzban:
+    """
+    In-memory Marzban panel
+
+    Args:
+        users: Number of generated users
+        latency: Base delay added to every request (seconds)
+        jitter: Random extra delay, uniform in [0, jitter] (seconds)
+        error_rate: Share of requests answered with ``error_status``
+        error_status: Status of injected errors (503 is retried by the client)
+        conflict_rate: Share of writes (POST/PUT) answered with 409
+        token_ttl: Lifetime of issued tokens (seconds)
+        seed: Random seed for user data and injected faults
+    """
+
+    def __init__(
+        self,
+        users: int = 1000,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        conflict_rate: float = 0.0,
+        token_ttl: int = 3600,
+        seed: int = 42,
+        username: str = "admin",
+        password: str = "admin",
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.conflict_rate = conflict_rate
+        self.token_ttl = token_ttl
+        self.username = username
+        self.password = password
+        self.url = ""
+
+        self.calls: Counter[str] = Counter()
+        self.bytes_sent = 0
+        self._random = random.Random(seed)
+        self._tokens: dict[str, float] = {}
+        self._token_counter = 0
+        self.inbounds = {protocol: [dict(inbound) for inbound in items] for protocol, items in INBOUNDS.items()}
+        self.nodes = [{"node_id": None, "node_name": "Master"}] + [
+            {"node_id": node_id, "node_name": f"node-{node_id}"} for node_id in range(1, 4)
+        ]
+        self.users: dict[str, dict] = {}
+        for index in range(users):
+            user = self.generate_user(index)
+            self.users[user["username"]] = user
+
+    # ----- data -----
+
+    def generate_user(self, index: int) -> dict:
+        """Realistic Marzban user document"""
+        rnd = self._random
+        now = time.time()
+        uid = f"{rnd.getrandbits(128):032x}"
+        status = STATUSES[index % len(STATUSES)]
+        data_limit = rnd.choice((0, 10 * GB, 50 * GB, 100 * GB, 200 * GB))
+        used = rnd.randint(0, data_limit or 300 * GB)
+        if status == "limited" and data_limit:
+            used = data_limit
+        elif data_limit:
+            used = min(used, data_limit)
+
+        if status == "expired":
+            expire = int(now - rnd.randint(1, 60) * 86400)
+        elif rnd.random() < 0.15:
+            expire = 0
+        else:
+            expire = int(now + rnd.randint(1, 365) * 86400)
+
+        created_at = now - rnd.randint(1, 720) * 86400
+        online_at = now - rnd.expovariate(1 / 3600) if status == "active" and rnd.random() < 0.7 else None
+        return {
+            "username": f"user_{index:06d}",
+            "status": status,
+            "used_traffic": used,
+            "lifetime_used_traffic": used + rnd.randint(0, 50 * GB),
+            "data_limit": data_limit,
+            "data_limit_reset_strategy": "no_reset",
+            "expire": expire,
+            "created_at": _iso(created_at),
+            "online_at": _iso(online_at) if online_at else None,
+            "sub_updated_at": None,
+            "note": "",
+            "on_hold_expire_duration": None,
+            "on_hold_timeout": None,
+            "proxies": {"vless": {"id": uid, "flow": ""}},
+            "inbounds": {"vless": [inbound["tag"] for inbound in self.inbounds["vless"]]},
+            "subscription_url": f"/sub/{uid}",
+            "links": [
+                f"vless://{uid}@example.com:{inbound['port']}?security={inbound['tls']}&type={inbound['network']}"
+                f"#{inbound['tag'].replace(' ', '%20')}"
+                for inbound in self.inbounds["vless"]
+            ],
+        }
+
+    # ----- fault injection -----
+
+    async def _delay(self) -> None:
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def _injected_error(self) -> Optional[web.Response]:
+        if self.error_rate and self._random.random() < self.error_rate:
+            self.calls["injected_error"] += 1
+            return web.json_response({"detail": "Injected error"}, status=self.error_status)
+        return None
+
+    def _injected_conflict(self) -> Optional[web.Response]:
+        if self.conflict_rate and self._random.random() < self.conflict_rate:
+            self.calls["injected_conflict"] += 1
+            return web.json_response({"detail": "Injected conflict"}, status=409)
+        return None
+
+    def _json(self, data, status: int = 200) -> web.Response:
+        response = web.json_response(data, status=status)
+        self.bytes_sent += len(response.body)
+        return response
+
+    # ----- middleware -----
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        resource = request.match_info.route.resource
+        self.calls[f"{request.method} {resource.canonical if resource else request.path}"] += 1
+        await self._delay()
+
+        failure = self._injected_error()
+        if failure is not None:
+            return failure
+
+        if request.path != "/api/admin/token":
+            token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+            expires = self._tokens.get(token)
+            if expires is None or expires < time.time():
+                return web.json_response({"detail": "Could not validate credentials"}, status=401)
+        return await handler(request)
+
+    # ----- handlers -----
+
+    async def _token(self, request: web.Request) -> web.Response:
+        form = await request.post()
+        if form.get("username") != self.username or form.get("password") != self.password:
+            return web.json_response({"detail": "Incorrect username or password"}, status=401)
+
+        self._token_counter += 1
+        expires = time.time() + self.token_ttl
+        token = f"{_b64({'alg': 'HS256', 'typ': 'JWT'})}.{_b64({'sub': self.username, 'access': 'sudo', 'exp': int(expires), 'n': self._token_counter})}.signature"
+        self._tokens[token] = expires
+        return self._json({"access_token": token, "token_type": "bearer"})
+
+    async def _get_user(self, request: web.Request) -> web.Response:
+        user = self.users.get(request.match_info["username"])
+        if user is None:
+            return web.json_response({"detail": "User not found"}, status=404)
+        return self._json(user)
+
+    async def _modify_user(self, request: web.Request) -> web.Response:
+        user = self.users.get(request.match_info["username"])
+        if user is None:
+            return web.json_response({"detail": "User not found"}, status=404)
+        conflict = self._injected_conflict()
+        if conflict is not None:
+            return conflict
+
+        body = await request.json()
+        for field in ("status", "data_limit", "expire", "note", "data_limit_reset_strategy"):
+            if field in body:
+                user[field] = body[field]
+        return self._json(user)
+
+    async def _create_user(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        username = body.get("username")
+        if not username:
+            return web.json_response({"detail": "Username is required"}, status=422)
+        if username in self.users:
+            return web.json_response({"detail": "User already exists"}, status=409)
+        conflict = self._injected_conflict()
+        if conflict is not None:
+            return conflict
+
+        for protocol, tags in (body.get("inbounds") or {}).items():
+            known = {inbound["tag"] for inbound in self.inbounds.get(protocol, [])}
+            for tag in tags:
+                if tag not in known:
+                    return web.json_response({"detail": f"Inbound {tag} doesn't exist"}, status=400)
+
+        user = self.generate_user(len(self.users))
+        user.update(
+            username=username,
+            status=body.get("status", "active"),
+            used_traffic=0,
+            lifetime_used_traffic=0,
+            data_limit=body.get("data_limit") or 0,
+            expire=body.get("expire") or 0,
+            created_at=_iso(time.time()),
+            online_at=None,
+            note=body.get("note", ""),
+            inbounds=body.get("inbounds") or user["inbounds"],
+        )
+        self.users[username] = user
+        return self._json(user)
+
+    async def _list_users(self, request: web.Request) -> web.Response:
+        query = request.query
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", 0)) or None
+
+        if "username" in query:
+            users = [self.users[name] for name in query.getall("username") if name in self.users]
+        else:
+            users = list(self.users.values())
+        if "status" in query:
+            users = [user for user in users if user["status"] == query["status"]]
+        if "search" in query:
+            users = [user for user in users if query["search"] in user["username"]]
+
+        sort = query.get("sort")
+        if sort:
+            field = sort.lstrip("-")
+            users.sort(key=lambda user: (user.get(field) is None, user.get(field) or 0), reverse=sort.startswith("-"))
+
+        page = users[offset:offset + limit] if limit else users[offset:]
+        return self._json({"users": page, "total": len(users)})
+
+    async def _get_inbounds(self, request: web.Request) -> web.Response:
+        return self._json(self.inbounds)
+
+    async def _system(self, request: web.Request) -> web.Response:
+        statuses = Counter(user["status"] for user in self.users.values())
+        traffic = sum(user["used_traffic"] for user in self.users.values())
+        return self._json({
+            "version": "0.7.0",
+            "mem_total": 8 * GB,
+            "mem_used": 3 * GB,
+            "cpu_cores": 4,
+            "cpu_usage": 12.5,
+            "total_user": len(self.users),
+            "online_users": sum(1 for user in self.users.values() if user["online_at"]),
+            "users_active": statuses["active"],
+            "users_on_hold": statuses["on_hold"],
+            "users_disabled": statuses["disabled"],
+            "users_expired": statuses["expired"],
+            "users_limited": statuses["limited"],
+            "incoming_bandwidth": traffic // 2,
+            "outgoing_bandwidth": traffic,
+            "incoming_bandwidth_speed": 0,
+            "outgoing_bandwidth_speed": 0,
+        })
+
+    def _period_days(self, request: web.Request) -> float:
+        """Length of the requested usage period (Marzban defaults to the last 30 days)"""
+        try:
+            start = time.mktime(time.strptime(request.query["start"], "%Y-%m-%dT%H:%M:%S"))
+        except (KeyError, ValueError):
+            return 30.0
+        return max((time.mktime(time.gmtime()) - start) / 86400, 0.0)
+
+    def _node_share(self, index: int) -> float:
+        """Deterministic part of traffic going through node ``index``"""
+        return (index + 1) / (len(self.nodes) * (len(self.nodes) + 1) / 2)
+
+    async def _users_usage(self, request: web.Request) -> web.Response:
+        daily = sum(user["used_traffic"] for user in self.users.values()) / 30
+        period = daily * self._period_days(request)
+        return self._json({"usages": [
+            {**node, "used_traffic": int(period * self._node_share(index))} for index, node in enumerate(self.nodes)
+        ]})
+
+    async def _nodes_usage(self, request: web.Request) -> web.Response:
+        daily = sum(user["used_traffic"] for user in self.users.values()) / 30
+        period = daily * self._period_days(request)
+        return self._json({"usages": [
+            {**node, "uplink": int(period * self._node_share(index) * 0.1), "downlink": int(period * self._node_share(index))}
+            for index, node in enumerate(self.nodes)
+        ]})
+
+    # ----- server -----
+
+    def app(self) -> web.Application:
+        """aiohttp application with all routes"""
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_post("/api/admin/token", self._token)
+        app.router.add_get("/api/user/{username}", self._get_user)
+        app.router.add_put("/api/user/{username}", self._modify_user)
+        app.router.add_post("/api/user", self._create_user)
+        app.router.add_get("/api/users", self._list_users)
+        app.router.add_get("/api/inbounds", self._get_inbounds)
+        app.router.add_get("/api/system", self._system)
+        app.router.add_get("/api/users/usage", self._users_usage)
+        app.router.add_get("/api/nodes/usage", self._nodes_usage)
+        return app
+
+    @asynccontextmanager
+    async def serve(self, host: str = "127.0.0.1", port: int = 0) -> AsyncIterator["FakeMarzban"]:
+        """Run server in the current event loop (port 0 = pick a free port)"""
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        bound_port = runner.addresses[0][1]
+        self.url = f"http://{host}:{bound_port}"
+        try:
+            yield self
+        finally:
+            await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake Marzban panel")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="base delay per request, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra delay, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--conflict-rate", type=float, default=0.0)
+    parser.add_argument("--token-ttl", type=int, default=3600)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin")
+    args = parser.parse_args()
+
+    fake = FakeMarzban(
+        args.users,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        conflict_rate=args.conflict_rate,
+        token_ttl=args.token_ttl,
+        seed=args.seed,
+        username=args.username,
+        password=args.password,
+    )
+
+    async def run() -> None:
+        async with fake.serve(args.host, args.port):
+            print(f"Fake Marzban with {len(fake.users)} users at {fake.url} (login {fake.username}/{fake.password})")
+            await asyncio.Event().wait()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print(f"Handled requests: {dict(fake.calls)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""MarzbanAPI against the fake Marzban panel"""
+
+import asyncio
+
+import pytest
+
+from bot.services.limiter import Priority, request_priority
+from bot.services.marzban_api import MarzbanAPI, MarzbanDeadlineError
+from bot.utils import deadline
+from fake_marzban import FakeMarzban
+
+
+def _record_acquire(api: MarzbanAPI, seen: list) -> None:
+    """Remember priority and deadline of every request entering the limiter"""
+    acquire = api._limiter.acquire
+
+    async def recording_acquire(priority=None):
+        seen.append((request_priority.get(), deadline.request_deadline.get()))
+        await acquire(priority)
+
+    api._limiter.acquire = recording_acquire
+
+
+def test_coalesced_background_read_keeps_priority_but_not_deadline():
+    async def main() -> list:
+        seen: list = []
+        async with FakeMarzban(users=5, latency=0.05).serve() as fake:
+            api = MarzbanAPI(fake.url, fake.username, fake.password)
+            await api._get_token()
+            _record_acquire(api, seen)
+            username = next(iter(fake.users))
+
+            async def background_read() -> None:
+                request_priority.set(Priority.BACKGROUND)
+                with deadline.deadline_after(5):
+                    await asyncio.gather(
+                        api.get_user(username, use_cache=False),
+                        api.get_user(username, use_cache=False),
+                    )
+
+            await asyncio.create_task(background_read())
+            assert api.coalescing_stats()["coalesced"] == 1
+            await api.close()
+        return seen
+
+    seen = asyncio.run(main())
+    assert seen == [(Priority.BACKGROUND, None)]
+
+
+def test_fresh_read_does_not_fall_back_to_cache_on_deadline():
+    async def main() -> None:
+        async with FakeMarzban(users=5).serve() as fake:
+            api = MarzbanAPI(fake.url, fake.username, fake.password)
+            username = next(iter(fake.users))
+            cached = await api.get_user(username)
+
+            fake.latency = 0.5
+            with deadline.deadline_after(0.1):
+                with pytest.raises(MarzbanDeadlineError):
+                    await api.get_user(username, use_cache=False)
+            with deadline.deadline_after(0.1):
+                assert await api.get_user(username) is cached
+            await api.close()
+
+    asyncio.run(main())
+
+
+def test_slow_read_does_not_overwrite_newer_write_in_cache():
+    async def main() -> None:
+        async with FakeMarzban(users=5).serve() as fake:
+            api = MarzbanAPI(fake.url, fake.username, fake.password)
+            username = next(iter(fake.users))
+            fetch_user = api._fetch_user
+            fetched = asyncio.Event()
+
+            async def slow_fetch_user(name):
+                # The panel answered, but the response is still on its way
+                user = await fetch_user(name)
+                fetched.set()
+                await asyncio.sleep(0.2)
+                return user
+
+            api._fetch_user = slow_fetch_user
+            read = asyncio.create_task(api.get_user(username, use_cache=False))
+            await fetched.wait()
+            api._fetch_user = fetch_user
+            modified = await api.modify_user(username, status="disabled")
+
+            assert (await read).status == "disabled"
+            assert (await api.get_user(username)) is modified
+            await api.close()
+
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+"""PanelRegistry fleet-wide operations against two fake Marzban panels"""
+
+import asyncio
+from contextlib import AsyncExitStack
+
+from bot.services import MarzbanAPI, Panel, PanelRegistry, UserChanges
+from fake_marzban import FakeMarzban
+
+
+async def _with_panels(check) -> None:
+    async with AsyncExitStack() as stack:
+        fakes = {
+            "main": await stack.enter_async_context(FakeMarzban(users=4, seed=1).serve()),
+            "eu": await stack.enter_async_context(FakeMarzban(users=4, seed=2).serve()),
+        }
+        # Both fakes name users the same way - keep them apart
+        fakes["eu"].users = {f"eu_{name}": dict(user, username=f"eu_{name}") for name, user in fakes["eu"].users.items()}
+
+        registry = PanelRegistry("main")
+        for name, fake in fakes.items():
+            registry.add(Panel(name, MarzbanAPI(fake.url, fake.username, fake.password)))
+        try:
+            await check(registry, fakes)
+        finally:
+            await registry.close()
+
+
+def test_group_by_panel_finds_panel_of_each_username():
+    async def check(registry: PanelRegistry, fakes: dict) -> None:
+        main_user = next(iter(fakes["main"].users))
+        eu_user = next(iter(fakes["eu"].users))
+
+        groups, failures = await registry.group_by_panel([main_user, eu_user, "nobody", main_user])
+
+        assert groups == {"main": [main_user], "eu": [eu_user]}
+        assert [result.username for result in failures] == ["nobody"]
+        assert "not found" in failures[0].error
+
+    asyncio.run(_with_panels(check))
+
+
+def test_bulk_modify_updates_users_on_every_panel():
+    async def check(registry: PanelRegistry, fakes: dict) -> None:
+        groups = {name: list(fake.users) for name, fake in fakes.items()}
+
+        results = [result async for result in registry.bulk_modify(groups, UserChanges(status="disabled"))]
+
+        assert sorted(result.username for result in results if result.ok) == sorted(
+            username for usernames in groups.values() for username in usernames
+        )
+        for fake in fakes.values():
+            assert {user["status"] for user in fake.users.values()} == {"disabled"}
+
+    asyncio.run(_with_panels(check))
@@ -0,0 +1,79 @@
+"""TelegramMetricsMiddleware against a local Bot API stand-in"""
+
+import asyncio
+
+import pytest
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiohttp import web
+
+from bot.middleware import TelegramMetricsMiddleware
+from bot.services.metrics import RequestMetrics
+
+TOKEN = "42:TEST"
+
+
+async def _bot_api(request: web.Request) -> web.Response:
+    method = request.match_info["method"].lower()
+    if method == "getme":
+        return web.json_response(
+            {"ok": True, "result": {"id": 42, "is_bot": True, "first_name": "Test", "username": "test_bot"}}
+        )
+    if method == "sendmessage":
+        return web.json_response(
+            {"ok": False, "error_code": 400, "description": "Bad Request: chat not found"}, status=400
+        )
+    return web.json_response(
+        {"ok": False, "error_code": 429, "description": "Too Many Requests", "parameters": {"retry_after": 3}},
+        status=429,
+    )
+
+
+async def _run(calls) -> RequestMetrics:
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", _bot_api)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    metrics = RequestMetrics("telegram")
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{port}"))
+    session.middleware(TelegramMetricsMiddleware(metrics))
+    bot = Bot(TOKEN, session=session)
+    try:
+        await calls(bot)
+    finally:
+        await session.close()
+        await runner.cleanup()
+    return metrics
+
+
+def _statuses(metrics: RequestMetrics, operation: str) -> dict[str, int]:
+    return dict(metrics._operations[operation].statuses)
+
+
+def test_successful_call_returns_result_and_counts_200():
+    async def calls(bot: Bot) -> None:
+        me = await bot.get_me()
+        assert me.username == "test_bot"
+
+    metrics = asyncio.run(_run(calls))
+    assert _statuses(metrics, "GetMe") == {"200": 1}
+    assert metrics.in_flight == 0
+
+
+def test_api_errors_are_counted_by_status_and_reraised():
+    async def calls(bot: Bot) -> None:
+        with pytest.raises(TelegramBadRequest):
+            await bot.send_message(1, "hi")
+        with pytest.raises(TelegramRetryAfter):
+            await bot.delete_message(1, 1)
+
+    metrics = asyncio.run(_run(calls))
+    assert _statuses(metrics, "SendMessage") == {"400": 1}
+    assert _statuses(metrics, "DeleteMessage") == {"429": 1}
+    assert metrics.in_flight == 0